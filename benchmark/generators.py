@@ -0,0 +1,103 @@
+""" Synthetic scenes and MTGs for the benchmarks.
+
+All generators are deterministic for a given seed.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+import openalea.plantgl.all as pgl
+from openalea.mtg import MTG
+
+
+def palette(nb_colors, seed=0):
+    """Return `nb_colors` distinct random colors"""
+    rng = np.random.RandomState(seed)
+    colors = set()
+    while len(colors) < nb_colors:
+        colors.add(tuple(int(c) for c in rng.randint(0, 256, 3)))
+    return [pgl.Color3(*c) for c in sorted(colors)]
+
+
+def _primitive(i, slices=8):
+    primitives = [pgl.Cylinder(0.1, 1., True, slices),
+                  pgl.Sphere(0.3, slices, slices),
+                  pgl.Cone(0.2, 0.5, True, slices),
+                  pgl.Box(pgl.Vector3(0.2, 0.1, 0.3))]
+    return primitives[i % len(primitives)]
+
+
+def synthetic_scene(nb_shapes=100, nb_curves=0, nb_colors=1, slices=8, seed=0):
+    """Return a Scene of `nb_shapes` surfaces and `nb_curves` polylines
+    spread on a square, with `nb_colors` materials."""
+    rng = np.random.RandomState(seed)
+    materials = [pgl.Material(c) for c in palette(nb_colors, seed)]
+    side = max(1., np.sqrt(nb_shapes + nb_curves))
+    scene = pgl.Scene()
+    for i in range(nb_shapes):
+        x, y = rng.uniform(0, side, 2)
+        geometry = pgl.Translated(pgl.Vector3(x, y, rng.uniform(0, 2)), _primitive(i, slices))
+        scene += pgl.Shape(geometry, materials[i % nb_colors], i + 1)
+    for i in range(nb_curves):
+        pts = rng.uniform(0, side, (10, 3))
+        curve = pgl.Polyline(pgl.Point3Array([pgl.Vector3(*p) for p in pts]))
+        scene += pgl.Shape(curve, materials[i % nb_colors], nb_shapes + i + 1)
+    return scene
+
+
+def synthetic_curves(nb_curves=100, nb_colors=1, seed=0):
+    """Return a list of curve shapes"""
+    return list(synthetic_scene(0, nb_curves, nb_colors, seed=seed))
+
+
+def synthetic_mtg(depth=4, branching=2, axis_length=3, seed=0):
+    """Return an MTG with a plant (scale 1) of metamers (scale 2).
+
+    Each axis has `axis_length` metamers; each metamer but the last of
+    an axis bears `branching` lateral axes, down to `depth` orders.
+    Metamers carry a geometry and the `length` and `Eabs` properties.
+    """
+    rng = np.random.RandomState(seed)
+    g = MTG()
+    plant = g.add_component(g.root, label='P')
+
+    def metamer(order, position):
+        length = rng.uniform(0.5, 1.5)
+        geometry = pgl.Translated(pgl.Vector3(*position), pgl.Cylinder(0.05 / (order + 1), length))
+        return dict(label='I', length=length, Eabs=rng.uniform(0, 500), geometry=geometry)
+
+    first = g.add_component(plant, edge_type='/', **metamer(0, (0, 0, 0)))
+    axes = [(first, 0, np.zeros(3))]
+    while axes:
+        vid, order, position = axes.pop()
+        for i in range(1, axis_length):
+            position = position + (0, 0, 1)
+            if order < depth:
+                for b in range(branching):
+                    angle = 2 * np.pi * (b + i / 3.) / branching
+                    lateral = position + (np.cos(angle), np.sin(angle), 0.)
+                    cid = g.add_child(vid, edge_type='+', **metamer(order + 1, tuple(lateral)))
+                    axes.append((cid, order + 1, lateral))
+            vid = g.add_child(vid, edge_type='<', **metamer(order, tuple(position)))
+    return g
+
+
+def lsystem_code(nb_steps=5, branching=2):
+    """Return the code of a branching L-system growing for `nb_steps`"""
+    laterals = ''.join('[/(%d)+(40)B]' % (i * 360 // branching) for i in range(branching))
+    return """
+Axiom: A
+derivation length: %d
+production:
+A --> I(1) %s A
+B --> I(0.5) A
+interpretation:
+I(l) --> F(l)
+endlsystem
+""" % (nb_steps, laterals)
+
+
+def lsystem_rules(branching=2):
+    """Return the axiom and the production rules of `lsystem_code`, to be
+    given to the `%lpy_axiom` and `%lpy_rule` magics"""
+    laterals = ''.join('[/(%d)+(40)B]' % (i * 360 // branching) for i in range(branching))
+    return 'A', ['A --> F(1) %s A' % laterals, 'B --> F(0.5) A']
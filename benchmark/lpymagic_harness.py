@@ -0,0 +1,199 @@
+""" Benchmark of the LPy magics.
+
+Usage::
+
+    python benchmark/lpymagic_harness.py [--quick] [--format svg|png|widget]
+        [--output lpymagic_results.json] [--compare old.json [--tolerance 1.5]]
+
+The ``%%lpy``, ``%lpy_axiom``, ``%lpy_rule`` and ``%lpy_iter`` magics are
+run in an in-process IPython shell with a stub display publisher, on
+L-systems of growing size (see `generators.lsystem_code`). Each case is
+timed (best of `--repeat` runs, each on a fresh Lsystem) with the time of
+each phase of the best run (setCode, iterate, sceneInterpretation,
+lpy2mtg, plot3d) recorded by `oawidgets.profiling`; its peak Python memory
+is measured with tracemalloc in a separate run.
+
+With ``--compare``, the exit status is 1 when a case is slower than in
+the reference run by more than `--tolerance`.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generators
+import run
+
+import oawidgets
+from oawidgets import profiling
+
+
+class Publisher(object):
+    """Stub of `publish_display_data` recording the size of each output"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, data, **kwds):
+        self.calls.append(dict((mime, len(value)) for mime, value in data.items()))
+
+    @property
+    def nbytes(self):
+        return sum(sum(call.values()) for call in self.calls)
+
+
+def shell():
+    """Return the in-process IPython shell"""
+    from IPython.core.interactiveshell import InteractiveShell
+    return InteractiveShell.instance()
+
+
+def register(ip):
+    """Register new LPy magics (with a fresh Lsystem) in the shell `ip`,
+    publishing in a stub; return the magics and the stub"""
+    from oawidgets.lpymagic import LpyMagics
+    magics = LpyMagics(ip)
+    magics._publish_display_data = publisher = Publisher()
+    ip.register_magics(magics)
+    return magics, publisher
+
+
+def phases(report):
+    """Return the time of the top level spans of a profiling report"""
+    return dict((name, t) for name, (_, t) in report.spans.items() if '/' not in name)
+
+
+def measure(setup, repeat=3):
+    """Time `setup()()` on a fresh state for each run.
+
+    Return the best time, the phases of the best run, the peak traced
+    memory and the bytes published.
+    """
+    best, best_phases, published = None, None, 0
+    for _ in range(repeat):
+        func, publisher = setup()
+        gc.collect()
+        with contextlib.redirect_stdout(io.StringIO()), profiling.profile() as report:
+            t0 = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best, best_phases, published = elapsed, phases(report), publisher.nbytes
+
+    func, _ = setup()
+    gc.collect()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': best, 'phases': best_phases, 'peak_memory': peak,
+            'published': published}
+
+
+def cases(quick=False, format='svg'):
+    """Yield (name, params, setup) where setup() returns the function to
+    time and the display stub"""
+    ip = shell()
+    flag = '' if format == 'widget' else '-f %s' % format
+    sizes = [(3, 2), (5, 2)] if quick else [(3, 2), (5, 2), (7, 2), (6, 3), (8, 3)]
+
+    for steps, branching in sizes:
+        params = {'steps': steps, 'branching': branching}
+        code = generators.lsystem_code(steps, branching)
+        axiom, rules = generators.lsystem_rules(branching)
+
+        def setup(code=code):
+            _, publisher = register(ip)
+            return (lambda: ip.run_cell_magic('lpy', '%s -g g' % flag, code)), publisher
+        yield 'lpy', params, setup
+
+        def setup(steps=steps, axiom=axiom, rules=rules):
+            _, publisher = register(ip)
+            line = '-n %d -g g %s' % (steps, flag)
+
+            def grow():
+                ip.run_line_magic('lpy_axiom', axiom)
+                for rule in rules:
+                    ip.run_line_magic('lpy_rule', rule)
+                ip.run_line_magic('lpy_iter', line)
+            return grow, publisher
+        yield 'lpy_axiom+lpy_rule+lpy_iter', params, setup
+
+
+def run_cases(quick=False, repeat=3, pattern=None, format='svg'):
+    results = []
+    for name, params, setup in cases(quick, format):
+        if pattern and pattern not in name:
+            continue
+        record = {'name': name, 'params': params}
+        record.update(measure(setup, repeat))
+        print('%-28s %-32s %9.4f s %8.1f MB %9.1f kB  %s' % (
+            name, json.dumps(params), record['time'], record['peak_memory'] / 1e6,
+            record['published'] / 1e3,
+            ' '.join('%s %.1f ms' % (phase, t * 1e3)
+                     for phase, t in sorted(record['phases'].items()))))
+        results.append(record)
+    return {'version': oawidgets.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'format': format,
+            'results': results}
+
+
+def slowdowns(current, reference, tolerance):
+    """Return the (name, params, ratio) of the cases slower than in the
+    reference run by more than `tolerance`"""
+    key = lambda r: (r['name'], json.dumps(r['params'], sort_keys=True))
+    ref = dict((key(r), r) for r in reference['results'])
+    slower = []
+    for r in current['results']:
+        old = ref.get(key(r))
+        if old is None:
+            continue
+        ratio = r['time'] / max(old['time'], 1e-12)
+        if ratio > tolerance:
+            slower.append((r['name'], r['params'], ratio))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--quick', action='store_true', help='small L-systems only')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-k', dest='pattern', help='only run cases whose name contains this')
+    parser.add_argument('--format', default='svg',
+                        help="image format of the plots, or 'widget' for k3d")
+    parser.add_argument('--output', default='lpymagic_results.json')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='maximum time ratio to the reference run')
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.quick, args.repeat, args.pattern, args.format)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Results written in %s' % args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+        run.compare(results, reference)
+        slower = slowdowns(results, reference, args.tolerance)
+        for name, params, ratio in slower:
+            print('SLOWER: %s %s x%.2f' % (name, json.dumps(params), ratio))
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+""" Benchmarks of the oawidgets conversion and rendering paths.
+
+Usage::
+
+    python benchmark/run.py [--quick] [--output results.json] [--compare old.json]
+
+Each case is timed (best of `--repeat` runs), its peak Python memory is
+measured with tracemalloc in a separate run, and the size of the k3d
+payload is recorded when the case produces k3d objects.
+Results are stored as JSON so that runs of different versions can be
+compared with ``--compare``.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generators
+
+import oawidgets
+from oawidgets import plantgl
+
+
+def payload_size(objects):
+    """Return the number of bytes of the arrays sent for k3d objects"""
+    import k3d
+    plot = k3d.plot()
+    for obj in objects:
+        plot += obj
+    try:
+        return len(plot.get_binary_snapshot())
+    except AttributeError:
+        # older k3d: raw size of the arrays
+        total = 0
+        for obj in objects:
+            for name in ('vertices', 'indices', 'attribute', 'colors'):
+                value = getattr(obj, name, None)
+                if value is not None:
+                    total += np.asarray(value).nbytes
+        return total
+
+
+def _objects(result):
+    if result is None:
+        return []
+    if isinstance(result, (list, tuple)):
+        return list(result)
+    if hasattr(result, 'objects'):
+        return list(result.objects)
+    return [result]
+
+
+def measure(func, repeat=3):
+    """Return the best time, the peak traced memory and the payload of `func()`"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - t0)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    objects = _objects(result)
+    payload = payload_size(objects) if objects and all(hasattr(o, 'traits') for o in objects) else None
+    return {'time': min(times), 'peak_memory': peak, 'payload': payload}
+
+
+def cases(quick=False):
+    """Yield (name, params, setup) where setup() returns the function to time"""
+    from oawidgets import mtg as mtgplot
+    sizes = [10, 100] if quick else [10, 100, 1000, 10000]
+
+    for slices in ([8, 32] if quick else [8, 32, 128]):
+        def setup(slices=slices):
+            import openalea.plantgl.all as pgl
+            sphere = pgl.Sphere(1, slices, slices)
+            return lambda: plantgl.tomesh(sphere)
+        yield 'tomesh', {'slices': slices}, setup
+
+    for n in sizes:
+        for nb_colors in (1, 10):
+            def setup(n=n, nb_colors=nb_colors):
+                scene = generators.synthetic_scene(n, nb_colors=nb_colors)
+                return lambda: plantgl.scene2mesh(scene)
+            yield 'scene2mesh', {'shapes': n, 'colors': nb_colors}, setup
+
+            def setup(n=n, nb_colors=nb_colors):
+                scene = generators.synthetic_scene(n, nb_colors=nb_colors)
+                return lambda: plantgl.group_meshes_by_color(scene)
+            yield 'group_meshes_by_color', {'shapes': n, 'colors': nb_colors}, setup
+
+    for n in sizes[:3]:
+        def setup(n=n):
+            curves = generators.synthetic_curves(n, nb_colors=5)
+            return lambda: plantgl.curve2mesh(curves)
+        yield 'curve2mesh', {'curves': n}, setup
+
+    for depth, branching in ([(2, 2), (3, 2)] if quick else [(2, 2), (3, 3), (4, 3), (5, 3)]):
+        params = {'depth': depth, 'branching': branching}
+
+        def setup(depth=depth, branching=branching):
+            g = generators.synthetic_mtg(depth, branching)
+            return lambda: plantgl.mtg2mesh(g, 'Eabs')
+        yield 'mtg2mesh', params, setup
+
+        def setup(depth=depth, branching=branching):
+            g = generators.synthetic_mtg(depth, branching)
+            return lambda: mtgplot.network(g)
+        yield 'mtg.network', params, setup
+
+    try:
+        import openalea.lpy
+    except ImportError:
+        return
+    for steps in ([4, 6] if quick else [4, 6, 8, 10]):
+        def setup(steps=steps):
+            from IPython.core.interactiveshell import InteractiveShell
+            from oawidgets.lpymagic import LpyMagics
+            shell = InteractiveShell.instance()
+            magics = LpyMagics(shell)
+            magics._publish_display_data = lambda data, **kwds: None
+            shell.register_magics(magics)
+            code = generators.lsystem_code(steps)
+            return lambda: shell.run_cell_magic('lpy', '-f svg', code)
+        yield 'lpymagic', {'steps': steps}, setup
+
+
+def run(quick=False, repeat=3, pattern=None):
+    results = []
+    for name, params, setup in cases(quick):
+        if pattern and pattern not in name:
+            continue
+        func = setup()
+        record = {'name': name, 'params': params}
+        record.update(measure(func, repeat))
+        print('%-24s %-36s %10.4f s %10.1f MB %s' % (
+            name, json.dumps(params), record['time'], record['peak_memory'] / 1e6,
+            '' if record['payload'] is None else '%.1f kB' % (record['payload'] / 1e3)))
+        results.append(record)
+    return {'version': oawidgets.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results}
+
+
+def compare(current, reference):
+    """Print the time and memory ratios of two benchmark runs"""
+    key = lambda r: (r['name'], json.dumps(r['params'], sort_keys=True))
+    ref = dict((key(r), r) for r in reference['results'])
+    print('\nComparison with version %s' % reference['version'])
+    for r in current['results']:
+        old = ref.get(key(r))
+        if old is None:
+            continue
+        print('%-24s %-36s time x%.2f  memory x%.2f' % (
+            r['name'], json.dumps(r['params']),
+            r['time'] / max(old['time'], 1e-12),
+            r['peak_memory'] / float(max(old['peak_memory'], 1))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--quick', action='store_true', help='small sizes only')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-k', dest='pattern', help='only run cases whose name contains this')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.repeat, args.pattern)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Results written in %s' % args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
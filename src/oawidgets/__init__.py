@@ -8,3 +8,15 @@ from . import version
 __version__ = version.__version__
 
 # #}
+
+_submodules = ('appearance', 'columns', 'controls', 'export', 'layout',
+               'livegraph', 'lpymagic', 'memory', 'meshopt', 'mtg', 'plantgl',
+               'profiling', 'renderer', 'snapshot', 'spatial', 'tessellation')
+
+
+def __getattr__(name):
+    # submodules are imported on first access (PEP 562)
+    if name in _submodules:
+        import importlib
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -0,0 +1,46 @@
+""" Deferred import of heavy dependencies.
+
+``np = lazy_import('numpy')`` returns a module proxy; the real module is
+imported on the first attribute access, and the attributes used are
+then cached on the proxy.
+"""
+from __future__ import absolute_import
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Proxy of a module imported on first use"""
+
+    def __init__(self, name):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_lazy_target'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_target']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_lazy_target'] = module
+        return module
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_lazy_target'] is not None else 'not loaded'
+        return '<lazy module %r (%s)>' % (self.__name__, state)
+
+
+def lazy_import(name):
+    """Return the module `name`, or a proxy importing it on first use"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
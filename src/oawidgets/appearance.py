@@ -0,0 +1,75 @@
+""" Appearance of PlantGL shapes as flat arrays.
+
+The color, opacity and texture of each shape are read once, and the
+meshes are colored with per vertex attributes (a color map and an opacity
+function indexed by the unique appearances) instead of one k3d object per
+material. Textured shapes are grouped by image.
+"""
+from __future__ import absolute_import
+
+import os
+
+from ._lazy import lazy_import
+
+np = lazy_import('numpy')
+pgl = lazy_import('openalea.plantgl.all')
+
+
+def material(appearance):
+    """Return the (r, g, b) color, the opacity and the texture image file
+    of a PlantGL appearance.
+
+    The color of a Material is its ambient color, as in the k3d meshes
+    built before. The opacity is 1 - transparency.
+    """
+    if isinstance(appearance, pgl.Texture2D):
+        color = appearance.baseColor
+        image = appearance.image
+        texture = image.filename if image is not None else None
+        # the alpha channel of PlantGL colors is a transparency
+        return (color.red, color.green, color.blue), 1. - color.alpha / 255., texture
+    if isinstance(appearance, pgl.Material):
+        color = appearance.ambient
+        return (color.red, color.green, color.blue), 1. - appearance.transparency, None
+    color = getattr(appearance, 'ambient', None)
+    if color is None:
+        return (255, 255, 255), 1., None
+    return (color.red, color.green, color.blue), 1., None
+
+
+def pack(colors, opacity=None):
+    """Return the colors (k, 3) and opacities packed as 0xRRGGBBAA integers"""
+    c = np.asarray(colors).astype(np.uint32).reshape(-1, 3)
+    if opacity is None:
+        alpha = np.full(len(c), 255, dtype=np.uint32)
+    else:
+        alpha = np.round(np.clip(opacity, 0., 1.) * 255).astype(np.uint32)
+    return (c[:, 0] << 24) | (c[:, 1] << 16) | (c[:, 2] << 8) | alpha
+
+
+def color_attributes(packed):
+    """Map packed RGBA values to a k3d color map and opacity function.
+
+    Return the normalized attribute of each value, the color map, the
+    opacity function (None when everything is opaque) and the unique
+    packed values.
+    """
+    values, inverse = np.unique(packed, return_inverse=True)
+    n = len(values)
+    position = np.arange(n) / float(max(n - 1, 1))
+    rgb = np.stack([(values >> 24) & 255, (values >> 16) & 255, (values >> 8) & 255], axis=1) / 255.
+    alpha = (values & 255) / 255.
+    color_map = np.column_stack([position, rgb]).astype(np.float32).ravel()
+    opacity_function = None
+    if (alpha < 1).any():
+        opacity_function = np.column_stack([position, alpha]).astype(np.float32).ravel()
+    attribute = position[inverse.ravel()].astype(np.float32)
+    return attribute, color_map, opacity_function, values
+
+
+def texture_file(filename):
+    """Return the content and the format ('png', 'jpg', ...) of an image"""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    fmt = os.path.splitext(filename)[1][1:].lower()
+    return data, 'jpg' if fmt == 'jpeg' else fmt
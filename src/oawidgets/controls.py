@@ -0,0 +1,182 @@
+""" Interactive controls of the k3d meshes built from a TessellatedScene.
+
+The geometry is sent once; the controls only update small traits of the
+existing mesh (opacity function, color range, attribute or index buffer),
+or read back the shape of a clicked triangle.
+"""
+from __future__ import absolute_import
+
+from ._lazy import lazy_import
+
+np = lazy_import('numpy')
+widgets = lazy_import('ipywidgets')
+
+
+def value_range(values):
+    """Return the (min, max) of the defined values (0, 1 if there is none)"""
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return 0., 1.
+    return float(values.min()), float(values.max())
+
+
+def opacity_function(lower, upper, vmin, vmax):
+    """Return a k3d opacity function showing the values in [lower, upper].
+
+    Attribute values are normalized by the color range (vmin, vmax).
+    """
+    span = float(vmax - vmin) or 1.
+    a = min(max((lower - vmin) / span, 0.), 1.)
+    b = min(max((upper - vmin) / span, 0.), 1.)
+    eps = 1e-6
+    points = [(0., 0.), (max(a - eps, 0.), 0.), (a, 1.), (b, 1.),
+              (min(b + eps, 1.), 0.), (1., 0.)]
+    # drop the hidden steps at the ends of the range
+    if a <= 0.:
+        points = [(0., 1.)] + points[3:]
+    if b >= 1.:
+        points = points[:-3] + [(1., 1.)]
+    return np.array(points, dtype=np.float32).ravel()
+
+
+class RangeFilter(object):
+    """Show only the shapes of a mesh whose property is in a range.
+
+    mode 'opacity' updates the opacity function of the mesh (a few floats
+    per change); mode 'indices' sends the index buffer of the visible
+    triangles (vertices and attributes are not sent again).
+    """
+
+    def __init__(self, mesh, tessellated, property_name, mode='opacity'):
+        if mode not in ('opacity', 'indices'):
+            raise ValueError("mode must be 'opacity' or 'indices', not %r" % (mode,))
+        self.mesh = mesh
+        self.tessellated = tessellated
+        self.mode = mode
+        self.slider = widgets.FloatRangeSlider(continuous_update=False,
+                                               readout_format='.3g')
+        self.slider.observe(self._update, names='value')
+        self.set_property(property_name)
+
+    def set_property(self, property_name):
+        """Filter on another property column (range reset to all values)"""
+        self.property_name = property_name
+        values = np.asarray(self.tessellated.properties[property_name], dtype=float)
+        self._values = values
+        self._triangle_values = None
+        # triangles sent in 'indices' mode (None: all)
+        self.triangles = None
+        vmin, vmax = value_range(values)
+        self.vmin, self.vmax = vmin, vmax
+        with self.slider.hold_trait_notifications():
+            # widen first so that min <= max holds at each step
+            self.slider.max = max(vmax, self.slider.min)
+            self.slider.min = vmin
+            self.slider.max = vmax
+            self.slider.step = (vmax - vmin) / 100. or 1.
+            self.slider.value = (vmin, vmax)
+            self.slider.description = property_name
+        self.apply(vmin, vmax)
+
+    def _update(self, change):
+        lower, upper = change['new']
+        self.apply(lower, upper)
+
+    def apply(self, lower, upper):
+        """Show the shapes with a property value in [lower, upper]"""
+        if self.mode == 'opacity':
+            self.mesh.opacity_function = opacity_function(lower, upper, self.vmin, self.vmax)
+            return
+        if self._triangle_values is None:
+            self._triangle_values = np.repeat(self._values, self.tessellated.triangle_counts())
+        values = self._triangle_values
+        visible = (values >= lower) & (values <= upper)
+        self.triangles = np.flatnonzero(visible)
+        self.mesh.indices = self.tessellated.indices[visible]
+
+
+class PropertySelector(object):
+    """Switch the property displayed by a mesh with a dropdown.
+
+    The per vertex float32 attributes and the color ranges of all the
+    properties are computed once; a switch only sends the attribute
+    buffer and the color range of the existing mesh.
+    `on_change(property_name)` is called after each switch.
+    """
+
+    def __init__(self, mesh, tessellated, property_names, on_change=None):
+        self.mesh = mesh
+        self.on_change = on_change
+        self.attributes = {}
+        self.color_ranges = {}
+        for name in property_names:
+            attribute = tessellated.vertex_property(name).astype(np.float32)
+            self.attributes[name] = attribute
+            self.color_ranges[name] = list(value_range(attribute))
+        self.dropdown = widgets.Dropdown(options=list(property_names),
+                                         description='property')
+        self.dropdown.observe(self._update, names='value')
+
+    def _update(self, change):
+        self.select(change['new'])
+
+    def select(self, property_name):
+        """Display `property_name` on the mesh"""
+        with self.mesh.hold_sync():
+            self.mesh.attribute = self.attributes[property_name]
+            self.mesh.color_range = self.color_ranges[property_name]
+        if self.on_change is not None:
+            self.on_change(property_name)
+
+
+class Picker(object):
+    """Map the clicked (or hovered) triangles of a mesh to the shape ids
+    (MTG vertex ids) of a TessellatedScene.
+
+    The shape of a triangle is found by binary search in the triangle
+    offsets. `properties(id)` returns the properties displayed for a
+    shape (the property columns of the scene by default), and
+    `callback(id, properties)` is called on each click.
+    With a RangeFilter in 'indices' mode, face indices refer to the
+    visible triangles only and are mapped back.
+    """
+
+    def __init__(self, mesh, tessellated, properties=None, callback=None,
+                 range_filter=None, hover=True, label=None):
+        self.mesh = mesh
+        self.tessellated = tessellated
+        self.properties = properties
+        self.callback = callback
+        self.range_filter = range_filter
+        self.label = widgets.HTML() if label is None else label
+        mesh.click_callback = self._click
+        if hover:
+            mesh.hover_callback = self._hover
+
+    def lookup(self, face_index):
+        """Return the id and the properties of the shape of a face"""
+        triangles = None if self.range_filter is None else self.range_filter.triangles
+        if triangles is not None:
+            face_index = triangles[face_index]
+        row = int(self.tessellated.shape_index(face_index))
+        sid = int(self.tessellated.ids[row])
+        if self.properties is not None:
+            properties = self.properties(sid)
+        else:
+            properties = self.tessellated.record(row)
+        return sid, properties
+
+    def _show(self, params):
+        from .mtg import dict2html
+        sid, properties = self.lookup(params['face_index'])
+        self.label.value = '<b>%s</b><br>%s' % (sid, dict2html(properties))
+        return sid, properties
+
+    def _click(self, params):
+        sid, properties = self._show(params)
+        if self.callback is not None:
+            self.callback(sid, properties)
+
+    def _hover(self, params):
+        self._show(params)
@@ -0,0 +1,335 @@
+""" Standalone HTML export of plots and graphs.
+
+``export_html(obj, filename)`` writes a single self-contained HTML file
+for a k3d plot (``PlantGL``, ``MTG``, ``gallery``), a TessellatedScene
+or a pyvis Network (``mtg.network``).
+
+Geometry is stored as base64 blobs of zlib compressed typed arrays:
+positions quantized on 16 bits in the bounding box of each object,
+triangle indices on 16 or 32 bits and colors on 8 bits per channel.
+The page decodes the blobs with ``DecompressionStream`` after loading,
+one object at a time, and draws them with WebGL2.
+"""
+from __future__ import absolute_import
+
+import base64
+import glob
+import json
+import os
+import time
+import zlib
+
+from . import profiling
+from ._lazy import lazy_import
+from .tessellation import TessellatedScene
+
+np = lazy_import('numpy')
+
+
+def _compress(data):
+    """Return the base64 text of zlib compressed bytes"""
+    return base64.b64encode(zlib.compress(data, 6)).decode('ascii')
+
+
+def _blob(array):
+    """Return the base64 text of a zlib compressed array"""
+    return _compress(np.ascontiguousarray(array).tobytes())
+
+
+def _quantize(vertices):
+    """Return positions quantized on uint16, and the offset and scale
+    mapping them back to coordinates.
+
+    The scale is 0 on the axes where the object is flat, so that the
+    upper corner (offset + 65535 scale) is the real one.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return np.zeros((0, 3), dtype=np.uint16), [0., 0., 0.], [0., 0., 0.]
+    lower, upper = vertices.min(axis=0), vertices.max(axis=0)
+    scale = (upper - lower) / 65535.
+    q = np.round((vertices - lower) / np.where(scale > 0, scale, 1.)).astype(np.uint16)
+    return q, lower.tolist(), scale.tolist()
+
+
+def _map_colors(attribute, color_map, color_range):
+    """Return uint8 RGB colors of an attribute through a k3d color map"""
+    cmap = np.asarray(color_map, dtype=np.float64).reshape(-1, 4)
+    lower, upper = (color_range if len(color_range) == 2
+                    else (np.nanmin(attribute), np.nanmax(attribute)))
+    span = float(upper - lower) or 1.
+    t = np.nan_to_num((np.asarray(attribute, dtype=np.float64) - lower) / span)
+    t = np.clip(t, cmap[0, 0], cmap[-1, 0])
+    rgb = np.column_stack([np.interp(t, cmap[:, 0], cmap[:, i]) for i in (1, 2, 3)])
+    return np.round(rgb * 255).astype(np.uint8)
+
+
+def _rgb(color):
+    return [(color >> 16) & 255, (color >> 8) & 255, color & 255]
+
+
+def _entry(kind, vertices, indices=None, attribute=(), color_map=(),
+           color_range=(), color=0x808080, opacity=1.):
+    """Return the JSON description of an object with its blobs"""
+    positions, offset, scale = _quantize(vertices)
+    entry = {'type': kind, 'count': len(positions), 'offset': offset,
+             'scale': scale, 'positions': _blob(positions),
+             'color': _rgb(int(color)), 'opacity': float(opacity)}
+    if indices is not None:
+        indices = np.asarray(indices).reshape(-1)
+        dtype = np.uint16 if len(positions) < 65536 else np.uint32
+        entry['indices'] = _blob(indices.astype(dtype))
+        entry['index_type'] = np.dtype(dtype).name
+        entry['index_count'] = len(indices)
+    if len(attribute) == len(positions) and len(attribute) and len(color_map):
+        entry['colors'] = _blob(_map_colors(attribute, color_map, color_range))
+    return entry
+
+
+def _k3d_plot(obj):
+    """Return the k3d plot of an object or of a box of widgets, or None"""
+    if hasattr(obj, 'objects') and hasattr(obj, 'camera'):
+        return obj
+    for child in getattr(obj, 'children', ()):
+        plot = _k3d_plot(child)
+        if plot is not None:
+            return plot
+    return None
+
+
+def _scene_entries(obj):
+    """Return the JSON descriptions of the objects of a plot or scene"""
+    if isinstance(obj, TessellatedScene):
+        from .plantgl import _mesh_traits
+        traits = _mesh_traits(obj)
+        return [_entry('mesh', traits['vertices'], traits['indices'],
+                       traits.get('attribute', ()), traits.get('color_map', ()),
+                       traits.get('color_range', ()), traits.get('color', 0x808080),
+                       traits.get('opacity', 1.))]
+    entries = []
+    for item in _k3d_plot(obj).objects:
+        kind = {'Mesh': 'mesh', 'Line': 'line'}.get(type(item).__name__)
+        if kind is None:
+            # texts, volumes, ... are not exported
+            continue
+        entries.append(_entry(kind, item.vertices,
+                              item.indices if kind == 'mesh' else None,
+                              np.asarray(item.attribute).reshape(-1),
+                              item.color_map, item.color_range,
+                              item.color, item.opacity))
+    return entries
+
+
+def _vis_library():
+    """Return the vis-network script and css shipped with pyvis, or None"""
+    import pyvis
+    libs = sorted(glob.glob(os.path.join(os.path.dirname(pyvis.__file__),
+                                         'templates', 'lib', 'vis-*')))
+    if not libs:
+        return None
+    with open(os.path.join(libs[-1], 'vis-network.min.js'), encoding='utf-8') as f:
+        script = f.read()
+    with open(os.path.join(libs[-1], 'vis-network.css'), encoding='utf-8') as f:
+        css = f.read()
+    return script, css
+
+
+def _graph_page(net, title):
+    nodes, edges, _, height, width, options = net.get_network_data()
+    data = {'nodes': _compress(json.dumps(nodes).encode('utf-8')),
+            'edges': _compress(json.dumps(edges).encode('utf-8')),
+            'options': json.loads(options)}
+    library = _vis_library()
+    if library is None:
+        head = ('<script src="https://unpkg.com/vis-network/standalone/umd/'
+                'vis-network.min.js"></script>')
+    else:
+        head = '<style>%s</style><script>%s</script>' % (library[1], library[0])
+    return _GRAPH_TEMPLATE % {'title': title, 'head': head, 'height': height,
+                              'width': width, 'data': json.dumps(data),
+                              'inflate': _INFLATE}
+
+
+def export_html(obj, filename, title='oawidgets'):
+    """Write a plot, a TessellatedScene or a pyvis Network in a
+    self-contained HTML file.
+
+    For a graph of `mtg.plot`, export ``mtg.network(g, ...)``.
+
+    Print and return a report with the file size (bytes), the number
+    of exported objects and the generation time (seconds).
+    """
+    t0 = time.perf_counter()
+    with profiling.span('export'):
+        if hasattr(obj, 'get_network_data'):
+            html = _graph_page(obj, title)
+            count = len(obj.nodes)
+        else:
+            entries = _scene_entries(obj)
+            html = _SCENE_TEMPLATE % {'title': title, 'data': json.dumps(entries),
+                                      'inflate': _INFLATE}
+            count = len(entries)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(html)
+    report = {'filename': filename, 'size': os.path.getsize(filename),
+              'objects': count, 'time': time.perf_counter() - t0}
+    print('Exported %d objects to %s: %.1f kB in %.3f s'
+          % (count, filename, report['size'] / 1024., report['time']))
+    return report
+
+
+_INFLATE = """
+async function inflate(text) {
+  const bytes = Uint8Array.from(atob(text), c => c.charCodeAt(0));
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return await new Response(stream).arrayBuffer();
+}
+"""
+
+_GRAPH_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>%(title)s</title>%(head)s</head>
+<body><div id="graph" style="height: %(height)s; width: %(width)s;"></div>
+<script>
+%(inflate)s
+const data = %(data)s;
+(async function () {
+  const decode = async text => JSON.parse(new TextDecoder().decode(await inflate(text)));
+  const nodes = new vis.DataSet(await decode(data.nodes));
+  const edges = new vis.DataSet(await decode(data.edges));
+  new vis.Network(document.getElementById('graph'), {nodes, edges}, data.options);
+})();
+</script></body></html>
+"""
+
+_SCENE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>%(title)s</title>
+<style>html, body, canvas { margin: 0; width: 100%%; height: 100%%; display: block; }</style>
+</head><body><canvas id="view"></canvas>
+<script>
+%(inflate)s
+const objects = %(data)s;
+const canvas = document.getElementById('view');
+const gl = canvas.getContext('webgl2', {antialias: true});
+
+const vs = `#version 300 es
+in vec3 position; in vec3 normal; in vec3 color;
+uniform mat4 view; uniform mat4 proj; uniform vec3 offset; uniform vec3 scale;
+out vec3 vColor; out vec3 vNormal;
+void main() {
+  vColor = color; vNormal = mat3(view) * normal;
+  gl_Position = proj * view * vec4(offset + position * scale, 1.0);
+}`;
+const fs = `#version 300 es
+precision mediump float;
+in vec3 vColor; in vec3 vNormal; uniform float opacity; uniform bool lit;
+out vec4 outColor;
+void main() {
+  float light = lit ? 0.35 + 0.65 * abs(normalize(vNormal).z) : 1.0;
+  outColor = vec4(vColor * light, opacity);
+}`;
+function shader(type, source) {
+  const s = gl.createShader(type); gl.shaderSource(s, source); gl.compileShader(s); return s;
+}
+const program = gl.createProgram();
+gl.attachShader(program, shader(gl.VERTEX_SHADER, vs));
+gl.attachShader(program, shader(gl.FRAGMENT_SHADER, fs));
+gl.linkProgram(program); gl.useProgram(program);
+const loc = name => gl.getUniformLocation(program, name);
+
+function buffer(target, data) {
+  const b = gl.createBuffer(); gl.bindBuffer(target, b); gl.bufferData(target, data, gl.STATIC_DRAW); return b;
+}
+function attrib(name, data, size, type, normalized) {
+  const l = gl.getAttribLocation(program, name);
+  buffer(gl.ARRAY_BUFFER, data);
+  gl.enableVertexAttribArray(l); gl.vertexAttribPointer(l, size, type, normalized, 0, 0);
+}
+function normals(pos, idx, scale) {
+  const n = new Float32Array(pos.length);
+  for (let t = 0; t < idx.length; t += 3) {
+    const a = 3 * idx[t], b = 3 * idx[t + 1], c = 3 * idx[t + 2];
+    const u = [0, 1, 2].map(i => (pos[b + i] - pos[a + i]) * scale[i]);
+    const v = [0, 1, 2].map(i => (pos[c + i] - pos[a + i]) * scale[i]);
+    const x = u[1] * v[2] - u[2] * v[1], y = u[2] * v[0] - u[0] * v[2], z = u[0] * v[1] - u[1] * v[0];
+    for (const k of [a, b, c]) { n[k] += x; n[k + 1] += y; n[k + 2] += z; }
+  }
+  return n;
+}
+
+// objects are decoded lazily, after the page is displayed
+const drawables = [];
+let lower = [Infinity, Infinity, Infinity], upper = [-Infinity, -Infinity, -Infinity];
+async function load(o) {
+  const pos = new Uint16Array(await inflate(o.positions));
+  const vao = gl.createVertexArray(); gl.bindVertexArray(vao);
+  attrib('position', pos, 3, gl.UNSIGNED_SHORT, false);
+  let colors;
+  if (o.colors) colors = new Uint8Array(await inflate(o.colors));
+  else { colors = new Uint8Array(3 * o.count); for (let i = 0; i < colors.length; i++) colors[i] = o.color[i %% 3]; }
+  attrib('color', colors, 3, gl.UNSIGNED_BYTE, true);
+  const d = {vao, o, count: o.count};
+  if (o.indices) {
+    const raw = await inflate(o.indices);
+    const idx = o.index_type === 'uint16' ? new Uint16Array(raw) : new Uint32Array(raw);
+    attrib('normal', normals(pos, idx, o.scale), 3, gl.FLOAT, false);
+    buffer(gl.ELEMENT_ARRAY_BUFFER, idx);
+    d.type = o.index_type === 'uint16' ? gl.UNSIGNED_SHORT : gl.UNSIGNED_INT;
+    d.count = idx.length;
+  }
+  for (let i = 0; i < 3; i++) {
+    lower[i] = Math.min(lower[i], o.offset[i]);
+    upper[i] = Math.max(upper[i], o.offset[i] + 65535 * o.scale[i]);
+  }
+  drawables.push(d);
+}
+
+let theta = -Math.PI / 3, phi = Math.PI / 3, zoom = 1;
+function matrices() {
+  const c = [0, 1, 2].map(i => (lower[i] + upper[i]) / 2);
+  const r = Math.max(1e-9, Math.hypot(...[0, 1, 2].map(i => upper[i] - lower[i]))) * zoom;
+  const eye = [c[0] + r * Math.sin(phi) * Math.cos(theta), c[1] + r * Math.sin(phi) * Math.sin(theta), c[2] + r * Math.cos(phi)];
+  const sub = (a, b) => a.map((x, i) => x - b[i]);
+  const cross = (a, b) => [a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]];
+  const norm = a => { const l = Math.hypot(...a) || 1; return a.map(x => x / l); };
+  const dot = (a, b) => a[0] * b[0] + a[1] * b[1] + a[2] * b[2];
+  const f = norm(sub(c, eye)), s = norm(cross(f, [0, 0, 1])), u = cross(s, f);
+  const view = [s[0], u[0], -f[0], 0, s[1], u[1], -f[1], 0, s[2], u[2], -f[2], 0,
+                -dot(s, eye), -dot(u, eye), dot(f, eye), 1];
+  const near = r / 100, far = r * 4, t = 1 / Math.tan(Math.PI / 8), a = canvas.width / canvas.height;
+  const proj = [t / a, 0, 0, 0, 0, t, 0, 0, 0, 0, (far + near) / (near - far), -1, 0, 0, 2 * far * near / (near - far), 0];
+  return [view, proj];
+}
+
+function draw() {
+  canvas.width = canvas.clientWidth; canvas.height = canvas.clientHeight;
+  gl.viewport(0, 0, canvas.width, canvas.height);
+  gl.clearColor(1, 1, 1, 1); gl.clear(gl.COLOR_BUFFER_BIT | gl.DEPTH_BUFFER_BIT);
+  gl.enable(gl.DEPTH_TEST); gl.enable(gl.BLEND); gl.blendFunc(gl.SRC_ALPHA, gl.ONE_MINUS_SRC_ALPHA);
+  const [view, proj] = matrices();
+  gl.uniformMatrix4fv(loc('view'), false, view); gl.uniformMatrix4fv(loc('proj'), false, proj);
+  for (const d of drawables) {
+    gl.bindVertexArray(d.vao);
+    gl.uniform3fv(loc('offset'), d.o.offset); gl.uniform3fv(loc('scale'), d.o.scale);
+    gl.uniform1f(loc('opacity'), d.o.opacity); gl.uniform1i(loc('lit'), d.type !== undefined);
+    if (d.type !== undefined) gl.drawElements(gl.TRIANGLES, d.count, d.type, 0);
+    else gl.drawArrays(gl.LINE_STRIP, 0, d.count);
+  }
+}
+
+let drag = null;
+canvas.addEventListener('mousedown', e => { drag = [e.clientX, e.clientY]; });
+window.addEventListener('mouseup', () => { drag = null; });
+window.addEventListener('mousemove', e => {
+  if (!drag) return;
+  theta -= (e.clientX - drag[0]) * 0.01;
+  phi = Math.min(Math.PI - 0.01, Math.max(0.01, phi - (e.clientY - drag[1]) * 0.01));
+  drag = [e.clientX, e.clientY]; requestAnimationFrame(draw);
+});
+canvas.addEventListener('wheel', e => { e.preventDefault(); zoom *= Math.exp(e.deltaY * 0.001); requestAnimationFrame(draw); });
+window.addEventListener('resize', () => requestAnimationFrame(draw));
+
+(async function () {
+  for (const o of objects) { await load(o); requestAnimationFrame(draw); }
+})();
+</script></body></html>
+"""
@@ -0,0 +1,96 @@
+""" Tree layout of MTG graphs computed in Python.
+
+The tree at one scale is given as an array of parent rows (-1 for the
+roots). Positions are computed level by level with NumPy: each node gets
+a horizontal slot as wide as its number of leaves, and is centered above
+its descendants (a layered tidy layout, without overlaps). The radial
+layout maps the same slots to angles and the depth to the radius.
+
+Layouts are cached per MTG (held weakly), scale and kind, and reused
+while the tree at that scale is unchanged (same parent rows).
+"""
+from __future__ import absolute_import
+
+import weakref
+
+from ._lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# MTG -> {(scale, kind): (parents, positions)}
+_cache = weakref.WeakKeyDictionary()
+
+
+def depth(parents):
+    """Return the depth of each row from an array of parent rows (-1 for
+    roots), by pointer jumping"""
+    jump = parents.copy()
+    depth = (jump >= 0).astype(np.int64)
+    active = jump >= 0
+    while active.any():
+        depth = depth + np.where(active, depth[jump], 0)
+        jump = np.where(active, jump[jump], -1)
+        active = jump >= 0
+    return depth
+
+
+def _levels(depths):
+    """Return the rows of each depth, in row order"""
+    order = np.argsort(depths, kind='stable')
+    bounds = np.searchsorted(depths[order], np.arange(depths.max() + 2))
+    return [order[bounds[d]:bounds[d + 1]] for d in range(len(bounds) - 1)]
+
+
+def tree_layout(parents, radial=False):
+    """Return the (x, y) positions of the nodes of a forest.
+
+    x is in leaf slots and y is the depth; with `radial`, positions are
+    (depth cos(a), depth sin(a)), the angle a sharing the circle between
+    the leaves.
+    """
+    parents = np.asarray(parents, dtype=np.int64)
+    n = len(parents)
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+    depths = depth(parents)
+    levels = _levels(depths)
+
+    # width of the subtrees, bottom-up
+    nb_children = np.bincount(parents[parents >= 0], minlength=n)
+    width = (nb_children == 0).astype(np.float64)
+    for rows in levels[:0:-1]:
+        np.add.at(width, parents[rows], width[rows])
+
+    # start of the slot of each node, top-down
+    start = np.zeros(n)
+    roots = levels[0]
+    start[roots] = np.cumsum(width[roots]) - width[roots]
+    for rows in levels[1:]:
+        rows = rows[np.argsort(parents[rows], kind='stable')]
+        p, w = parents[rows], width[rows]
+        before = np.cumsum(w) - w
+        first = np.r_[True, p[1:] != p[:-1]]
+        group = np.maximum.accumulate(np.where(first, np.arange(len(rows)), 0))
+        start[rows] = start[p] + before - before[group]
+
+    x = start + width / 2.
+    y = depths.astype(np.float64)
+    if not radial:
+        return x, y
+    angle = 2 * np.pi * x / width[roots].sum()
+    return y * np.cos(angle), y * np.sin(angle)
+
+
+def mtg_layout(g, scale, parents, kind='tidy'):
+    """Return the cached layout ('tidy' or 'radial') of the vertices of
+    `g` at `scale`, given their parent rows"""
+    if kind not in ('tidy', 'radial'):
+        raise ValueError("layout must be 'tidy' or 'radial', not %r" % (kind,))
+    parents = np.asarray(parents, dtype=np.int64)
+    layouts = _cache.setdefault(g, {})
+    cached = layouts.get((scale, kind))
+    if cached is not None and np.array_equal(cached[0], parents):
+        return cached[1]
+    positions = tree_layout(parents, radial=(kind == 'radial'))
+    layouts[(scale, kind)] = (parents.copy(), positions)
+    return positions
@@ -0,0 +1,228 @@
+""" Live MTG graph updated incrementally during a simulation.
+
+``LiveGraph`` displays a vis.js network once, and keeps the vertices,
+labels and colors it has already sent. Each ``update(g)`` only sends the
+new vertices and edges, the nodes whose label or color changed and the
+removed vertices, through a JavaScript call updating the vis DataSets
+of the page. The vertices are read again from the MTG at each update to
+find the label and property changes, unless the simulation declares
+them as `changed`::
+
+    graph = LiveGraph()
+    graph.show()
+    for step in range(nb_steps):
+        lsys.iterate(...)
+        graph.update(lpy2mtg(...))
+"""
+from __future__ import absolute_import
+
+import itertools
+import json
+
+from . import profiling
+from ._lazy import lazy_import
+from .columns import property_table
+from .mtg import _palette, _property, tooltips
+
+np = lazy_import('numpy')
+display = lazy_import('IPython.display')
+
+_ids = itertools.count()
+
+_OPTIONS = {'layout': {'hierarchical': {'enabled': True, 'direction': 'DU',
+                                        'parentCentralization': True,
+                                        'levelSeparation': 150}},
+            'physics': {'solver': 'hierarchicalRepulsion'},
+            'edges': {'arrows': 'to'}}
+
+_PAGE = """<div id="%(id)s" style="height: %(height)s; width: %(width)s;"></div>
+%(library)s
+<script>
+(function () {
+  var nodes = new vis.DataSet(), edges = new vis.DataSet();
+  var network = new vis.Network(document.getElementById('%(id)s'),
+                                {nodes: nodes, edges: edges}, %(options)s);
+  window.oawidgetsGraphs = window.oawidgetsGraphs || {};
+  window.oawidgetsGraphs['%(id)s'] = {nodes: nodes, edges: edges, network: network};
+})();
+</script>
+"""
+
+_UPDATE = """(function () {
+  var graph = (window.oawidgetsGraphs || {})['%s'];
+  if (!graph) return;
+  var delta = %s;
+  graph.edges.remove(delta.removed_edges);
+  graph.nodes.remove(delta.removed);
+  graph.nodes.update(delta.nodes);
+  graph.edges.update(delta.edges);
+})();
+"""
+
+
+class LiveGraph(object):
+    """Graph of an MTG at one scale, updated with the changes only.
+
+    Nodes are colored by complex, or in red when they are in the
+    `selection` given to `update`.
+    """
+
+    def __init__(self, scale=None, properties=None, height='800px', width='900px'):
+        self.scale = scale
+        self.properties = properties
+        self.height = height
+        self.width = width
+        self.id = 'oawidgets-graph-%d' % next(_ids)
+        self._handle = None
+        # state of the page, sorted by vid: the complex, level, color,
+        # label and tooltip of each vertex sent
+        self._vids = np.zeros(0, dtype=np.int64)
+        self._complexes = np.zeros(0, dtype=np.int64)
+        self._levels = np.zeros(0, dtype=np.int64)
+        self._colors = np.zeros(0, dtype=object)
+        self._labels = np.zeros(0, dtype=object)
+        self._titles = np.zeros(0, dtype=object)
+
+    def _html(self):
+        from .export import _vis_library
+        library = _vis_library()
+        if library is None:
+            library = ('<script src="https://unpkg.com/vis-network/standalone/umd/'
+                       'vis-network.min.js"></script>')
+        else:
+            library = '<style>%s</style><script>%s</script>' % (library[1], library[0])
+        return _PAGE % {'id': self.id, 'height': self.height, 'width': self.width,
+                        'library': library, 'options': json.dumps(_OPTIONS)}
+
+    def show(self):
+        """Display the (empty) graph in the notebook"""
+        display.display(display.HTML(self._html()))
+        self._handle = display.display(display.Javascript(''), display_id=True)
+        return self
+
+    @staticmethod
+    def _colors_of(vids, complexes, selection):
+        if selection is None:
+            palette = _palette()
+            return np.array(palette, dtype=object)[complexes % len(palette)]
+        selected = np.isin(vids, np.asarray(list(selection), dtype=np.int64))
+        return np.where(selected, '#fb7e81', '#97c2fc').astype(object)
+
+    def _new_levels(self, vids, parents):
+        """Return the depth of new vertices given their parent vids (-1
+        for none), from the levels of the vertices already sent"""
+        levels = np.full(len(vids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._vids, parents), max(len(self._vids) - 1, 0))
+        sent = (self._vids[pos] == parents) if len(self._vids) else np.zeros(len(vids), dtype=bool)
+        levels[sent] = self._levels[pos[sent]] + 1
+        # parents among the new vertices (vids is sorted)
+        rows = np.minimum(np.searchsorted(vids, parents), max(len(vids) - 1, 0))
+        inner = ~sent & (parents >= 0) & (vids[rows] == parents)
+        levels[~sent & ~inner] = 0
+        while (levels < 0).any():
+            ready = (levels < 0) & (levels[rows] >= 0)
+            if not ready.any():
+                # cycles cannot happen in a tree: guard anyway
+                levels[levels < 0] = 0
+                break
+            levels[ready] = levels[rows[ready]] + 1
+        return levels
+
+    @profiling.traced('livegraph.update')
+    def update(self, g, selection=None, changed=None):
+        """Send the changes of the MTG since the last update.
+
+        By default, all the vertices of the scale are read from the MTG
+        and their labels and tooltips are compared with those sent. When
+        the simulation knows which vertices were modified, `changed`
+        restricts the reading to the new and the `changed` vertices. In
+        both cases each update still scans ``g.vertices(scale)`` to find
+        the new and removed vertices. The colors of the vertices already
+        sent follow the `selection` with array operations.
+
+        Return the numbers of added, changed and removed vertices.
+        """
+        scale = g.max_scale() if self.scale is None else self.scale
+        with profiling.span('diff'):
+            vids = np.unique(np.asarray(list(g.vertices(scale=scale)), dtype=np.int64))
+            known = np.isin(vids, self._vids, assume_unique=True)
+            kept = np.isin(self._vids, vids, assume_unique=True)
+            removed = self._vids[~kept]
+            if changed is None:
+                read = vids
+            else:
+                changed = np.intersect1d(np.asarray(list(changed), dtype=np.int64), vids[known])
+                read = np.union1d(vids[~known], changed)
+            new = vids[~known]
+
+        with profiling.span('data'):
+            names = self.properties
+            if names is not None:
+                names = ['label', 'edge_type'] + ([names] if isinstance(names, str) else list(names))
+            table = property_table(g, names, vids=read, structure=True)
+            is_new = ~np.isin(table.vids, self._vids, assume_unique=True)
+            parents = np.where(table.masks['parent'], table['parent'], -1)[is_new]
+            labels = np.array(_property(table, 'label'), dtype=object)
+            titles = np.array(tooltips(table, self.properties), dtype=object)
+
+        with profiling.span('state'):
+            # known vertices whose label or tooltip changed
+            rows = np.searchsorted(self._vids, table.vids[~is_new])
+            modified = ((self._labels[rows] != labels[~is_new]) |
+                        (self._titles[rows] != titles[~is_new])).astype(bool)
+            self._labels[rows], self._titles[rows] = labels[~is_new], titles[~is_new]
+            send = is_new.copy()
+            send[~is_new] = modified
+
+            levels = self._new_levels(table.vids[is_new], parents)
+            self._vids = np.concatenate([self._vids[kept], table.vids[is_new]])
+            self._complexes = np.concatenate([self._complexes[kept], table['complex'][is_new]])
+            self._levels = np.concatenate([self._levels[kept], levels])
+            self._labels = np.concatenate([self._labels[kept], labels[is_new]])
+            self._titles = np.concatenate([self._titles[kept], titles[is_new]])
+            old_colors = np.concatenate([self._colors[kept],
+                                         np.full(is_new.sum(), None, dtype=object)])
+            order = np.argsort(self._vids, kind='stable')
+            self._vids, self._complexes = self._vids[order], self._complexes[order]
+            self._levels, old_colors = self._levels[order], old_colors[order]
+            self._labels, self._titles = self._labels[order], self._titles[order]
+            self._colors = self._colors_of(self._vids, self._complexes, selection)
+            recolored = np.flatnonzero(self._colors != old_colors)
+
+        with profiling.span('send'):
+            vids_sent = table.vids[send]
+            sent = np.searchsorted(self._vids, vids_sent)
+            nodes = [{'id': vid, 'label': label, 'color': color, 'level': level,
+                      'title': title, 'shape': 'circle'}
+                     for vid, label, color, level, title in zip(
+                         vids_sent.tolist(), labels[send].tolist(),
+                         self._colors[sent].tolist(), self._levels[sent].tolist(),
+                         titles[send].tolist())]
+            # color changes of the other vertices
+            recolored = np.setdiff1d(self._vids[recolored], vids_sent, assume_unique=True)
+            rows = np.searchsorted(self._vids, recolored)
+            nodes += [{'id': vid, 'color': color}
+                      for vid, color in zip(recolored.tolist(), self._colors[rows].tolist())]
+
+            edge_types = np.array(_property(table, 'edge_type'), dtype=object)[is_new]
+            children = table.vids[is_new]
+            # at one scale, a vertex has one parent: edges are named after it
+            edges = [{'id': 'e%d' % target, 'from': source, 'to': target,
+                      'label': edge_type, 'width': 6 if edge_type == '<' else 1}
+                     for source, target, edge_type in zip(
+                         parents.tolist(), children.tolist(), edge_types.tolist())
+                     if source >= 0]
+            delta = {'nodes': nodes, 'edges': edges, 'removed': removed.tolist(),
+                     'removed_edges': ['e%d' % vid for vid in removed.tolist()]}
+            self._send(delta)
+
+        profiling.count('nodes sent', len(nodes))
+        profiling.count('edges sent', len(edges))
+        return int(len(new)), int(modified.sum() + len(recolored)), len(removed)
+
+    def _send(self, delta):
+        code = _UPDATE % (self.id, json.dumps(delta))
+        if self._handle is None:
+            display.display(display.Javascript(code))
+        else:
+            self._handle.update(display.Javascript(code))
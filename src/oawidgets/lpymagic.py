@@ -43,14 +43,8 @@ import tempfile, os
 from glob import glob
 from shutil import rmtree
 
-import numpy as np
-import openalea.lpy as lpy
-from openalea.plantgl.all import Viewer
-
-from openalea.mtg import MTG
-from openalea.mtg.io import mtg2lpy, lpy2mtg
-
-from oawidgets import plantgl
+from oawidgets import plantgl, snapshot, profiling
+from oawidgets._lazy import lazy_import
 
 from xml.dom import minidom
 
@@ -65,6 +59,11 @@ from IPython.core.magic_arguments import (
 from IPython.utils.py3compat import unicode_to_str
 from IPython.display import Image, display
 
+# LPy and the MTG are only imported when a magic is run
+lpy = lazy_import('openalea.lpy')
+openalea_mtg = lazy_import('openalea.mtg')
+mtgio = lazy_import('openalea.mtg.io')
+
 
 _mimetypes = {'png' : 'image/png',
              'svg' : 'image/svg+xml',
@@ -83,30 +82,35 @@ class LpyMagics(Magics):
 
         """
         super(LpyMagics, self).__init__(shell)
-        self._lsys = lpy.Lsystem()
-        self._plot_format = 'png'
+        self._lsystem = None
+        self._plot_format = None
 
         # Allow publish_display_data to be overridden for
         # testing purposes.
         self._publish_display_data = publish_display_data
 
 
-    def _plot3d(self, scene, format='png'):
+    @property
+    def _lsys(self):
+        """The Lsystem, created on first use"""
+        if self._lsystem is None:
+            self._lsystem = lpy.Lsystem()
+        return self._lsystem
+
+    @profiling.traced('plot3d')
+    def _plot3d(self, scene, format=None):
         """
-        Baptiste
-        TODO: Replace by the k3d plantgl connection.
+        Display the scene as a k3d widget, or return a static image.
+
+        When a format is given (png, svg or jpg), the scene is rendered
+        offscreen and the image (bytes, or str for svg) is returned, so
+        that headless executed notebooks only store a small output.
         """
-        # fn = tempfile.mktemp(suffix='.'+format)
-        # Viewer.frameGL.setBgColor(255,255,255)
-        # #Viewer.animation(True)
-        # Viewer.display(scene)
-        # Viewer.saveSnapshot(fn, format)
-        # img = open(fn, 'rb').read()
-        # os.unlink(fn)
-        # return img
-        data = plantgl.PlantGL(scene)
-        display(data)
-        return None
+        if format is None:
+            data = plantgl.PlantGL(scene)
+            display(data)
+            return None
+        return snapshot.snapshot(scene, format=format)
 
     @skip_doctest
     @line_magic
@@ -182,7 +186,13 @@ class LpyMagics(Magics):
         )
     @argument(
         '-f', '--format', action='store',
-        help='Plot format (png, svg or jpg).'
+        help='Plot format (png, svg or jpg) of an offscreen rendered image. '
+             'By default, an interactive k3d widget is displayed.'
+        )
+    @argument(
+        '-p', '--profile', action='store_true',
+        help='Print the time spent in each phase (setCode, iterate, '
+             'sceneInterpretation, lpy2mtg, plot).'
         )
 
     @needs_local_scope
@@ -237,7 +247,19 @@ class LpyMagics(Magics):
 
         '''
         args = parse_argstring(self.lpy, line)
-
+        return self._profiled(self._lpy, args, cell, local_ns)
+
+    def _profiled(self, func, *args):
+        """Call a magic implementation, printing its profile with -p"""
+        if not args[0].profile:
+            return func(*args)
+        # the report is stopped even when the magic raises
+        with profiling.profile() as report:
+            result = func(*args)
+        print(report)
+        return result
+
+    def _lpy(self, args, cell, local_ns):
         # arguments 'code' in line are prepended to the cell lines
         if cell is None:
             code = ''
@@ -271,7 +293,8 @@ class LpyMagics(Magics):
         if parameters:
             self._lsys.context().updateNamespace(parameters)
         if code:
-            self._lsys.setCode(code, parameters)
+            with profiling.span('setCode'):
+                self._lsys.setCode(code, parameters)
 
 
         #################################################
@@ -292,8 +315,8 @@ class LpyMagics(Magics):
                 self._lsys.makeCurrent()
                 workstring = lpy.AxialTree(workstring)
                 self._lsys.done()
-            elif isinstance(workstring, MTG):
-                workstring = mtg2lpy(workstring,self._lsys)
+            elif isinstance(workstring, openalea_mtg.MTG):
+                workstring = mtgio.mtg2lpy(workstring,self._lsys)
             else:
                 pass
 
@@ -318,31 +341,28 @@ class LpyMagics(Magics):
         if len(parameters) > 0:
             self._lsys.context().updateNamespace(parameters)
 
-        print('DEBUG: ', workstring, c_iter, n)
-        tree = self._lsys.iterate(workstring,c_iter,n)
+        with profiling.span('iterate'):
+            tree = self._lsys.iterate(workstring,c_iter,n)
 
         if args.axialtree:
             axial_name = unicode_to_str(args.axialtree[0])
             self.shell.push({axial_name: tree})
 
 
-        scene = self._lsys.sceneInterpretation(tree)
+        with profiling.span('sceneInterpretation'):
+            scene = self._lsys.sceneInterpretation(tree)
         if args.scene and scene:
             self.shell.push({args.scene[0]: scene})
 
         mtg = None
         if args.mtg:
             mtg_name = unicode_to_str(args.mtg[0])
-            mtg = lpy2mtg(tree, self._lsys, scene=scene)
+            with profiling.span('lpy2mtg'):
+                mtg = mtgio.lpy2mtg(tree, self._lsys, scene=scene)
             self.shell.push({mtg_name: mtg})
 
-        if args.format is not None:
-            plot_format = args.format
-        else:
-            plot_format = 'png'
-
+        plot_format = args.format if args.format is not None else self._plot_format
 
-        key = 'LpyMagic.Lpy'
         display_data = {}
 
         # Publish text output
@@ -353,20 +373,17 @@ class LpyMagics(Magics):
         # Publish images
         image = self._plot3d(scene, format=plot_format)
         if image is not None:
-        	plot_mime_type = _mimetypes.get(plot_format, 'image/png')
-        	#width, height = [int(s) for s in size.split(',')]
-        	#for image in images:
-        	display_data[plot_mime_type]= image
-
-	        """
-	        if args.output:
-	            for output in ','.join(args.output).split(','):
-	                output = unicode_to_str(output)
-	                self.shell.push({output: self._oct.get(output)})
-	        """
-	        #for source, data in display_data:
-	        #    self._publish_display_data(source, data)
-	        self._publish_display_data(data=display_data)
+            plot_mime_type = _mimetypes.get(plot_format, 'image/png')
+            display_data[plot_mime_type] = image
+
+        """
+        if args.output:
+            for output in ','.join(args.output).split(','):
+                output = unicode_to_str(output)
+                self.shell.push({output: self._oct.get(output)})
+        """
+        if display_data:
+            self._publish_display_data(data=display_data)
 
         if return_output:
             return tree if not mtg else mtg
@@ -400,7 +417,13 @@ class LpyMagics(Magics):
 
     @argument(
         '-f', '--format', action='store',
-        help='Plot format (png, svg or jpg).'
+        help='Plot format (png, svg or jpg) of an offscreen rendered image. '
+             'By default, an interactive k3d widget is displayed.'
+        )
+    @argument(
+        '-p', '--profile', action='store_true',
+        help='Print the time spent in each phase (setCode, iterate, '
+             'sceneInterpretation, lpy2mtg, plot).'
         )
 
     @needs_local_scope
@@ -450,8 +473,9 @@ class LpyMagics(Magics):
 
         '''
         args = parse_argstring(self.lpy, line)
+        return self._profiled(self._lpy_iter, args, local_ns)
 
-        # arguments 'code' in line are prepended to the cell lines
+    def _lpy_iter(self, args, local_ns):
         return_output = True
 
 
@@ -469,8 +493,8 @@ class LpyMagics(Magics):
             except KeyError:
                 ws = self.shell.user_ns[workstring]
 
-            if isinstance(ws,MTG):
-                workstring = mtg2lpy(ws,self._lsys)
+            if isinstance(ws,openalea_mtg.MTG):
+                workstring = mtgio.mtg2lpy(ws,self._lsys)
             else:
                 workstring = ws
 
@@ -482,30 +506,28 @@ class LpyMagics(Magics):
         if args.nbstep:
            n = int(args.nbstep[0])
 
-        tree = self._lsys.iterate(workstring,n0,n)
+        with profiling.span('iterate'):
+            tree = self._lsys.iterate(workstring,n0,n)
 
         if args.axialtree:
             axial_name = unicode_to_str(args.axialtree[0])
             self.shell.push({axial_name: tree})
 
-        scene = self._lsys.sceneInterpretation(tree)
+        with profiling.span('sceneInterpretation'):
+            scene = self._lsys.sceneInterpretation(tree)
         if args.scene:
             self.shell.push({args.scene[0]: scene})
 
         g = None
         if args.mtg:
             mtg_name = unicode_to_str(args.mtg[0])
-            g = lpy2mtg(tree, self._lsys, scene=scene)
+            with profiling.span('lpy2mtg'):
+                g = mtgio.lpy2mtg(tree, self._lsys, scene=scene)
             self.shell.push({mtg_name: g})
 
-        if args.format is not None:
-            plot_format = args.format
-        else:
-            plot_format = 'png'
-
+        plot_format = args.format if args.format is not None else self._plot_format
 
-        key = 'LpyMagic.Lpy'
-        display_data = []
+        display_data = {}
 
         # Publish text output
         """
@@ -513,12 +535,10 @@ class LpyMagics(Magics):
             display_data.append((key, {'text/plain': text_output}))
         """
         # Publish images
-        images = [self._plot3d(scene, format=plot_format)]
-
-        plot_mime_type = _mimetypes.get(plot_format, 'image/png')
-        #width, height = [int(s) for s in size.split(',')]
-        for image in images:
-            display_data.append((key, {plot_mime_type: image}))
+        image = self._plot3d(scene, format=plot_format)
+        if image is not None:
+            plot_mime_type = _mimetypes.get(plot_format, 'image/png')
+            display_data[plot_mime_type] = image
 
         """
         if args.output:
@@ -526,8 +546,8 @@ class LpyMagics(Magics):
                 output = unicode_to_str(output)
                 self.shell.push({output: self._oct.get(output)})
         """
-        for source, data in display_data:
-            self._publish_display_data(source, data)
+        if display_data:
+            self._publish_display_data(data=display_data)
 
         if return_output:
             return tree if not args.mtg else g
@@ -0,0 +1,237 @@
+""" Memory-budgeted tessellation of large scenes.
+
+`tessellate` converts shapes one by one and appends their arrays to
+growable output buffers, so that only one shape's temporaries are alive
+at a time. A buffer that would hold more than its share of the budget in
+memory is moved to an (unlinked) temporary file and memory-mapped.
+
+`track` measures the peak of the memory allocated meanwhile (Python
+objects and NumPy arrays) with `tracemalloc`::
+
+    with track() as report:
+        tessellated, stats = tessellate(scene, '512MB')
+    report.update(stats)
+    print(format_report(report))
+"""
+from __future__ import absolute_import
+
+import contextlib
+import tempfile
+import time
+import tracemalloc
+
+from . import profiling
+from ._lazy import lazy_import
+from .appearance import material
+from .tessellation import TessellatedScene, discretize
+
+np = lazy_import('numpy')
+pgl = lazy_import('openalea.plantgl.all')
+
+_UNITS = {'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30}
+
+
+def parse_size(size):
+    """Return a number of bytes from an int or a string such as '512MB'"""
+    if not isinstance(size, str):
+        return int(size)
+    text = size.strip().lower().rstrip('b').rstrip('i')
+    factor = _UNITS.get(text[-1:], 1)
+    if factor > 1:
+        text = text[:-1]
+    return int(float(text) * factor)
+
+
+class GrowableArray(object):
+    """Append-only array of rows of `width` values.
+
+    The rows are kept in memory until they would use more than `limit`
+    bytes, and are then moved to a memory-mapped temporary file.
+    """
+
+    def __init__(self, dtype, width, limit=None):
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.limit = limit
+        self.size = 0
+        self._data = np.empty((0, width), dtype=self.dtype)
+        self._file = None
+
+    @property
+    def row_bytes(self):
+        return self.width * self.dtype.itemsize
+
+    @property
+    def nbytes(self):
+        return self.size * self.row_bytes
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def _map(self, capacity):
+        self._file.truncate(capacity * self.row_bytes)
+        return np.memmap(self._file, dtype=self.dtype, mode='r+',
+                         shape=(capacity, self.width))
+
+    def spill(self):
+        """Move the rows to a temporary file"""
+        if self._file is not None:
+            return
+        self._file = tempfile.TemporaryFile(prefix='oawidgets-')
+        data = self._map(max(len(self._data), 1))
+        data[:self.size] = self._data[:self.size]
+        self._data = data
+        profiling.count('spilled buffers')
+
+    def _reserve(self, n):
+        if n <= len(self._data):
+            return
+        capacity = max(n, 2 * len(self._data), 1024)
+        if self._file is None and self.limit is not None and capacity * self.row_bytes > self.limit:
+            self.spill()
+        if self._file is not None:
+            self._data.flush()
+            self._data = self._map(capacity)
+            return
+        data = np.empty((capacity, self.width), dtype=self.dtype)
+        data[:self.size] = self._data[:self.size]
+        self._data = data
+
+    def append(self, rows):
+        """Append an array of rows and return the view on them"""
+        rows = np.asarray(rows).reshape(-1, self.width)
+        start = self.size
+        self._reserve(start + len(rows))
+        self.size = start + len(rows)
+        self._data[start:self.size] = rows
+        return self._data[start:self.size]
+
+    def array(self):
+        """Return the rows (a view, memory-mapped when spilled)"""
+        return self._data[:self.size]
+
+    def finish(self):
+        """Trim the storage to the rows and return them (memory-mapped
+        when spilled). Views returned before must not be used anymore."""
+        if len(self._data) == self.size:
+            return self._data
+        if self._file is None or self.size == 0:
+            self._data = self._data[:self.size].copy()
+        else:
+            self._data.flush()
+            self._data = None
+            self._data = self._map(self.size)
+        return self._data
+
+
+@profiling.traced('tessellate')
+def tessellate(shapes, budget):
+    """Tessellate the surfaces of `shapes` in bounded memory.
+
+    `budget` is a number of bytes (or a string such as '512MB'); each of
+    the vertex, index and texture coordinate buffers may use a quarter
+    of it in memory before being spilled to disk.
+
+    Return a TessellatedScene (see `TessellatedScene.from_shapes`) and
+    a report of the bytes produced and spilled.
+    """
+    budget = parse_size(budget)
+    t0 = time.perf_counter()
+    vertices = GrowableArray(np.float32, 3, budget // 4)
+    indices = GrowableArray(np.uint32, 3, budget // 4)
+    uvs = None
+    ids, colors, opacity, textures, nv, nt = [], [], [], [], [], []
+
+    d, dt = pgl.Tesselator(), None
+    for obj in shapes:
+        if isinstance(obj.geometry, pgl.Text) or obj.geometry.isACurve():
+            continue
+        color, alpha, texture = material(obj.appearance)
+        if texture:
+            dt = dt or pgl.Tesselator()
+            mesh = discretize(obj.geometry, dt, texcoords=True)
+        else:
+            mesh = discretize(obj.geometry, d)
+
+        offset = vertices.size
+        vertices.append(mesh[0])
+        triangles = indices.append(mesh[1])
+        triangles += np.uint32(offset)
+        if texture and uvs is None:
+            uvs = GrowableArray(np.float32, 2, budget // 4)
+            uvs.append(np.zeros((offset, 2), dtype=np.float32))
+        if uvs is not None:
+            uvs.append(mesh[2] if texture else np.zeros((len(mesh[0]), 2), dtype=np.float32))
+
+        ids.append(obj.id)
+        colors.append(color)
+        opacity.append(alpha)
+        textures.append(texture)
+        nv.append(len(mesh[0]))
+        nt.append(len(mesh[1]))
+        del mesh, triangles
+
+    opacity = np.asarray(opacity, dtype=np.float32)
+    texture_ids, images = None, []
+    if uvs is not None:
+        images = sorted(set(t for t in textures if t))
+        texture_ids = np.array([images.index(t) if t else -1 for t in textures],
+                               dtype=np.int32)
+    buffers = [b for b in (vertices, indices, uvs) if b is not None]
+    # the buffers grow by doubling: keep only the rows
+    tessellated = TessellatedScene(
+        vertices.finish(), indices.finish(), np.asarray(ids, dtype=np.int64),
+        np.concatenate([[0], np.cumsum(nv)]).astype(np.int64),
+        np.concatenate([[0], np.cumsum(nt)]).astype(np.int64),
+        np.asarray(colors, dtype=np.uint8).reshape(-1, 3),
+        opacity=None if (opacity >= 1).all() else opacity,
+        uvs=None if uvs is None else uvs.finish(),
+        texture_ids=texture_ids, textures=images)
+
+    profiling.count('shapes', len(ids))
+    profiling.count('vertices', vertices.size)
+    profiling.count('triangles', indices.size)
+    report = {'budget': budget,
+              'shapes': len(ids),
+              'vertices': vertices.size,
+              'triangles': indices.size,
+              'bytes': sum(b.nbytes for b in buffers),
+              'spilled': sum(b.nbytes for b in buffers if b.spilled),
+              'time': time.perf_counter() - t0}
+    return tessellated, report
+
+
+@contextlib.contextmanager
+def track():
+    """Record the peak of the memory allocated in the block in the
+    'peak' entry of the yielded dict"""
+    report = {}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    # else (Python 3.8): the peak since tracing started, an upper bound
+    base = tracemalloc.get_traced_memory()[0]
+    try:
+        yield report
+    finally:
+        report['peak'] = tracemalloc.get_traced_memory()[1] - base
+        if started:
+            tracemalloc.stop()
+
+
+def _size(nbytes):
+    return '%.1f MB' % (nbytes / float(1 << 20))
+
+
+def format_report(report):
+    """Return a one line summary of a budgeted conversion"""
+    line = ('Budgeted conversion: %d shapes, %s of meshes (%s spilled to disk), '
+            'peak %s for a budget of %s in %.3f s'
+            % (report['shapes'], _size(report['bytes']), _size(report['spilled']),
+               _size(report.get('peak', 0)), _size(report['budget']), report['time']))
+    if report.get('peak', 0) > report['budget']:
+        line += ' (over budget)'
+    return line
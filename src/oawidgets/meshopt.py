@@ -0,0 +1,196 @@
+""" Optimisation of merged scene meshes.
+
+Vectorized vertex welding, removal of degenerate triangles and
+reordering of vertices and triangles for locality, applied to a
+:class:`~oawidgets.tessellation.TessellatedScene`.
+
+Vertices are only welded inside a shape, so that per-shape ranges,
+colors and properties stay valid.
+"""
+from __future__ import absolute_import
+
+import time
+
+from . import profiling
+from ._lazy import lazy_import
+from .tessellation import TessellatedScene
+
+np = lazy_import('numpy')
+
+
+def _offsets(counts):
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+# offsets of a cell and of half of its neighbours: the other half is
+# found from the neighbour side
+_NEIGHBOURS = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+               for dz in (-1, 0, 1)][13:]
+_PRIMES = (73856093, 19349663, 83492791)
+
+
+def _hash(group, cells):
+    """Return an int64 key of the (group, cell) of each vertex"""
+    keys = np.bitwise_xor.reduce(cells * np.array(_PRIMES, dtype=np.int64), axis=1)
+    return keys ^ (group * 2654435761)
+
+
+def _clusters(group, vertices, tolerance):
+    """Return, for each vertex, the lowest index of the vertices of its
+    group linked to it by steps not longer than `tolerance`.
+
+    Vertices closer than `tolerance` are in the same or in adjacent cells
+    of a grid of that size: only those pairs are compared.
+    """
+    n = len(vertices)
+    points = vertices.astype(np.float64)
+    cells = np.floor(points / tolerance).astype(np.int64)
+    keys = _hash(group, cells)
+    order = np.argsort(keys, kind='stable')
+    ukeys, ustart, ucount = np.unique(keys[order], return_index=True, return_counts=True)
+
+    first, second = [], []
+    for offset in _NEIGHBOURS:
+        target = _hash(group, cells + offset)
+        pos = np.minimum(np.searchsorted(ukeys, target), len(ukeys) - 1)
+        count = np.where(ukeys[pos] == target, ucount[pos], 0)
+        i = np.repeat(np.arange(n), count)
+        local = np.arange(len(i)) - np.repeat(np.cumsum(count) - count, count)
+        j = order[np.repeat(ustart[pos], count) + local]
+        # hash collisions and farther vertices are dropped here
+        near = (group[i] == group[j]) & (i != j)
+        near &= np.linalg.norm(points[i] - points[j], axis=1) <= tolerance
+        first.append(i[near])
+        second.append(j[near])
+    i, j = np.concatenate(first), np.concatenate(second)
+
+    labels = np.arange(n)
+    while len(i):
+        low = np.minimum(labels[i], labels[j])
+        new = labels.copy()
+        np.minimum.at(new, i, low)
+        np.minimum.at(new, j, low)
+        new = new[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    return labels
+
+
+def _duplicates(group, vertices):
+    """Return, for each vertex, the lowest index of the identical vertices
+    of its group"""
+    n = len(vertices)
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+    keys = _hash(group, vertices.view(np.int32).astype(np.int64))
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    start = np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]])
+    first = np.empty(n, dtype=np.int64)
+    first[order] = order[np.maximum.accumulate(np.where(start, np.arange(n), 0))]
+    # hash collisions are left apart
+    same = (group[first] == group) & (vertices[first] == vertices).all(axis=1)
+    return np.where(same, first, np.arange(n))
+
+
+def weld(tessellated, tolerance=1e-6):
+    """Merge the vertices of a shape closer than `tolerance` (and with
+    the same texture coordinates).
+
+    Vertices are merged transitively: a chain of close vertices becomes
+    one vertex. With a zero tolerance, only identical vertices are merged.
+    Return the welded vertices, the remapped indices, the number of
+    vertices per shape and the index of the vertex kept for each welded
+    vertex.
+    """
+    k = len(tessellated)
+    shape_of = np.repeat(np.arange(k, dtype=np.int64), tessellated.vertex_counts())
+    if len(shape_of) == 0:
+        return (tessellated.vertices, tessellated.indices.copy(),
+                np.zeros(k, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    group = shape_of
+    if tessellated.uvs is not None:
+        keys = np.column_stack([shape_of, tessellated.uvs.view(np.int32).astype(np.int64)])
+        group = np.unique(keys, axis=0, return_inverse=True)[1].ravel()
+    labels = _duplicates(group, tessellated.vertices)
+    if tolerance > 0:
+        distinct = np.unique(labels)
+        near = _clusters(group[distinct], tessellated.vertices[distinct], tolerance)
+        labels = distinct[near[np.searchsorted(distinct, labels)]]
+    # the first vertex of each cluster: vertices stay grouped by shape
+    first, inverse = np.unique(labels, return_inverse=True)
+    vertices = tessellated.vertices[first]
+    indices = inverse.ravel()[tessellated.indices].astype(np.uint32)
+    counts = np.bincount(shape_of[first], minlength=k)
+    return vertices, indices, counts, first
+
+
+def degenerate(vertices, indices):
+    """Return a mask of the triangles with repeated vertices or no area"""
+    a, b, c = indices[:, 0], indices[:, 1], indices[:, 2]
+    mask = (a == b) | (b == c) | (a == c)
+    va, vb, vc = vertices[a], vertices[b], vertices[c]
+    area = np.linalg.norm(np.cross(vb - va, vc - va), axis=1)
+    return mask | (area == 0)
+
+
+def reorder(indices, triangle_shape, vertex_shape):
+    """Sort triangles (inside each shape) by their lowest vertex, then
+    renumber vertices in order of first use.
+
+    This is a locality sort, not a vertex cache optimisation (Forsyth,
+    Tipsify): it keeps the indices of neighbour triangles close, which
+    helps compression and streaming, but does not model a GPU cache.
+    Unused vertices are dropped. Return the new indices, the vertex
+    permutation (new -> old) and the triangle permutation.
+    """
+    order = np.lexsort((indices.min(axis=1), triangle_shape))
+    indices = indices[order]
+    used, first = np.unique(indices.ravel(), return_index=True)
+    perm = used[np.argsort(first, kind='stable')]
+    remap = np.zeros(len(vertex_shape), dtype=np.uint32)
+    remap[perm] = np.arange(len(perm), dtype=np.uint32)
+    return remap[indices], perm, order
+
+
+@profiling.traced('optimize')
+def optimize(tessellated, tolerance=1e-6):
+    """Weld, clean and reorder a tessellated scene.
+
+    Return the optimised TessellatedScene and a report (dict) with the
+    number of vertices and triangles before and after, and the time spent.
+    """
+    t0 = time.perf_counter()
+    k = len(tessellated)
+
+    vertices, indices, vcounts, first = weld(tessellated, tolerance)
+    triangle_shape = np.repeat(np.arange(k), tessellated.triangle_counts())
+    keep = ~degenerate(vertices, indices)
+    indices, triangle_shape = indices[keep], triangle_shape[keep]
+
+    vertex_shape = np.repeat(np.arange(k), vcounts)
+    indices, perm, order = reorder(indices, triangle_shape, vertex_shape)
+    vertices = vertices[perm]
+
+    result = TessellatedScene(np.ascontiguousarray(vertices, dtype=np.float32),
+                              np.ascontiguousarray(indices, dtype=np.uint32),
+                              tessellated.ids,
+                              _offsets(np.bincount(vertex_shape[perm], minlength=k)),
+                              _offsets(np.bincount(triangle_shape, minlength=k)),
+                              tessellated.colors,
+                              tessellated.properties,
+                              tessellated.opacity,
+                              None if tessellated.uvs is None else tessellated.uvs[first][perm],
+                              tessellated.texture_ids,
+                              tessellated.textures)
+    report = {'vertices': (tessellated.nb_vertices, result.nb_vertices),
+              'triangles': (tessellated.nb_triangles, result.nb_triangles),
+              'time': time.perf_counter() - t0}
+    return result, report
+
+
+def format_report(report):
+    """Return a one line summary of an optimisation report"""
+    (v0, v1), (t0, t1) = report['vertices'], report['triangles']
+    return ('Mesh optimisation: %d -> %d vertices, %d -> %d triangles in %.3f s'
+            % (v0, v1, t0, t1, report['time']))
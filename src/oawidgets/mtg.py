@@ -1,11 +1,50 @@
 from __future__ import absolute_import
 
-from openalea.mtg import traversal
-from pyvis.network import Network
-try:
-    import colorcet as cc
-except ImportError:
-    cc = None
+from . import profiling
+from ._lazy import lazy_import
+from .columns import aggregate as aggregate_table, property_table
+from .layout import depth, mtg_layout, tree_layout
+
+np = lazy_import('numpy')
+
+traversal = lazy_import('openalea.mtg.traversal')
+pyvis_network = lazy_import('pyvis.network')
+
+__all__ = ['tooltips', 'dict2html', 'network', 'plot']
+
+
+def _palette():
+    try:
+        import colorcet as cc
+    except ImportError:
+        return ['#6e6efd', '#fb7e81', '#ad85e4', '#7be141', '#ffff00', '#ffa807', '#eb7df4', '#e6ffe3', '#d2e5ff', '#ffd1d9']
+    return cc.glasbey_light
+
+def _property(table, name):
+    """Return a property as a list (None where it is missing)"""
+    if name not in table:
+        return [None] * len(table)
+    values = table[name].tolist()
+    return [v if m else None for v, m in zip(values, table.masks[name].tolist())]
+
+
+def tooltips(table, properties=None):
+    """Return the HTML tooltips of the rows of a PropertyTable
+    (see `dict2html`)"""
+    if properties is None:
+        hidden = ['index', 'parent', 'complex', 'label', 'edge_type', 'scale']
+        properties = [k for k in table.names if k not in hidden]
+    elif isinstance(properties, str):
+        properties = [properties]
+    lines = [[] for _ in range(len(table))]
+    for name in sorted(properties):
+        if name not in table:
+            continue
+        values = table[name].tolist()
+        for row in np.flatnonzero(table.masks[name]).tolist():
+            lines[row].append('%s %s' % (name, values[row]))
+    return ['<br>'.join(line) for line in lines]
+
 
 def dict2html(args, properties=None):
     """Return a HTML element from a dictionary"""
@@ -21,13 +60,48 @@ def dict2html(args, properties=None):
     return '<br>'.join(['%s %s'%(k, args[k]) for k in properties])
 
 
-def plot(g, properties=None, selection=None, hlayout=True, scale=None, labels=None, height='800px', width='900px', **kwds):
-    """Plot a MTG in the Jupyter Notebook"""
-    G = Network(notebook=True, directed=True,
-                layout=hlayout, heading="",
+def _expand(G, g, vid, level, color, properties=None, position=None):
+    """Add the components of the aggregate `vid` below its node"""
+    table = property_table(g, vids=g.components(vid), structure=True)
+    if len(table) == 0:
+        return
+    parents = np.where(table.masks['parent'], table.rows(table['parent']), -1)
+    levels = depth(parents)
+    titles = tooltips(table, properties)
+    labels = _property(table, 'label')
+    edge_types = _property(table, 'edge_type')
+    coords = {}
+    if position is not None:
+        x, y = tree_layout(parents)
+        # on the right of the aggregate, away from its successor
+        x = position[0] + 60 + 40 * (x - x.min())
+        y = position[1] - 75 * y
+    vids = table.vids.tolist()
+    for row, cid in enumerate(vids):
+        if position is not None:
+            coords = dict(x=float(x[row]), y=float(y[row]), physics=False)
+        G.add_node(cid, shape='circle', label=labels[row], level=level + 1 + int(levels[row]),
+                   color=color, title=titles[row], borderWidth=1, **coords)
+    for row, cid in enumerate(vids):
+        if parents[row] >= 0:
+            G.add_edge(vids[parents[row]], cid, label=edge_types[row],
+                       width=6 if edge_types[row] == '<' else 1)
+        else:
+            # decomposition edge from the aggregate
+            G.add_edge(vid, cid, dashes=True)
+
+
+@profiling.traced('mtg.network')
+def network(g, properties=None, selection=None, hlayout=True, scale=None, labels=None, height='800px', width='900px', layout=None, aggregate=False, expand=(), **kwds):
+    """Return the pyvis Network of a MTG (see `plot`)"""
+    G = pyvis_network.Network(notebook=True, directed=True,
+                layout=hlayout and layout is None, heading="",
                 height=height, width=width)
 
-    if hlayout:
+    if layout is not None:
+        # positions computed in Python (see oawidgets.layout)
+        G.toggle_physics(False)
+    elif hlayout:
         G.hrepulsion()
         G.options.layout.hierarchical.direction='DU'
         G.options.layout.hierarchical.parentCentralization=True
@@ -36,73 +110,82 @@ def plot(g, properties=None, selection=None, hlayout=True, scale=None, labels=No
     	G.repulsion()
 
     if scale is None:
-        scale = g.max_scale()
+        scale = g.max_scale() - 1 if aggregate else g.max_scale()
 
     #Colors
-    if cc is not None:
-        colors = cc.glasbey_light
-    else:
-        colors = ['#6e6efd', '#fb7e81', '#ad85e4', '#7be141', '#ffff00', '#ffa807', '#eb7df4', '#e6ffe3', '#d2e5ff', '#ffd1d9']
+    colors = _palette()
 
     #Data
-    vids = g.vertices(scale=scale)
-    edges = [(g.parent(vid), vid, 6 if g.edge_type(vid) == '<' else 1)
-             for vid in vids if g.parent(vid) is not None]#, 'black' if g.edge_type(vid) == '<' else None
-    pos = g.property('position')
+    with profiling.span('data'):
+        table = property_table(g, scale=scale, structure=True)
+        vids = table.vids
+        parents = np.where(table.masks['parent'], table.rows(table['parent']), -1)
+        has_parent = parents >= 0
+        edge_types = _property(table, 'edge_type')
+        node_labels = _property(table, 'label')
+
+    #Aggregates of the components
+    if aggregate:
+        with profiling.span('aggregate'):
+            summary = aggregate_table(g, scale)
+            table.columns.update(summary.columns)
+            table.masks.update(summary.masks)
+            node_labels = ['%s (%d)' % (label, count) for label, count
+                           in zip(node_labels, summary['count'].tolist())]
 
     #Level determination
-    levels = {}
-    root = next(g.component_roots_at_scale_iter(g.root, scale=scale))
-    for vid in traversal.pre_order(g, root):
-        levels[vid] = 0 if g.parent(vid) is None else levels[g.parent(vid)]+1
-
-    #Component roots
-    component_roots = {}
-    component_roots[root] = True
-    for vid in traversal.pre_order(g, root):
-        pid = g.parent(vid)
-        if pid is None:
-            component_roots[vid] = True
-        elif g.complex(pid) != g.complex(vid):
-            component_roots[vid] = True
-
-    #Groups
-    groups = {}
-    for count, vid in enumerate(traversal.pre_order(g, g.complex(root))):
-        nc = len(colors)
-        groups[vid] = colors[count%nc]
-        pid = g.parent(vid)
-        if pid:
-            if groups[vid] == groups[pid]:
-                groups[vid] = colors[(1789*count+17)%nc]
+    with profiling.span('levels'):
+        levels = depth(parents)
+
+        #Component roots
+        complexes = table['complex']
+        component_roots = ~has_parent
+        component_roots[has_parent] = (complexes[parents[has_parent]] != complexes[has_parent])
+
+        #Groups
+        groups = {}
+        root = next(g.component_roots_at_scale_iter(g.root, scale=scale))
+        for count, vid in enumerate(traversal.pre_order(g, g.complex(root))):
+            nc = len(colors)
+            groups[vid] = colors[count%nc]
+            pid = g.parent(vid)
+            if pid:
+                if groups[vid] == groups[pid]:
+                    groups[vid] = colors[(1789*count+17)%nc]
 
     #Nodes adding
-    for vid in vids:
-        shape = 'box' if vid in component_roots else 'circle'
-        if labels is None:
-            label_node = g.label(vid)
-        else:
-            label_node = labels[vid]
-        level = levels[vid]
+    with profiling.span('nodes'):
         if selection is None:
-            color = groups[g.complex(vid)]
+            node_colors = [groups.get(c) for c in complexes.tolist()]
         else:
-            color = '#fb7e81' if vid in selection else '#97c2fc'
-        title = dict2html(g[vid], properties=properties)
-        #gap, mult = max(pos[1])-min(pos[1]), 20
-        #x = mult*pos[g.parent(vid)][0] if g.parent(vid) else pos[vid][0]
-        # #y = mult*(gap - pos[vid][1]) #if g.parent(vid) else None
-        #physics = False if ('edge_type' not in g[vid] or g[vid]['edge_type']=='<' or g.nb_children(vid)>0) else True
-        G.add_node(vid, shape=shape,
-                    label=label_node,
-                    level=level,
-                    color=color,
-                    title=title,
-                    borderWidth=3,
-                    #x=x,
-                    #y=y,
-                    #physics=physics,
-                    )
+            selected = np.isin(vids, list(selection))
+            node_colors = np.where(selected, '#fb7e81', '#97c2fc').tolist()
+        if labels is not None:
+            node_labels = [labels[vid] for vid in vids.tolist()]
+        titles = tooltips(table, properties)
+        shapes = np.where(component_roots, 'box', 'circle').tolist()
+
+        positions = {}
+        x = y = None
+        if layout is not None:
+            with profiling.span('layout'):
+                x, y = mtg_layout(g, scale, parents, layout)
+            if layout == 'tidy':
+                x, y = 60 * x, -150 * y
+            else:
+                x, y = 150 * x, -150 * y
+
+        for row, (vid, shape, label_node, level, color, title) in enumerate(zip(
+                vids.tolist(), shapes, node_labels, levels.tolist(), node_colors, titles)):
+            if layout is not None:
+                positions = dict(x=float(x[row]), y=float(y[row]), physics=False)
+            G.add_node(vid, shape=shape,
+                        label=label_node,
+                        level=level,
+                        color=color,
+                        title=title,
+                        borderWidth=3,
+                        **positions)
 
     #Cluster
     if False:
@@ -114,8 +197,43 @@ def plot(g, properties=None, selection=None, hlayout=True, scale=None, labels=No
                 G.add_edge(vid, cid, hidden=True)
 
     #Edges adding
-    for edge in edges:
-        label_edge = g.edge_type(edge[1])
-        G.add_edge(edge[0], edge[1], label=label_edge, width=edge[2])
+    with profiling.span('edges'):
+        children = np.flatnonzero(has_parent)
+        sources = vids[parents[children]].tolist()
+        targets = vids[children].tolist()
+        for source, target, child in zip(sources, targets, children.tolist()):
+            label_edge = edge_types[child]
+            G.add_edge(source, target, label=label_edge,
+                       width=6 if label_edge == '<' else 1)
+
+    #Expanded aggregates
+    if aggregate and expand:
+        with profiling.span('expand'):
+            rows = table.rows(list(expand))
+            for vid, row in zip(list(expand), rows.tolist()):
+                if row < 0:
+                    continue
+                position = None if x is None else (float(x[row]), float(y[row]))
+                _expand(G, g, vid, int(levels[row]), node_colors[row], properties, position)
+
+    profiling.count('nodes', len(vids))
+    profiling.count('edges', len(children))
+    return G
+
+
+@profiling.traced('mtg.plot')
+def plot(g, properties=None, selection=None, hlayout=True, scale=None, labels=None, height='800px', width='900px', layout=None, aggregate=False, expand=(), **kwds):
+    """Plot a MTG in the Jupyter Notebook.
+
+    With `layout` ('tidy' or 'radial'), node positions are computed in
+    Python and cached (see `oawidgets.layout`), and the browser physics
+    is turned off.
 
-    return G.show('mtg.html')
+    With `aggregate`, the vertices at `scale` (max scale - 1 by default)
+    are shown with the number of their components and the sums and
+    means of the component properties (see `oawidgets.columns.aggregate`).
+    The components of the vertices in `expand` are displayed below them.
+    """
+    G = network(g, properties, selection, hlayout, scale, labels, height, width, layout, aggregate, expand, **kwds)
+    with profiling.span('show'):
+        return G.show('mtg.html')
@@ -4,15 +4,35 @@
 """
 from __future__ import absolute_import
 
-from openalea.plantgl.all import *
-import matplotlib
-import numpy as np
-import k3d
+import math
+import weakref
 
-import six
-from six.moves import zip
+from ._lazy import lazy_import
+from .columns import property_table
+from .tessellation import TessellatedScene
+from . import appearance, controls, memory, spatial, meshopt, profiling
 
+pgl = lazy_import('openalea.plantgl.all')
+np = lazy_import('numpy')
+k3d = lazy_import('k3d')
+widgets = lazy_import('ipywidgets')
 
+__all__ = ['tomesh', 'curve2mesh', 'tessellated2mesh', 'tessellated2meshes', 'scene2mesh',
+           'budgeted_scene2mesh', 'group_meshes_by_color', 'PlantGL', 'save_tessellation',
+           'load_tessellation', 'mtg2mesh', 'MTG', 'gallery']
+
+
+def __getattr__(name):
+    # PlantGL names used to be available from this module (star import)
+    if name.startswith('__'):
+        raise AttributeError(name)
+    try:
+        return getattr(pgl, name)
+    except (AttributeError, ImportError):
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+@profiling.traced('tomesh')
 def tomesh(geometry, d=None, side='front'):
     """Return a mesh from a geometry object"""
     isCurve = False
@@ -20,7 +40,7 @@ def tomesh(geometry, d=None, side='front'):
         isCurve = True
     
     if d is None:
-        d = Tesselator() if not isCurve else Discretizer()
+        d = pgl.Tesselator() if not isCurve else pgl.Discretizer()
 
     geometry.apply(d)
 
@@ -33,100 +53,163 @@ def tomesh(geometry, d=None, side='front'):
         mesh = k3d.mesh(vertices=pts, indices=idl, side=side)
     return mesh
 
+@profiling.traced('curve2mesh')
 def curve2mesh(crv, property=None):
     """Return a mesh from a curve"""
-    d = Discretizer()
-    indices, vertices, colors, attribute=[], [], [], []
-    colordict={}
-    count=-1
-    offset=0
+    d = pgl.Discretizer()
+    vertices, colors, opacity, counts = [], [], [], []
     for obj in crv:
         status = obj.apply(d)
         pts = [(pt.x, pt.y, pt.z) for pt in list(d.result.pointList)]
-
         vertices.extend(pts)
-        color = obj.appearance.ambient
-        color = (color.red, color.green, color.blue)
-        if color not in colordict:
-            count += 1
-            colordict[color] = count
-        offset += len(pts)
-        attribute.extend([colordict[color]]*len(pts))
-
-    colors=np.array(list(colordict.keys()))/255.
+        color, alpha, _ = appearance.material(obj.appearance)
+        colors.append(color)
+        opacity.append(alpha)
+        counts.append(len(pts))
+
     if property is not None:
         property = np.repeat(np.array(property), [3]*len(property))
-        mesh = k3d.line(vertices, shader='mesh', attribute=property, color_map=k3d.basic_color_maps.Jet, color_range=[min(property), max(property)])
-    elif len(colors) == 1:
-        colorhex = int(matplotlib.colors.rgb2hex(colors[0])[1:], 16)
+        return k3d.line(vertices, shader='mesh', attribute=property, color_map=k3d.basic_color_maps.Jet, color_range=[min(property), max(property)])
+
+    packed = np.repeat(appearance.pack(colors, opacity), counts)
+    attribute, color_map, _, values = appearance.color_attributes(packed)
+    if len(values) == 1:
         mesh = k3d.line(vertices, shader='mesh')
-        mesh.color=colorhex
+        mesh.color = int(values[0] >> 8)
     else:
-        color_map = list(zip(list(np.array(list(colordict.values())) /
-                             float(max(colordict.values()))),
-                        colors[:,0],
-                        colors[:,1],
-                        colors[:,2]))
-        color_map.sort()
-        #color_map=k3d.basic_color_maps.Jet
-        attribute = list(np.array(attribute)/float(max(attribute)))
         mesh = k3d.line(vertices, shader='mesh', attribute=attribute, color_map=color_map)
+    # lines have a single opacity
+    if len(opacity):
+        mesh.opacity = float(min(opacity))
+    return mesh
+
+# TessellatedScene of each mesh built from one, used for picking
+_sources = weakref.WeakKeyDictionary()
+
 
+def _mesh(tessellated=None, **kwds):
+    """Create a k3d mesh, recording the time and the bytes sent"""
+    with profiling.span('k3d'):
+        mesh = k3d.mesh(**kwds)
+    if tessellated is not None:
+        _sources[mesh] = tessellated
+    if profiling.enabled():
+        profiling.count('bytes', sum(np.asarray(kwds[k]).nbytes
+                                     for k in ('vertices', 'indices', 'attribute') if k in kwds))
     return mesh
 
-def scene2mesh(scene, property=None, side='front'):
-    """Return a mesh from a scene"""
-    d = Tesselator()
-    indices, vertices, colors, attribute=[], [], [], []
-    colordict={}
-    count=-1
-    offset=0
-    curves, texts, meshes = [], [], []
+
+def _mesh_traits(tessellated, property_name=None):
+    """Return the traits (geometry and colors) of the k3d mesh of a
+    TessellatedScene"""
+    traits = {'vertices': tessellated.vertices, 'indices': tessellated.indices}
+    with profiling.span('colors'):
+        if property_name is not None:
+            attribute = tessellated.vertex_property(property_name)
+            traits.update(attribute=attribute,
+                          color_map=k3d.basic_color_maps.Jet,
+                          color_range=[float(np.nanmin(attribute)), float(np.nanmax(attribute))])
+            return traits
+
+        packed = appearance.pack(tessellated.colors, tessellated.shape_opacity())
+        attribute, color_map, opacity_function, values = appearance.color_attributes(packed)
+        # unique colors per shape, then one attribute value per vertex
+        attribute = np.repeat(attribute, tessellated.vertex_counts())
+    if len(values) == 1:
+        traits.update(color=int(values[0] >> 8), opacity=float(values[0] & 255) / 255.)
+    elif len(values) > 1:
+        traits.update(attribute=attribute, color_map=color_map, color_range=[0., 1.])
+        if opacity_function is not None:
+            traits['opacity_function'] = opacity_function
+    return traits
+
+
+@profiling.traced('tessellated2mesh')
+def tessellated2mesh(tessellated, property_name=None, side='front'):
+    """Return a mesh from a TessellatedScene"""
+    return _mesh(tessellated, side=side, **_mesh_traits(tessellated, property_name))
+
+
+def _texture_mesh(tessellated, texture, side='front'):
+    """Return a textured mesh from the shapes of a TessellatedScene
+    sharing the same image"""
+    data, fmt = appearance.texture_file(texture)
+    mesh = _mesh(tessellated,
+                 vertices=tessellated.vertices,
+                 indices=tessellated.indices,
+                 uvs=tessellated.uvs,
+                 texture=data,
+                 texture_file_format=fmt,
+                 side=side)
+    opacity = tessellated.shape_opacity()
+    if len(opacity):
+        mesh.opacity = float(opacity.min())
+    return mesh
+
+
+@profiling.traced('tessellated2meshes')
+def tessellated2meshes(tessellated, property_name=None, side='front'):
+    """Return the meshes of a TessellatedScene: one mesh for the colored
+    shapes, and one mesh per texture image.
+    """
+    if property_name is not None or tessellated.texture_ids is None:
+        return [tessellated2mesh(tessellated, property_name, side=side)]
+    texture_ids = tessellated.texture_ids
+    meshes = []
+    colored = np.flatnonzero(texture_ids < 0)
+    if len(colored):
+        meshes.append(tessellated2mesh(tessellated.subset(colored), side=side))
+    for i, texture in enumerate(tessellated.textures):
+        rows = np.flatnonzero(texture_ids == i)
+        if len(rows):
+            meshes.append(_texture_mesh(tessellated.subset(rows), texture, side))
+    return meshes
+
+
+def _optimized(tessellated, optimize):
+    """Apply the mesh optimisation if requested and print its report.
+
+    `optimize` is True (default tolerance) or the welding tolerance.
+    """
+    if not optimize:
+        return tessellated
+    tolerance = 1e-6 if optimize is True else float(optimize)
+    tessellated, report = meshopt.optimize(tessellated, tolerance)
+    print(meshopt.format_report(report))
+    return tessellated
+
+
+def _split(scene):
+    """Return the curves, the k3d texts and the surfaces of a scene"""
+    curves, texts, shapes = [], [], []
     for obj in scene:
-        if isinstance(obj.geometry, Text):
+        if isinstance(obj.geometry, pgl.Text):
             pos = obj.geometry.position
             texts.append(k3d.text(obj.geometry.string, [pos.x, pos.y, pos.z], label_box=False, color=0xaaaaaa))
             continue
         if obj.geometry.isACurve():
             curves.append(obj)
             continue
-        obj.geometry.apply(d)
-        idl = np.array([tuple(index) for index in list(d.discretization.indexList)])+offset
-        pts = [(pt.x, pt.y, pt.z) for pt in list(d.discretization.pointList)]
+        shapes.append(obj)
+    return curves, texts, shapes
 
-        vertices.extend(pts)
-        color = obj.appearance.ambient
-        color = (color.red, color.green, color.blue)
-        if color not in colordict:
-            count += 1
-            colordict[color] = count
-        offset += len(pts)
-        attribute.extend([colordict[color]]*len(pts))
-        indices.extend(idl.tolist())
-    colors=np.array(list(colordict.keys()))/255.
+
+@profiling.traced('scene2mesh')
+def scene2mesh(scene, property=None, side='front', optimize=False):
+    """Return a mesh from a scene.
+
+    With `optimize` (True or a tolerance), vertices are welded and
+    degenerate triangles removed (ignored when `property` is given).
+    """
+    curves, texts, shapes = _split(scene)
+    tessellated = TessellatedScene.from_shapes(shapes)
     if property is not None:
         property = np.repeat(np.array(property), [3]*len(property))
-        mesh = k3d.mesh(vertices=vertices, indices=indices, attribute=property, color_map=k3d.basic_color_maps.Jet, color_range=[min(property), max(property)], side=side)
-    elif len(colors) == 1:
-        colorhex = int(matplotlib.colors.rgb2hex(colors[0])[1:], 16)
-        mesh = k3d.mesh(vertices=vertices, indices=indices, side=side)
-        mesh.color=colorhex
+        mesh = _mesh(tessellated, vertices=tessellated.vertices, indices=tessellated.indices, attribute=property, color_map=k3d.basic_color_maps.Jet, color_range=[min(property), max(property)], side=side)
+        meshes = [mesh]
     else:
-        color_map = list(zip(list(np.array(list(colordict.values())) /
-                             float(max(colordict.values()))),
-                        colors[:,0],
-                        colors[:,1],
-                        colors[:,2]))
-        color_map.sort()
-        #color_map=k3d.basic_color_maps.Jet
-        attribute = list(np.array(attribute)/float(max(attribute)))
-        mesh = k3d.mesh(vertices=vertices,
-                        indices=indices,
-                        attribute=attribute,
-                        color_map=color_map,
-                        side=side)
-
-    meshes = [mesh]
+        meshes = tessellated2meshes(_optimized(tessellated, optimize), side=side)
+
     if curves:
         meshes.extend([curve2mesh([crv]) for crv in curves])
         print("Display %d curves"%len(curves))
@@ -136,15 +219,15 @@ def scene2mesh(scene, property=None, side='front'):
     return meshes
 
 
-def group_meshes_by_color(scene, side='front'):
+@profiling.traced('group_meshes_by_color')
+def group_meshes_by_color(scene, side='front', optimize=False):
     """ Create one mesh by objects sharing the same color.
     """
 
     group_color = {}
 
     for obj in scene:
-        color = obj.appearance.ambient
-        color = (color.red, color.green, color.blue)
+        color, _, _ = appearance.material(obj.appearance)
 
         group_color.setdefault(color, []).append(obj)
 
@@ -157,7 +240,11 @@ def group_meshes_by_color(scene, side='front'):
     for k in k_to_pop:
         group_color.pop(k)
 
-    meshes_scene = [scene2mesh(objects, side=side)[0] for objects in group_color.values()]
+    meshes_scene = []
+    for objects in group_color.values():
+        # colored mesh, and textured meshes if any
+        meshes = scene2mesh(objects, side=side, optimize=optimize)
+        meshes_scene.extend(mesh for mesh in meshes if not isinstance(mesh, k3d.objects.Text))
     # only one curve element in group_color - so take that element to split its lines
     if curves:
         meshes_crv = [curve2mesh([obj]) for obj in list(curves.values())[0]]
@@ -165,64 +252,304 @@ def group_meshes_by_color(scene, side='front'):
     return meshes_scene
 
 
-def PlantGL(pglobject, plot=None, group_by_color=True, property=None, side='front'):
-    """Return a k3d plot from PlantGL shape, geometry and scene objects"""
+@profiling.traced('budgeted_scene2mesh')
+def budgeted_scene2mesh(scene, memory_budget, side='front'):
+    """Return the meshes of a scene converted within a memory budget
+    (bytes or a string such as '512MB') and print a peak memory report.
+
+    Shapes are tessellated one by one into bounded buffers, spilled to
+    a memory-mapped temporary file when over budget (see
+    `oawidgets.memory`).
+    """
+    curves, texts, shapes = _split(scene)
+    with memory.track() as report:
+        tessellated, stats = memory.tessellate(shapes, memory_budget)
+        meshes = tessellated2meshes(tessellated, side=side)
+        del tessellated, shapes
+    report.update(stats)
+    print(memory.format_report(report))
+
+    if curves:
+        meshes.extend([curve2mesh([crv]) for crv in curves])
+        print("Display %d curves"%len(curves))
+    meshes.extend(texts)
+    return meshes
+
+
+def _scene2meshes(scene, group_by_color=True, property=None, side='front', optimize=False,
+                  memory_budget=None):
+    if memory_budget is not None:
+        return budgeted_scene2mesh(scene, memory_budget, side=side)
+    if group_by_color:
+        return group_meshes_by_color(scene, side=side, optimize=optimize)
+    return scene2mesh(scene, property, side=side, optimize=optimize)
+
+
+def PlantGL(pglobject, plot=None, group_by_color=True, property=None, side='front',
+            region=None, follow_camera=False, optimize=False, profile=False,
+            picking=False, memory_budget=None):
+    """Return a k3d plot from PlantGL shape, geometry and scene objects.
+
+    A TessellatedScene (e.g. produced by another process) is displayed
+    as is; `property` is then the name of one of its property columns.
+
+    For a Scene, `region` (a BoundingBox or a (lower, upper) pair of
+    points) restricts the display to the shapes it intersects. With
+    `follow_camera`, only the shapes in the view frustum are displayed,
+    and they are updated when the camera moves.
+
+    With `optimize` (True or a welding tolerance), scene meshes are
+    welded and cleaned before being sent (see `oawidgets.meshopt`).
+
+    With `memory_budget` (bytes or a string such as '512MB'), a Scene is
+    converted shape by shape into bounded buffers spilled to a temporary
+    file when over budget, and a peak memory report is printed (see
+    `budgeted_scene2mesh`); `group_by_color`, `property` and `optimize`
+    are then ignored.
+
+    With `picking` (True or a `callback(id, properties)`), clicking or
+    hovering a shape of a scene shows its id, and the plot is returned in
+    a VBox with the label (see `oawidgets.controls.Picker`).
+
+    With `profile`, return the plot and a report of the time spent in
+    each stage and of the shapes, vertices, triangles and bytes sent
+    (see `oawidgets.profiling`).
+    """
+    if profile:
+        with profiling.profile() as report:
+            plot = PlantGL(pglobject, plot, group_by_color, property, side,
+                           region, follow_camera, optimize, picking=picking,
+                           memory_budget=memory_budget)
+        return plot, report
+
     if plot is None:
         plot = k3d.plot()
 
-    if isinstance(pglobject, Geometry):
+    if isinstance(pglobject, TessellatedScene):
+        for mesh in tessellated2meshes(pglobject, property, side=side):
+            plot += mesh
+    elif isinstance(pglobject, pgl.Geometry):
         mesh = tomesh(pglobject, side=side)
         plot += mesh
-    elif isinstance(pglobject, Shape):
+    elif isinstance(pglobject, pgl.Shape):
         mesh = tomesh(pglobject.geometry, side=side)
         mesh.color = pglobject.appearance.ambient.toUint()
         plot += mesh
-    elif isinstance(pglobject, Scene):
-        if group_by_color:
-            meshes = group_meshes_by_color(pglobject, side=side)
-            for mesh in meshes:
-                plot += mesh
-        else:
-            meshes = scene2mesh(pglobject, property, side=side)
-            for mesh in meshes:
-                plot += mesh
+    elif isinstance(pglobject, pgl.Scene):
+        index = None
+        if region is not None or follow_camera:
+            with profiling.span('index'):
+                index = spatial.BoundingBoxIndex.from_scene(pglobject)
+        if region is not None:
+            rows = index.query(region)
+            pglobject = index.subscene(rows)
+            # the camera only selects among the shapes of the region
+            index = index.subindex(rows)
+
+        meshes = _scene2meshes(pglobject, group_by_color, property, side, optimize,
+                               memory_budget) if len(pglobject) else []
+        for mesh in meshes:
+            plot += mesh
+
+        if follow_camera:
+            convert = lambda scene: _scene2meshes(scene, group_by_color, property, side, optimize,
+                                                  memory_budget)
+            spatial.follow_camera(plot, index, meshes, convert)
 
     plot.lighting = 3
     #plot.colorbar_object_id = randint(0, 1000)
+    if picking:
+        return widgets.VBox([plot, _picking(plot, plot.objects, picking)])
     return plot
 
 
-def mtg2mesh(g, property_name):
+def _picking(plot, meshes, picking, properties=None, range_filter=None):
+    """Wire picking on the `meshes` built from a TessellatedScene.
+
+    `picking` is True or a callback `callback(id, properties)`.
+    Return the HTML label describing the picked shape.
+    """
+    callback = picking if callable(picking) else None
+    label = widgets.HTML()
+    for obj in meshes:
+        tessellated = _sources.get(obj)
+        if tessellated is not None:
+            controls.Picker(obj, tessellated, properties, callback,
+                            range_filter=range_filter, label=label)
+    plot.mode = 'callback'
+    return label
+
+
+def save_tessellation(obj, filename, property_names=()):
+    """Tessellate a scene or an MTG and save it in a binary file.
+
+    For an MTG, the `property_names` are saved as property columns.
+    The file is reloaded with `load_tessellation` without tessellation.
+    """
+    if isinstance(obj, TessellatedScene):
+        tessellated = obj
+    elif isinstance(obj, pgl.Scene):
+        tessellated = TessellatedScene.from_shapes(obj)
+    else:
+        tessellated = TessellatedScene.from_mtg(obj, property_names)
+    tessellated.save(filename)
+    return tessellated
+
+
+def load_tessellation(filename, mmap=True):
+    """Return a TessellatedScene memory-mapped from a file.
+
+    The result can be given directly to `PlantGL` or `MTG`.
+    """
+    return TessellatedScene.load(filename, mmap=mmap)
+
+
+def _mtg_tessellation(g, property_names, optimize=False):
+    """Tessellate the geometry of the vertices where a property is defined"""
+    table = property_table(g, property_names, vids=g.property('geometry'))
+    defined = np.zeros(len(table), dtype=bool)
+    for name in table.names:
+        defined |= table.masks[name]
+    vids = table.vids[defined].tolist()
+    tessellated = TessellatedScene.from_mtg(g, property_names, vids=vids)
+    return _optimized(tessellated, optimize)
+
+
+@profiling.traced('mtg2mesh')
+def mtg2mesh(g, property_name, optimize=False):
     """Return a mesh from an MTG object depending on a specific property"""
-    d = Tesselator()
-    geometry = g.property('geometry')
-    prop = g.property(property_name)
-    vertices, indices, attr = [], [], []
-    offset = 0
-    for vid, geom in six.iteritems(geometry):
-        if vid in prop:
-            geom.apply(d)
-            idl = np.array([tuple(index) for index in list(d.discretization.indexList)])+offset
-            pts = [(pt.x, pt.y, pt.z) for pt in list(d.discretization.pointList)]
-            vertices.extend(pts)
-            offset += len(pts)
-            indices.extend(idl.tolist())
-            attr.extend([prop[vid]]*len(pts))
-        #else:
-        #    attr.extend([0]*len(pts))
-    mesh = k3d.mesh(vertices=vertices,
-                        indices=indices,
-                        attribute=attr,
-                        color_map=k3d.basic_color_maps.Jet)
-    return mesh
+    tessellated = _mtg_tessellation(g, [property_name], optimize)
+    return tessellated2mesh(tessellated, property_name)
+
+
+def MTG(g, property_name, plot=None, optimize=False, profile=False, filter=None,
+        picking=False):
+    """Return a plot from an MTG object.
+
+    `g` may also be a TessellatedScene built with
+    `TessellatedScene.from_mtg`, e.g. in another process.
+
+    `property_name` may be a list of properties: the MTG is then
+    tessellated once and a dropdown switches the displayed property
+    (see `oawidgets.controls.PropertySelector`).
 
+    With `filter` ('opacity' or 'indices'), a range slider shows only
+    the organs whose property is in the selected range, without sending
+    the geometry again (see `oawidgets.controls.RangeFilter`).
 
-def MTG(g, property_name, plot=None):
-    """Return a plot from an MTG object"""
+    With `picking` (True or a `callback(vid, properties)`), clicking or
+    hovering an organ shows its vertex id and properties.
+
+    With a list of properties, a filter or picking, the controls and the
+    plot are returned in a VBox.
+
+    With `profile`, return the plot and a profiling report.
+    """
+    if profile:
+        with profiling.profile() as report:
+            plot = MTG(g, property_name, plot, optimize, filter=filter,
+                       picking=picking)
+        return plot, report
+
+    if plot is None:
+        plot = k3d.plot()
+
+    property_names = [property_name] if isinstance(property_name, str) else list(property_name)
+    if isinstance(g, TessellatedScene):
+        tessellated = g
+    else:
+        tessellated = _mtg_tessellation(g, property_names, optimize)
+    mesh = tessellated2mesh(tessellated, property_names[0])
+    plot += mesh
+    plot.lighting = 3
+
+    children = []
+    range_filter = None
+    if filter:
+        mode = 'opacity' if filter is True else filter
+        range_filter = controls.RangeFilter(mesh, tessellated, property_names[0], mode)
+        children.append(range_filter.slider)
+    if len(property_names) > 1:
+        on_change = range_filter.set_property if range_filter is not None else None
+        selector = controls.PropertySelector(mesh, tessellated, property_names, on_change)
+        children.insert(0, selector.dropdown)
+
+    if not children and not picking:
+        return plot
+    box = [widgets.HBox(children), plot] if children else [plot]
+    if picking:
+        properties = None if isinstance(g, TessellatedScene) else g.get_vertex_property
+        box.append(_picking(plot, [mesh], picking, properties, range_filter))
+    return widgets.VBox(box)
+
+
+def _grid_translations(scenes, columns=None, spacing=0.2):
+    """Return the translations placing tessellated scenes on a grid.
+
+    Scenes are centered in square cells (in x, y) sized after the largest
+    scene, `spacing` being the gap relative to the cell size.
+    """
+    n = len(scenes)
+    columns = columns or int(math.ceil(math.sqrt(n)))
+    lower = np.zeros((n, 3))
+    upper = np.zeros((n, 3))
+    for i, tessellated in enumerate(scenes):
+        if tessellated.nb_vertices:
+            lower[i] = tessellated.vertices.min(axis=0)
+            upper[i] = tessellated.vertices.max(axis=0)
+    cell = (upper - lower)[:, :2].max(initial=0.) * (1. + spacing) or 1.
+    center = (lower + upper) / 2.
+    i = np.arange(n)
+    translations = np.zeros((n, 3), dtype=np.float32)
+    translations[:, 0] = (i % columns) * cell - center[:, 0]
+    translations[:, 1] = -(i // columns) * cell - center[:, 1]
+    return translations
+
+
+@profiling.traced('gallery')
+def gallery(objects, plot=None, property_name=None, columns=None, spacing=0.2,
+            side='front', picking=False):
+    """Display several scenes or MTGs side by side in one plot.
+
+    The objects (PlantGL scenes, MTGs or TessellatedScenes) are laid out
+    on a grid of `columns` columns and merged in a single mesh.
+    The same object given several times is converted once, and geometry
+    objects shared between scenes are tessellated once.
+
+    With `property_name`, MTGs are colored by this property. The index of
+    each object is stored in the 'plant' property column, e.g. for
+    `picking` (see `PlantGL`).
+    """
     if plot is None:
         plot = k3d.plot()
+    objects = list(objects)
+    property_names = [] if property_name is None else [property_name]
+
+    unique = {}
+    for obj in objects:
+        unique.setdefault(id(obj), obj)
+    cache = {}
+
+    def convert(obj):
+        if isinstance(obj, TessellatedScene):
+            return obj
+        if isinstance(obj, pgl.Scene):
+            return TessellatedScene.from_shapes(obj, cache=cache)
+        return TessellatedScene.from_mtg(obj, property_names, cache=cache)
+
+    # tessellation holds the GIL: the objects are converted in turn
+    with profiling.span('convert'):
+        converted = dict((key, convert(obj)) for key, obj in unique.items())
+    profiling.count('unique objects', len(unique))
 
-    mesh = mtg2mesh(g, property_name)
+    scenes = [converted[id(obj)] for obj in objects]
+    with profiling.span('layout'):
+        merged = TessellatedScene.concatenate(scenes, _grid_translations(scenes, columns, spacing))
+        merged.properties['plant'] = np.repeat(np.arange(len(scenes)),
+                                               [len(sc) for sc in scenes]).astype(np.float32)
+    mesh = tessellated2mesh(merged, property_name, side=side)
     plot += mesh
     plot.lighting = 3
+    if picking:
+        return widgets.VBox([plot, _picking(plot, [mesh], picking)])
     return plot
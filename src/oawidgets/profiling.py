@@ -0,0 +1,193 @@
+""" Instrumentation of the display calls.
+
+Timing spans and counters are recorded in a :class:`Report` while a
+``profile()`` context is active::
+
+    from oawidgets import profiling
+    with profiling.profile() as report:
+        plot = PlantGL(scene)
+    print(report)
+
+Span names are nested with '/' following the active spans of the
+current thread.
+When no report and no tracer is active, ``span()`` returns a shared
+no-op context and ``count()`` / ``add()`` return immediately.
+
+External tracers are plugged with ``add_tracer(tracer)``; a tracer is
+called as ``tracer(event, name, value)`` with event 'enter' (value None),
+'exit' (value: duration in seconds), 'add' (value: duration measured by
+the caller, see ``add()``) or 'count' (value: increment).
+"""
+from __future__ import absolute_import
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+
+_reports = []
+_tracers = []
+_local = threading.local()
+
+
+def _stack():
+    """Return the names of the active spans of the current thread"""
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+class Report(object):
+    """Timing and counters of the profiled calls"""
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self.time = 0.
+
+    def add_span(self, name, duration, calls=1):
+        span = self.spans.setdefault(name, [0, 0.])
+        span[0] += calls
+        span[1] += duration
+
+    def add_count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {'time': self.time,
+                'spans': dict((name, {'calls': c, 'time': t})
+                              for name, (c, t) in self.spans.items()),
+                'counters': dict(self.counters)}
+
+    def __str__(self):
+        lines = ['%-48s %8s %12s' % ('span', 'calls', 'time (ms)')]
+        for name in sorted(self.spans):
+            calls, duration = self.spans[name]
+            lines.append('%-48s %8d %12.2f' % (name, calls, duration * 1e3))
+        lines.append('%-48s %8s %12.2f' % ('total', '', self.time * 1e3))
+        for name in sorted(self.counters):
+            lines.append('%-48s %21s' % (name, self.counters[name]))
+        return '\n'.join(lines)
+
+    __repr__ = __str__
+
+
+def enabled():
+    """Return True when something records the spans"""
+    return bool(_reports or _tracers)
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('name', 'key', 't0')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = _stack()
+        stack.append(self.name)
+        self.key = '/'.join(stack)
+        for tracer in _tracers:
+            tracer('enter', self.key, None)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        duration = time.perf_counter() - self.t0
+        _stack().pop()
+        for report in _reports:
+            report.add_span(self.key, duration)
+        for tracer in _tracers:
+            tracer('exit', self.key, duration)
+        return False
+
+
+def span(name):
+    """Return a context manager timing the `name` stage"""
+    if not (_reports or _tracers):
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def traced(name):
+    """Decorator recording each call of a function in the `name` span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwds):
+            if not (_reports or _tracers):
+                return func(*args, **kwds)
+            with _Span(name):
+                return func(*args, **kwds)
+        return wrapper
+    return decorator
+
+
+def add(name, duration, calls=1):
+    """Add a duration measured by the caller to the `name` span"""
+    if not (_reports or _tracers):
+        return
+    key = '/'.join(_stack() + [name])
+    for report in _reports:
+        report.add_span(key, duration, calls)
+    for tracer in _tracers:
+        tracer('add', key, duration)
+
+
+def count(name, value=1):
+    """Increment the counter `name` (shapes, vertices, bytes, ...)"""
+    if not (_reports or _tracers):
+        return
+    for report in _reports:
+        report.add_count(name, value)
+    for tracer in _tracers:
+        tracer('count', name, value)
+
+
+def start():
+    """Start recording in a new Report (see also `profile`)"""
+    report = Report()
+    report.time = time.perf_counter()
+    _reports.append(report)
+    return report
+
+
+def stop(report):
+    """Stop recording in `report` and return it"""
+    if report in _reports:
+        _reports.remove(report)
+        report.time = time.perf_counter() - report.time
+    return report
+
+
+@contextmanager
+def profile():
+    """Record the spans and counters of the enclosed calls in a Report"""
+    report = start()
+    try:
+        yield report
+    finally:
+        stop(report)
+
+
+def add_tracer(tracer):
+    """Register an external tracer (see module documentation)"""
+    _tracers.append(tracer)
+    return tracer
+
+
+def remove_tracer(tracer):
+    _tracers.remove(tracer)
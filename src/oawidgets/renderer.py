@@ -0,0 +1,159 @@
+""" Asynchronous display of a changing PlantGL scene.
+
+A simulation submits its successive scenes to an :class:`AsyncRenderer`
+without waiting: only the latest pending scene is kept, it is converted
+in a worker thread, and the mesh of the plot is updated in place at most
+`fps` times per second::
+
+    renderer = AsyncRenderer(fps=10)
+    renderer.plot.display()
+    renderer.start()
+    for step in range(1000):
+        renderer.submit(simulate(step))     # never blocks
+        await asyncio.sleep(0)              # let the frames be drawn
+    await renderer.close()
+
+`start` is called from the event loop thread (e.g. a notebook cell);
+`submit` may be called from any thread. The simulation runs in another
+thread, or yields to the event loop as above for the frames to be drawn.
+A scene that cannot be converted or drawn stops the renderer: the error
+is raised by the next `submit` and by `close`.
+"""
+from __future__ import absolute_import
+
+import asyncio
+
+from . import profiling
+from ._lazy import lazy_import
+from .tessellation import TessellatedScene
+
+np = lazy_import('numpy')
+k3d = lazy_import('k3d')
+
+_STOP = object()
+
+
+class AsyncRenderer(object):
+    """Coalesce the updates of a k3d plot from a stream of scenes.
+
+    :Parameters:
+        - `plot`: k3d plot (a new one by default)
+        - `fps`: maximum number of frames drawn per second
+        - `property_name`: property column colouring TessellatedScenes
+        - `executor`: concurrent.futures executor of the conversions
+          (the default executor of the event loop by default)
+    """
+
+    def __init__(self, plot=None, fps=10., property_name=None, side='front',
+                 executor=None):
+        self.plot = k3d.plot() if plot is None else plot
+        self.interval = 1. / fps if fps else 0.
+        self.property_name = property_name
+        self.side = side
+        self.executor = executor
+        self.mesh = None
+        self.frames = 0
+        self.dropped = 0
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Start drawing in the current event loop"""
+        if self._task is not None:
+            return self
+        self._loop = asyncio.get_event_loop()
+        # bounded: a new scene replaces the pending one (latest wins)
+        self._queue = asyncio.Queue(maxsize=1)
+        self._task = self._loop.create_task(self._run())
+        return self
+
+    def submit(self, scene):
+        """Queue a Scene or a TessellatedScene to be drawn (never blocks)"""
+        if self._loop is None:
+            raise RuntimeError('AsyncRenderer.start() must be called first')
+        if self._task.done():
+            # the drawing stopped on an error: raise it here
+            self._task.result()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._put(scene)
+        else:
+            self._loop.call_soon_threadsafe(self._put, scene)
+
+    async def close(self):
+        """Draw the pending scene, then stop.
+
+        Raise the error that stopped the renderer, if any.
+        """
+        task = self._task
+        if task is None:
+            return
+        self._task = self._loop = None
+        stop = asyncio.ensure_future(self._queue.put(_STOP))
+        # the task may fail while the stop request waits for a free slot
+        await asyncio.wait([stop, task], return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+        await task
+
+    def _put(self, scene):
+        if self._queue.full():
+            pending = self._queue.get_nowait()
+            if pending is _STOP:
+                # stopping: keep the stop request
+                self._queue.put_nowait(pending)
+                return
+            self.dropped += 1
+            profiling.count('dropped frames')
+        self._queue.put_nowait(scene)
+
+    def _convert(self, scene):
+        """Return the mesh traits of a scene (run in a worker thread)"""
+        from .plantgl import _mesh_traits
+        with profiling.span('convert'):
+            if not isinstance(scene, TessellatedScene):
+                scene = TessellatedScene.from_shapes(scene)
+            return _mesh_traits(scene, self.property_name)
+
+    def _draw(self, traits):
+        with profiling.span('draw'):
+            if self.mesh is None:
+                self.mesh = k3d.mesh(side=self.side, **traits)
+                self.plot += self.mesh
+                return
+            # traits of the previous frame not set by this one
+            reset = {'attribute': np.zeros(0, dtype=np.float32),
+                     'opacity_function': np.zeros(0, dtype=np.float32),
+                     'opacity': 1.}
+            reset.update(traits)
+            with self.mesh.hold_sync():
+                for name, value in reset.items():
+                    setattr(self.mesh, name, value)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last = None
+        while True:
+            scene = await self._queue.get()
+            if scene is _STOP:
+                break
+            if last is not None:
+                delay = last + self.interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    # a newer scene may have replaced this one meanwhile
+                    if self._queue.full():
+                        newer = self._queue.get_nowait()
+                        if newer is _STOP:
+                            self._queue.put_nowait(newer)
+                        else:
+                            scene = newer
+                            self.dropped += 1
+                            profiling.count('dropped frames')
+            traits = await loop.run_in_executor(self.executor, self._convert, scene)
+            self._draw(traits)
+            last = loop.time()
+            self.frames += 1
@@ -0,0 +1,203 @@
+""" Render a PlantGL scene to a static image.
+
+Software rendering of PlantGL objects to PNG/JPEG (matplotlib Agg) and
+SVG, without any browser or OpenGL context. It is used when notebooks
+are executed headlessly (nbconvert, papermill).
+"""
+from __future__ import absolute_import
+
+import io
+
+from ._lazy import lazy_import
+from .appearance import material
+from .tessellation import TessellatedScene
+
+np = lazy_import('numpy')
+pgl = lazy_import('openalea.plantgl.all')
+
+
+_formats = {'png': 'png', 'jpg': 'jpeg', 'jpeg': 'jpeg', 'svg': 'svg'}
+
+
+def _shapes(pglobject):
+    """Return the list of shapes of a PlantGL object"""
+    if isinstance(pglobject, pgl.Scene):
+        return list(pglobject)
+    if isinstance(pglobject, pgl.Shape):
+        return [pglobject]
+    return [pgl.Shape(pglobject)]
+
+
+def _tessellate(shapes):
+    """Return vertices, triangles, triangle colors and polylines"""
+    tessellated = TessellatedScene.from_shapes(shapes)
+    vertices = tessellated.vertices.astype(float)
+    triangles = tessellated.indices.astype(np.int64)
+    colors = np.repeat(tessellated.colors / 255., tessellated.triangle_counts(), axis=0)
+
+    d = pgl.Discretizer()
+    lines = []
+    for obj in shapes:
+        if isinstance(obj.geometry, pgl.Text) or not obj.geometry.isACurve():
+            continue
+        obj.geometry.apply(d)
+        pts = np.array([(pt.x, pt.y, pt.z) for pt in d.result.pointList], dtype=float)
+        if len(pts) > 1:
+            color, _, _ = material(obj.appearance)
+            lines.append((pts, tuple(c / 255. for c in color)))
+    return vertices, triangles, colors, lines
+
+
+def _camera(azimuth, elevation):
+    """Return the eye, right and up unit vectors of an orthographic camera"""
+    az, el = np.radians(azimuth), np.radians(elevation)
+    eye = np.array([np.cos(el) * np.cos(az), np.cos(el) * np.sin(az), np.sin(el)])
+    right = np.cross(-eye, [0., 0., 1.])
+    if np.linalg.norm(right) < 1e-6:
+        right = np.array([np.sin(az), -np.cos(az), 0.])
+    right /= np.linalg.norm(right)
+    up = np.cross(right, -eye)
+    return eye, right, up
+
+
+def project(pglobject, width=640, height=480, azimuth=-60, elevation=20, margin=10):
+    """Project a PlantGL object on the image plane.
+
+    Return the triangles in pixel coordinates (m, 3, 2) sorted back to
+    front, their shaded colors (m, 3), and the polylines as a list of
+    ((k, 2) pixel coordinates, color) pairs.
+    """
+    vertices, triangles, colors, lines = _tessellate(_shapes(pglobject))
+    return project_mesh(vertices, triangles, colors, lines, width=width, height=height,
+                        azimuth=azimuth, elevation=elevation, margin=margin)
+
+
+def project_mesh(vertices, triangles, colors, lines=(), width=640, height=480,
+                 azimuth=-60, elevation=20, margin=10):
+    """Project a triangle mesh (vertices (n, 3), triangles (m, 3), triangle
+    colors (m, 3) in [0, 1]) and polylines on the image plane, as `project`.
+    """
+    vertices = np.asarray(vertices, dtype=float)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    colors = np.asarray(colors, dtype=float).reshape(-1, 3)
+    eye, right, up = _camera(azimuth, elevation)
+
+    points = [vertices] + [pts for pts, _ in lines]
+    allpts = np.concatenate(points) if sum(len(p) for p in points) else np.zeros((1, 3))
+    center = (allpts.min(axis=0) + allpts.max(axis=0)) / 2.
+    xy = np.stack([(allpts - center).dot(right), (allpts - center).dot(up)], axis=1)
+    extent = np.maximum(xy.max(axis=0) - xy.min(axis=0), 1e-9)
+    mid = (xy.max(axis=0) + xy.min(axis=0)) / 2.
+    scale = min((width - 2 * margin) / extent[0], (height - 2 * margin) / extent[1])
+
+    def to_pixels(pts):
+        p = pts - center
+        x = (p.dot(right) - mid[0]) * scale + width / 2.
+        y = height / 2. - (p.dot(up) - mid[1]) * scale
+        return np.stack([x, y], axis=-1)
+
+    if len(triangles):
+        a, b, c = (vertices[triangles[:, i]] for i in range(3))
+        normals = np.cross(b - a, c - a)
+        norm = np.linalg.norm(normals, axis=1)
+        norm[norm == 0] = 1.
+        normals /= norm[:, None]
+        light = eye + 0.5 * up
+        light /= np.linalg.norm(light)
+        # Two-sided headlight, quantized so that neighbour faces share colors
+        shade = 0.35 + 0.65 * np.abs(normals.dot(light))
+        shade = np.round(shade * 32) / 32.
+        colors = np.clip(colors * shade[:, None], 0., 1.)
+
+        depth = (vertices - center).dot(eye)[triangles].mean(axis=1)
+        order = np.argsort(depth, kind='stable')
+        tri2d = to_pixels(vertices)[triangles[order]]
+        colors = colors[order]
+    else:
+        tri2d = np.zeros((0, 3, 2))
+
+    lines2d = [(to_pixels(pts), color) for pts, color in lines]
+    return tri2d, colors, lines2d
+
+
+def _hexcolors(colors):
+    rgb = np.round(np.asarray(colors) * 255).astype(int)
+    return ['#%02x%02x%02x' % tuple(c) for c in rgb]
+
+
+def _svg(tri2d, colors, lines2d, width, height, background, wireframe):
+    """Return a SVG document; consecutive faces of same color share a path"""
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+           'viewBox="0 0 %d %d">' % (width, height, width, height)]
+    if background is not None:
+        out.append('<rect width="100%%" height="100%%" fill="%s"/>' % background)
+
+    if wireframe:
+        style = 'fill="none" stroke="%s" stroke-width="0.5"'
+    else:
+        style = 'fill="%s" stroke="%s" stroke-width="0.4" stroke-linejoin="round"'
+
+    hexes = _hexcolors(colors)
+    faces = ['M%.1f %.1fL%.1f %.1fL%.1f %.1fZ' % tuple(t.ravel()) for t in tri2d]
+    start = 0
+    for i in range(1, len(faces) + 1):
+        if i == len(faces) or hexes[i] != hexes[start]:
+            attrs = style % ((hexes[start],) if wireframe else (hexes[start], hexes[start]))
+            out.append('<path %s d="%s"/>' % (attrs, ''.join(faces[start:i])))
+            start = i
+
+    for pts, color in lines2d:
+        d = 'M' + 'L'.join('%.1f %.1f' % tuple(p) for p in pts)
+        out.append('<path fill="none" stroke="%s" stroke-width="1" d="%s"/>'
+                   % (_hexcolors([color])[0], d))
+    out.append('</svg>')
+    return '\n'.join(out)
+
+
+def _raster(tri2d, colors, lines2d, width, height, background, wireframe, format):
+    """Return PNG or JPEG bytes rendered with the matplotlib Agg backend"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import PolyCollection, LineCollection
+
+    dpi = 100.
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.set_xlim(0, width)
+    ax.set_ylim(height, 0)
+
+    if len(tri2d):
+        if wireframe:
+            faces = PolyCollection(tri2d, facecolors='none', edgecolors=colors, linewidths=0.5)
+        else:
+            faces = PolyCollection(tri2d, facecolors=colors, edgecolors=colors,
+                                   linewidths=0.3, antialiased=False)
+        ax.add_collection(faces)
+    if lines2d:
+        ax.add_collection(LineCollection([pts for pts, _ in lines2d],
+                                         colors=[color for _, color in lines2d]))
+
+    buf = io.BytesIO()
+    kwds = {'pil_kwargs': {'quality': 90}} if format == 'jpeg' else {}
+    fig.savefig(buf, format=format, dpi=dpi,
+                facecolor=background if background is not None else 'none', **kwds)
+    return buf.getvalue()
+
+
+def snapshot(pglobject, format='png', width=640, height=480,
+             azimuth=-60, elevation=20, background='white', wireframe=False):
+    """Return a static image of a PlantGL shape, geometry or scene.
+
+    PNG and JPEG images are returned as bytes, SVG as a string.
+    """
+    fmt = _formats.get(format.lower())
+    if fmt is None:
+        raise ValueError('Unknown image format %r (png, jpg or svg)' % format)
+
+    tri2d, colors, lines2d = project(pglobject, width=width, height=height,
+                                     azimuth=azimuth, elevation=elevation)
+    if fmt == 'svg':
+        return _svg(tri2d, colors, lines2d, width, height, background, wireframe)
+    return _raster(tri2d, colors, lines2d, width, height, background, wireframe, fmt)
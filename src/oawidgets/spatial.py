@@ -0,0 +1,193 @@
+""" Spatial index over the shapes of a PlantGL scene.
+
+A uniform grid on the bounding boxes of the shapes selects the shapes
+in a region or in a camera view frustum, so that only those are
+tessellated and sent to the browser.
+"""
+from __future__ import absolute_import
+
+from ._lazy import lazy_import
+
+np = lazy_import('numpy')
+pgl = lazy_import('openalea.plantgl.all')
+
+
+def _box(region):
+    """Return the lower and upper corners of a region"""
+    if isinstance(region, (tuple, list)):
+        lower, upper = region
+        return np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    lower, upper = region.lowerLeftCorner, region.upperRightCorner
+    return (np.array([lower.x, lower.y, lower.z]),
+            np.array([upper.x, upper.y, upper.z]))
+
+
+def frustum(camera, fov=60., aspect=2.):
+    """Return the (5, 3) normals and (5,) offsets of the view frustum planes.
+
+    `camera` is a k3d camera: position, target and up vector.
+    A point x is inside when ``normals.dot(x) + offsets >= 0`` for all planes.
+    There is no far plane.
+    """
+    camera = np.asarray(camera, dtype=float)
+    position, target, up = camera[:3], camera[3:6], camera[6:9]
+    forward = target - position
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, up)
+    right /= np.linalg.norm(right)
+    up = np.cross(right, forward)
+
+    tv = np.tan(np.radians(fov) / 2.)
+    th = tv * aspect
+    normals = np.array([forward,
+                        th * forward + right, th * forward - right,
+                        tv * forward + up, tv * forward - up])
+    normals[1:] /= np.linalg.norm(normals[1:], axis=1)[:, None]
+    offsets = -normals.dot(position)
+    return normals, offsets
+
+
+class BoundingBoxIndex(object):
+    """Uniform grid (in the horizontal plane) over shape bounding boxes.
+
+    Each shape is registered in every cell its box overlaps. The cells
+    are stored in a compressed form: shape rows sorted by cell.
+    """
+
+    def __init__(self, shapes, lower, upper, cell_size=None):
+        self.shapes = list(shapes)
+        self.lower = np.asarray(lower, dtype=float).reshape(-1, 3)
+        self.upper = np.asarray(upper, dtype=float).reshape(-1, 3)
+        n = len(self.lower)
+        if n == 0:
+            self.origin, self.cell_size, self.shape = np.zeros(2), 1., (1, 1)
+            self._cells = self._rows = np.zeros(0, dtype=np.int64)
+            return
+
+        self.origin = self.lower[:, :2].min(axis=0)
+        extent = self.upper[:, :2].max(axis=0) - self.origin
+        if cell_size is None:
+            # about one shape per cell, and not smaller than a typical shape
+            typical = np.median((self.upper - self.lower)[:, :2].max(axis=1))
+            cell_size = max(typical, np.sqrt(extent[0] * extent[1] / n), 1e-9)
+        self.cell_size = float(cell_size)
+        self.shape = tuple(np.floor(extent / self.cell_size).astype(int) + 1)
+
+        lo = self._cell(self.lower[:, :2])
+        hi = self._cell(self.upper[:, :2])
+        span = hi - lo + 1
+        counts = span[:, 0] * span[:, 1]
+        rows = np.repeat(np.arange(n), counts)
+        # position of each entry inside the block of cells of its shape
+        local = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        ix = lo[rows, 0] + local % span[rows, 0]
+        iy = lo[rows, 1] + local // span[rows, 0]
+        cells = ix * self.shape[1] + iy
+        order = np.argsort(cells, kind='stable')
+        self._cells, self._rows = cells[order], rows[order]
+
+    @classmethod
+    def from_scene(cls, scene, cell_size=None):
+        """Build the index with the PlantGL bounding box of each shape"""
+        shapes = list(scene)
+        lower, upper = [], []
+        for sh in shapes:
+            bbox = pgl.BoundingBox(sh)
+            lo, up = bbox.lowerLeftCorner, bbox.upperRightCorner
+            lower.append((lo.x, lo.y, lo.z))
+            upper.append((up.x, up.y, up.z))
+        return cls(shapes, lower, upper, cell_size=cell_size)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def _cell(self, xy):
+        cell = np.floor((xy - self.origin) / self.cell_size).astype(int)
+        return np.clip(cell, 0, np.array(self.shape) - 1)
+
+    def _candidates(self, cells):
+        """Return the shape rows registered in the given cells"""
+        start = np.searchsorted(self._cells, cells, side='left')
+        stop = np.searchsorted(self._cells, cells, side='right')
+        if len(cells) == 0 or (stop - start).sum() == 0:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.concatenate([self._rows[a:b] for a, b in zip(start, stop) if b > a])
+        return np.unique(rows)
+
+    def query(self, region):
+        """Return the rows of the shapes whose box intersects `region`.
+
+        `region` is a PlantGL BoundingBox or a (lower, upper) pair of points.
+        """
+        lower, upper = _box(region)
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        lo, hi = self._cell(lower[:2]), self._cell(upper[:2])
+        ix, iy = np.meshgrid(np.arange(lo[0], hi[0] + 1), np.arange(lo[1], hi[1] + 1))
+        rows = self._candidates((ix * self.shape[1] + iy).ravel())
+        inside = np.all((self.lower[rows] <= upper) & (self.upper[rows] >= lower), axis=1)
+        return rows[inside]
+
+    def query_frustum(self, normals, offsets):
+        """Return the rows of the shapes whose box intersects a frustum"""
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        def visible(lower, upper):
+            # farthest corner along each plane normal
+            keep = np.ones(len(lower), dtype=bool)
+            for n, d in zip(normals, offsets):
+                corner = np.where(n > 0, upper, lower)
+                keep &= corner.dot(n) + d >= 0
+            return keep
+
+        # cells first (with their full height), then the boxes they hold
+        ix, iy = np.divmod(np.unique(self._cells), self.shape[1])
+        zmin, zmax = self.lower[:, 2].min(), self.upper[:, 2].max()
+        clow = np.stack([self.origin[0] + ix * self.cell_size,
+                         self.origin[1] + iy * self.cell_size,
+                         np.full(len(ix), zmin)], axis=1)
+        cup = clow + [self.cell_size, self.cell_size, 0.]
+        cup[:, 2] = zmax
+        cells = (ix * self.shape[1] + iy)[visible(clow, cup)]
+        rows = self._candidates(cells)
+        return rows[visible(self.lower[rows], self.upper[rows])]
+
+    def subindex(self, rows):
+        """Return an index over the shapes at the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        return type(self)([self.shapes[i] for i in rows], self.lower[rows], self.upper[rows])
+
+    def subscene(self, rows):
+        """Return a Scene with the shapes at the given rows"""
+        return pgl.Scene([self.shapes[i] for i in rows])
+
+
+def follow_camera(plot, index, meshes, convert, aspect=2.):
+    """Update the plot with the shapes in the view when the camera moves.
+
+    `meshes` are the k3d objects currently displayed for the indexed
+    scene, and `convert` returns the k3d objects for a Scene.
+    Return the camera observer.
+    """
+    plot.camera_auto_fit = False
+    state = {'visible': None, 'meshes': list(meshes)}
+
+    def update(change):
+        nonlocal plot
+        camera = change['new']
+        if len(camera) < 9:
+            return
+        visible = index.query_frustum(*frustum(camera, plot.camera_fov, aspect))
+        if state['visible'] is not None and np.array_equal(visible, state['visible']):
+            return
+        state['visible'] = visible
+        new_meshes = convert(index.subscene(visible)) if len(visible) else []
+        for mesh in state['meshes']:
+            plot -= mesh
+        for mesh in new_meshes:
+            plot += mesh
+        state['meshes'] = new_meshes
+
+    plot.observe(update, names='camera')
+    return update
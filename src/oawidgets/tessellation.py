@@ -0,0 +1,499 @@
+""" Compact tessellated scene container.
+
+A :class:`TessellatedScene` stores the tessellation of a PlantGL scene or
+of the geometry of an MTG as a few flat NumPy arrays: vertices, triangle
+indices, per-shape ranges, colors and property columns.
+
+The arrays can be packed in a single contiguous buffer with a small
+header, placed in ``multiprocessing.shared_memory``, and mapped back
+zero-copy in another process (e.g. the notebook kernel).
+The same layout is used on disk (`save` / `load`), and files are
+memory-mapped when loaded.
+
+File layout (little endian)::
+
+    magic 'OATSCN01' | uint64 header length | JSON header | padding
+    blocks, each aligned on 64 bytes:
+        vertices (float32, n x 3), indices (uint32, m x 3),
+        ids (int64, k), vertex_offsets (int64, k+1),
+        triangle_offsets (int64, k+1), colors (uint8, k x 3),
+        optionally opacity (float32, k), uvs (float32, n x 2) and
+        texture_ids (int32, k),
+        property:<name> (float32, k) for each property column
+
+The JSON header maps each block name to [offset, dtype, shape], the
+offsets being relative to the end of the padded header, and lists the
+texture image files.
+"""
+from __future__ import absolute_import
+
+import json
+import time
+
+from . import profiling
+from ._lazy import lazy_import
+from .appearance import material
+from .columns import property_table
+
+np = lazy_import('numpy')
+pgl = lazy_import('openalea.plantgl.all')
+
+
+_MAGIC = b'OATSCN01'
+_ALIGN = 64
+
+# name and stored dtype of the fixed blocks
+_BLOCKS = [('vertices', '<f4'),
+           ('indices', '<u4'),
+           ('ids', '<i8'),
+           ('vertex_offsets', '<i8'),
+           ('triangle_offsets', '<i8'),
+           ('colors', 'u1')]
+_PROPERTY_DTYPE = '<f4'
+# name and stored dtype of the optional blocks (appearance)
+_OPTIONAL_BLOCKS = [('opacity', '<f4'),
+                    ('uvs', '<f4'),
+                    ('texture_ids', '<i4')]
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def discretize(geometry, d=None, texcoords=False):
+    """Return the vertices (n, 3) and triangles (m, 3) of a geometry.
+
+    With `texcoords`, also return the texture coordinates (n, 2).
+    """
+    if d is None:
+        d = pgl.Tesselator()
+    if texcoords:
+        d.computeTexCoord(True)
+    if not profiling.enabled():
+        geometry.apply(d)
+        return _arrays(d.discretization, texcoords)
+
+    t0 = time.perf_counter()
+    geometry.apply(d)
+    t1 = time.perf_counter()
+    result = _arrays(d.discretization, texcoords)
+    profiling.add('tessellate', t1 - t0)
+    profiling.add('to_arrays', time.perf_counter() - t1)
+    return result
+
+
+def _arrays(triangleset, texcoords=False):
+    pts = np.array([(pt.x, pt.y, pt.z) for pt in triangleset.pointList],
+                   dtype=np.float32).reshape(-1, 3)
+    idl = np.array([tuple(index) for index in triangleset.indexList],
+                   dtype=np.uint32).reshape(-1, 3)
+    if not texcoords:
+        return pts, idl
+    if triangleset.texCoordList is None:
+        return pts, idl, np.zeros((len(pts), 2), dtype=np.float32)
+    uvs = np.array([(uv.x, uv.y) for uv in triangleset.texCoordList],
+                   dtype=np.float32).reshape(-1, 2)
+    if triangleset.texCoordIndexList is not None:
+        # texture coordinates indexed separately: one vertex per corner
+        tidl = np.array([tuple(index) for index in triangleset.texCoordIndexList],
+                        dtype=np.uint32).reshape(-1, 3)
+        pts, uvs = pts[idl.ravel()], uvs[tidl.ravel()]
+        idl = np.arange(len(pts), dtype=np.uint32).reshape(-1, 3)
+    return pts, idl, uvs
+
+
+def _cached(geometry, d, cache, texcoords=False):
+    """Discretize a geometry once per PlantGL object when a cache is given"""
+    if cache is None:
+        return discretize(geometry, d, texcoords)
+    key = (geometry.getObjectId(), texcoords)
+    mesh = cache.get(key)
+    if mesh is None:
+        mesh = cache[key] = discretize(geometry, d, texcoords)
+    else:
+        profiling.count('cached shapes')
+    return mesh
+
+
+class TessellatedScene(object):
+    """Flat array representation of a tessellated scene.
+
+    Shape ``i`` owns the vertices ``vertex_offsets[i]:vertex_offsets[i+1]``
+    and the triangles ``triangle_offsets[i]:triangle_offsets[i+1]``.
+    Indices are global (they address the whole vertex array).
+    Colors and properties are stored per shape.
+
+    Optionally, `opacity` is stored per shape, and textured scenes hold
+    texture coordinates per vertex (`uvs`) and the index of the image
+    of each shape in `textures` (`texture_ids`, -1 without texture).
+    """
+
+    def __init__(self, vertices, indices, ids, vertex_offsets, triangle_offsets,
+                 colors, properties=None, opacity=None, uvs=None,
+                 texture_ids=None, textures=None):
+        self.vertices = vertices
+        self.indices = indices
+        self.ids = ids
+        self.vertex_offsets = vertex_offsets
+        self.triangle_offsets = triangle_offsets
+        self.colors = colors
+        self.properties = dict(properties) if properties else {}
+        self.opacity = opacity
+        self.uvs = uvs
+        self.texture_ids = texture_ids
+        self.textures = list(textures) if textures else []
+        self._owner = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return '<TessellatedScene: %d shapes, %d vertices, %d triangles>' % (
+            len(self), self.nb_vertices, self.nb_triangles)
+
+    @property
+    def nb_vertices(self):
+        return len(self.vertices)
+
+    @property
+    def nb_triangles(self):
+        return len(self.indices)
+
+    ##########################################################################
+    # Construction
+
+    @classmethod
+    @profiling.traced('merge')
+    def from_arrays(cls, meshes, ids, colors, properties=None, opacity=None,
+                    textures=None):
+        """Build a tessellated scene from a list of (vertices, triangles)
+        with local indices, one per shape.
+
+        `opacity` and `textures` (image file or None) are given per shape;
+        the meshes of textured shapes are (vertices, triangles, uvs).
+        """
+        nv = np.array([len(mesh[0]) for mesh in meshes], dtype=np.int64)
+        nt = np.array([len(mesh[1]) for mesh in meshes], dtype=np.int64)
+        vertex_offsets = np.concatenate([[0], np.cumsum(nv)]).astype(np.int64)
+        triangle_offsets = np.concatenate([[0], np.cumsum(nt)]).astype(np.int64)
+
+        if meshes:
+            vertices = np.concatenate([mesh[0] for mesh in meshes]).astype(np.float32)
+            indices = np.concatenate([mesh[1] for mesh in meshes]).astype(np.uint32)
+            indices += np.repeat(vertex_offsets[:-1], nt).astype(np.uint32)[:, None]
+        else:
+            vertices = np.zeros((0, 3), dtype=np.float32)
+            indices = np.zeros((0, 3), dtype=np.uint32)
+
+        properties = dict((name, np.asarray(values, dtype=np.float32))
+                          for name, values in (properties or {}).items())
+        if opacity is not None:
+            opacity = np.asarray(opacity, dtype=np.float32).reshape(-1)
+            if (opacity >= 1).all():
+                opacity = None
+
+        uvs = texture_ids = None
+        images = []
+        if textures is not None and any(textures):
+            images = sorted(set(t for t in textures if t))
+            texture_ids = np.array([images.index(t) if t else -1 for t in textures],
+                                   dtype=np.int32)
+            uvs = np.zeros((len(vertices), 2), dtype=np.float32)
+            for mesh, start in zip(meshes, vertex_offsets[:-1]):
+                if len(mesh) > 2:
+                    uvs[start:start + len(mesh[2])] = mesh[2]
+
+        profiling.count('shapes', len(meshes))
+        profiling.count('vertices', len(vertices))
+        profiling.count('triangles', len(indices))
+        return cls(vertices, indices,
+                   np.asarray(ids, dtype=np.int64).reshape(-1),
+                   vertex_offsets, triangle_offsets,
+                   np.asarray(colors, dtype=np.uint8).reshape(-1, 3),
+                   properties, opacity, uvs, texture_ids, images)
+
+    @classmethod
+    def from_shapes(cls, shapes, cache=None):
+        """Tessellate the surfaces of a scene (or a list of shapes).
+
+        Curves and texts are ignored. With a `cache` (dict), geometry
+        objects shared between shapes or scenes are tessellated once.
+        Colors, opacities and textures are read from the appearances
+        (see `oawidgets.appearance.material`).
+        """
+        d, dt = pgl.Tesselator(), None
+        meshes, ids, colors, opacity, textures = [], [], [], [], []
+        for obj in shapes:
+            if isinstance(obj.geometry, pgl.Text) or obj.geometry.isACurve():
+                continue
+            color, alpha, texture = material(obj.appearance)
+            if texture:
+                dt = dt or pgl.Tesselator()
+                meshes.append(_cached(obj.geometry, dt, cache, texcoords=True))
+            else:
+                meshes.append(_cached(obj.geometry, d, cache))
+            ids.append(obj.id)
+            colors.append(color)
+            opacity.append(alpha)
+            textures.append(texture)
+        return cls.from_arrays(meshes, ids, colors, opacity=opacity, textures=textures)
+
+    from_scene = from_shapes
+
+    @classmethod
+    def from_mtg(cls, g, property_names=(), vids=None, cache=None):
+        """Tessellate the geometry of an MTG.
+
+        Shape ids are the MTG vertex ids. The given properties are stored
+        as columns (missing values are NaN). See `from_shapes` for `cache`.
+        """
+        if isinstance(property_names, str):
+            property_names = [property_names]
+        geometry = g.property('geometry')
+        if vids is None:
+            vids = list(geometry.keys())
+        d = pgl.Tesselator()
+        meshes, colors, opacity = [], [], []
+        for vid in vids:
+            geom = geometry[vid]
+            meshes.append(_cached(geom, d, cache))
+            if isinstance(geom, pgl.Shape):
+                color, alpha, _ = material(geom.appearance)
+            else:
+                color, alpha = (0, 0, 0), 1.
+            colors.append(color)
+            opacity.append(alpha)
+        table = property_table(g, property_names, vids=vids)
+        properties = dict((name, table.values(name)) for name in property_names)
+        return cls.from_arrays(meshes, vids, colors, properties, opacity)
+
+    @classmethod
+    def concatenate(cls, scenes, translations=None):
+        """Merge several tessellated scenes, each one translated by a vector.
+
+        Property columns missing in a scene are filled with NaN.
+        """
+        scenes = list(scenes)
+        if translations is None:
+            translations = np.zeros((len(scenes), 3), dtype=np.float32)
+        nv = np.array([s.nb_vertices for s in scenes], dtype=np.int64)
+        vbase = np.concatenate([[0], np.cumsum(nv)])[:-1]
+        vertices = [s.vertices + np.asarray(t, dtype=np.float32)
+                    for s, t in zip(scenes, translations)]
+        indices = [s.indices + np.uint32(base) for s, base in zip(scenes, vbase)]
+        counts = [(s.vertex_counts(), s.triangle_counts()) for s in scenes]
+        names = sorted(set(name for s in scenes for name in s.properties))
+        properties = {}
+        for name in names:
+            properties[name] = np.concatenate([
+                s.properties[name] if name in s.properties
+                else np.full(len(s), np.nan, dtype=np.float32) for s in scenes])
+
+        def cat(arrays, shape, dtype):
+            if not arrays:
+                return np.zeros(shape, dtype=dtype)
+            return np.ascontiguousarray(np.concatenate(arrays), dtype=dtype)
+
+        vcounts = cat([v for v, _ in counts], (0,), np.int64)
+        tcounts = cat([t for _, t in counts], (0,), np.int64)
+        opacity = None
+        if any(s.opacity is not None for s in scenes):
+            opacity = cat([s.shape_opacity() for s in scenes], (0,), np.float32)
+        uvs = texture_ids = None
+        textures = sorted(set(t for s in scenes for t in s.textures))
+        if textures:
+            uvs = cat([s.uvs if s.uvs is not None else np.zeros((s.nb_vertices, 2))
+                       for s in scenes], (0, 2), np.float32)
+            # remap the image indices of each scene (-1 stays -1)
+            texture_ids = cat([np.array([textures.index(t) for t in s.textures] + [-1],
+                                        dtype=np.int32)[s.texture_ids]
+                               if s.texture_ids is not None else np.full(len(s), -1)
+                               for s in scenes], (0,), np.int32)
+        return cls(cat(vertices, (0, 3), np.float32),
+                   cat(indices, (0, 3), np.uint32),
+                   cat([s.ids for s in scenes], (0,), np.int64),
+                   np.concatenate([[0], np.cumsum(vcounts)]).astype(np.int64),
+                   np.concatenate([[0], np.cumsum(tcounts)]).astype(np.int64),
+                   cat([s.colors for s in scenes], (0, 3), np.uint8),
+                   properties, opacity, uvs, texture_ids, textures)
+
+    def subset(self, rows):
+        """Return a tessellated scene with the shapes of the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        vcounts = self.vertex_counts()[rows]
+        tcounts = self.triangle_counts()[rows]
+        vertex_offsets = np.concatenate([[0], np.cumsum(vcounts)]).astype(np.int64)
+        triangle_offsets = np.concatenate([[0], np.cumsum(tcounts)]).astype(np.int64)
+        # old index of each kept vertex and triangle
+        vsel = (np.repeat(self.vertex_offsets[rows] - vertex_offsets[:-1], vcounts)
+                + np.arange(vertex_offsets[-1]))
+        tsel = (np.repeat(self.triangle_offsets[rows] - triangle_offsets[:-1], tcounts)
+                + np.arange(triangle_offsets[-1]))
+        shift = np.repeat(self.vertex_offsets[rows] - vertex_offsets[:-1], tcounts)
+        indices = (self.indices[tsel].astype(np.int64) - shift[:, None]).astype(np.uint32)
+        return TessellatedScene(
+            self.vertices[vsel], indices, self.ids[rows],
+            vertex_offsets, triangle_offsets, self.colors[rows],
+            dict((name, values[rows]) for name, values in self.properties.items()),
+            None if self.opacity is None else self.opacity[rows],
+            None if self.uvs is None else self.uvs[vsel],
+            None if self.texture_ids is None else self.texture_ids[rows],
+            self.textures)
+
+    ##########################################################################
+    # Accessors
+
+    def vertex_counts(self):
+        return np.diff(self.vertex_offsets)
+
+    def triangle_counts(self):
+        return np.diff(self.triangle_offsets)
+
+    def vertex_property(self, name):
+        """Return a per vertex array of the property `name`"""
+        return np.repeat(self.properties[name], self.vertex_counts())
+
+    def shape_index(self, triangles):
+        """Return the row of the shape owning each triangle (binary search
+        in the triangle offsets)"""
+        return np.searchsorted(self.triangle_offsets, triangles, side='right') - 1
+
+    def record(self, row):
+        """Return the property values of a shape as a dict"""
+        return dict((name, float(column[row])) for name, column in self.properties.items())
+
+    def shape_opacity(self):
+        """Return the opacity of each shape (1 when it is not stored)"""
+        if self.opacity is None:
+            return np.ones(len(self), dtype=np.float32)
+        return self.opacity
+
+    def vertex_colors(self):
+        """Return the colors packed as 0xRRGGBB integers, per vertex"""
+        c = self.colors.astype(np.uint32)
+        packed = (c[:, 0] << 16) | (c[:, 1] << 8) | c[:, 2]
+        return np.repeat(packed, self.vertex_counts())
+
+    ##########################################################################
+    # Packing in a single buffer
+
+    def _blocks(self):
+        blocks = [(name, dtype, getattr(self, name)) for name, dtype in _BLOCKS]
+        blocks += [(name, dtype, getattr(self, name)) for name, dtype in _OPTIONAL_BLOCKS
+                   if getattr(self, name) is not None]
+        blocks += [('property:' + name, _PROPERTY_DTYPE, values)
+                   for name, values in sorted(self.properties.items())]
+        return blocks
+
+    def _layout(self):
+        """Return the header bytes and the block table"""
+        table, offset = {}, 0
+        for name, dtype, array in self._blocks():
+            table[name] = [offset, dtype, list(array.shape)]
+            offset = _aligned(offset + array.size * np.dtype(dtype).itemsize)
+        header = json.dumps({'version': 1, 'blocks': table, 'size': offset,
+                             'textures': self.textures}).encode('utf-8')
+        return header, table, offset
+
+    @property
+    def nbytes(self):
+        """Size of the packed representation"""
+        header, _, size = self._layout()
+        return _aligned(16 + len(header)) + size
+
+    def tobuffer(self, buf):
+        """Pack the arrays in a writable buffer of at least `nbytes` bytes"""
+        header, table, _ = self._layout()
+        start = _aligned(16 + len(header))
+        prefix = _MAGIC + np.array([len(header)], '<u8').tobytes() + header
+        np.ndarray((len(prefix),), 'u1', buffer=buf)[:] = np.frombuffer(prefix, 'u1')
+        for name, dtype, array in self._blocks():
+            offset, _, shape = table[name]
+            dst = np.ndarray(tuple(shape), dtype, buffer=buf, offset=start + offset)
+            dst[...] = array
+        return buf
+
+    @classmethod
+    def frombuffer(cls, buf):
+        """Map the arrays of a packed buffer (no copy)"""
+        raw = np.ndarray((16,), 'u1', buffer=buf).tobytes()
+        if raw[:8] != _MAGIC:
+            raise ValueError('Not a tessellated scene buffer')
+        length = int(np.frombuffer(raw[8:], '<u8')[0])
+        header = json.loads(np.ndarray((length,), 'u1', buffer=buf, offset=16).tobytes())
+        start = _aligned(16 + length)
+        arrays = {}
+        for name, (offset, dtype, shape) in header['blocks'].items():
+            arrays[name] = np.ndarray(tuple(shape), dtype, buffer=buf, offset=start + offset)
+        properties = dict((name[len('property:'):], array)
+                          for name, array in arrays.items() if name.startswith('property:'))
+        optional = dict((name, arrays.get(name)) for name, _ in _OPTIONAL_BLOCKS)
+        return cls(properties=properties, textures=header.get('textures'), **dict(
+            [(name, arrays[name]) for name, _ in _BLOCKS] + list(optional.items())))
+
+    ##########################################################################
+    # Files
+
+    def save(self, filename):
+        """Write the packed scene in a file, block by block"""
+        header, table, _ = self._layout()
+        start = _aligned(16 + len(header))
+        with open(filename, 'wb') as f:
+            f.write(_MAGIC + np.array([len(header)], '<u8').tobytes() + header)
+            for name, dtype, array in self._blocks():
+                f.seek(start + table[name][0])
+                np.ascontiguousarray(array, dtype=dtype).tofile(f)
+            f.truncate(self.nbytes)
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """Load a scene written by `save`.
+
+        With `mmap`, the file is memory-mapped (read-only) and the arrays
+        are views on it: nothing is read before it is used.
+        """
+        if mmap:
+            buf = np.memmap(filename, dtype='u1', mode='r')
+        else:
+            buf = np.fromfile(filename, dtype='u1')
+        return cls.frombuffer(buf)
+
+    ##########################################################################
+    # Shared memory
+
+    def to_shared_memory(self, name=None):
+        """Copy the scene in a new shared memory block.
+
+        Return the ``SharedMemory`` object. Its ``name`` is passed to the
+        other process; the creator is responsible for ``unlink()``.
+        """
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(name=name, create=True, size=self.nbytes)
+        self.tobuffer(shm.buf)
+        return shm
+
+    @classmethod
+    def from_shared_memory(cls, name):
+        """Attach to a shared memory block created by `to_shared_memory`"""
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 registers the block in the resource tracker of
+            # this process, which would unlink it when this process exits
+            shm = shared_memory.SharedMemory(name=name)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        scene = cls.frombuffer(shm.buf)
+        scene._owner = shm
+        return scene
+
+    def close(self):
+        """Release the arrays and the underlying shared buffer, if any"""
+        owner, self._owner = self._owner, None
+        self.vertices = self.indices = self.ids = None
+        self.vertex_offsets = self.triangle_offsets = self.colors = None
+        self.opacity = self.uvs = self.texture_ids = None
+        self.properties = {}
+        if owner is not None:
+            owner.close()
@@ -0,0 +1,82 @@
+""" Colors, opacities and textures of PlantGL appearances. """
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import appearance
+
+
+class Color(object):
+    def __init__(self, red, green, blue, alpha=0):
+        self.red, self.green, self.blue, self.alpha = red, green, blue, alpha
+
+
+class Material(object):
+    def __init__(self, ambient, diffuse=2., transparency=0.):
+        self.ambient = ambient
+        self.diffuse = diffuse
+        self.transparency = transparency
+
+
+class Texture2D(object):
+    def __init__(self, filename, baseColor):
+        self.image = types.SimpleNamespace(filename=filename) if filename else None
+        self.baseColor = baseColor
+
+
+@pytest.fixture
+def pgl(monkeypatch):
+    """The PlantGL appearance classes, replaced by the stand-ins above"""
+    monkeypatch.setattr(appearance, 'pgl',
+                        types.SimpleNamespace(Material=Material, Texture2D=Texture2D))
+
+
+def test_material(pgl):
+    assert appearance.material(Material(Color(10, 20, 30))) == ((10, 20, 30), 1., None)
+    color, opacity, texture = appearance.material(Material(Color(10, 20, 30),
+                                                           transparency=0.25))
+    assert (color, texture) == ((10, 20, 30), None)
+    assert opacity == pytest.approx(0.75)
+
+
+def test_material_black_ambient(pgl):
+    # the ambient color is kept, whatever the diffuse factor
+    assert appearance.material(Material(Color(0, 0, 0), diffuse=3.))[0] == (0, 0, 0)
+
+
+def test_material_texture(pgl):
+    color, opacity, texture = appearance.material(Texture2D('bark.png',
+                                                            Color(1, 2, 3, 51)))
+    assert (color, texture) == ((1, 2, 3), 'bark.png')
+    # the alpha channel is a transparency
+    assert opacity == pytest.approx(0.8)
+    assert appearance.material(Texture2D(None, Color(1, 2, 3)))[1:] == (1., None)
+
+
+def test_material_other_appearance(pgl):
+    assert appearance.material(object()) == ((255, 255, 255), 1., None)
+
+
+def test_pack():
+    packed = appearance.pack([(255, 0, 0), (1, 2, 3)])
+    np.testing.assert_array_equal(packed, [0xff0000ff, 0x010203ff])
+    packed = appearance.pack([(255, 0, 0), (1, 2, 3)], [0.5, 2.])
+    np.testing.assert_array_equal(packed, [0xff000080, 0x010203ff])
+
+
+def test_color_attributes():
+    packed = appearance.pack([(0, 0, 255), (255, 0, 0), (0, 0, 255)])
+    attribute, color_map, opacity_function, values = appearance.color_attributes(packed)
+    np.testing.assert_array_equal(values, [0x0000ffff, 0xff0000ff])
+    np.testing.assert_array_equal(attribute, [0, 1, 0])
+    np.testing.assert_array_equal(color_map, [0, 0, 0, 1, 1, 1, 0, 0])
+    assert opacity_function is None
+
+
+def test_color_attributes_transparency():
+    packed = appearance.pack([(255, 0, 0), (255, 0, 0)], [1., 0.])
+    attribute, color_map, opacity_function, values = appearance.color_attributes(packed)
+    np.testing.assert_array_equal(attribute, [1, 0])
+    np.testing.assert_array_equal(opacity_function, [0, 0, 1, 1])
@@ -0,0 +1,94 @@
+""" Columnar extraction and aggregation of MTG properties.
+
+A minimal MTG stand-in is used: the functions only read vertices,
+properties, parents and complexes.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import columns, mtg
+
+
+class Graph(object):
+    """Two plants (scale 1) of metamers (scale 2)"""
+
+    def __init__(self):
+        self.scales = {1: 1, 2: 1, 3: 2, 4: 2, 5: 2, 6: 2}
+        self.parents = {3: None, 4: 3, 5: None, 6: 5}
+        self.complexes = {3: 1, 4: 1, 5: 2, 6: 2}
+        self.properties = {'label': {1: 'P', 2: 'P', 3: 'I', 4: 'I', 5: 'I', 6: 'I'},
+                           'length': {3: 1., 4: 2., 5: 4.}}
+
+    def __getitem__(self, vid):
+        return dict((name, prop[vid]) for name, prop in self.properties.items()
+                    if vid in prop)
+
+    def max_scale(self):
+        return 2
+
+    def vertices(self, scale):
+        return [v for v, s in sorted(self.scales.items()) if s == scale]
+
+    def nb_vertices(self):
+        return len(self.scales)
+
+    def property_names(self):
+        return list(self.properties)
+
+    def property(self, name):
+        return self.properties[name]
+
+    def parent(self, vid):
+        return self.parents.get(vid)
+
+    def complex(self, vid):
+        return self.complexes.get(vid)
+
+
+def test_property_table():
+    table = columns.property_table(Graph(), structure=True)
+    np.testing.assert_array_equal(table.vids, [3, 4, 5, 6])
+    assert table['length'].dtype == np.float64
+    np.testing.assert_array_equal(table.masks['length'], [True, True, True, False])
+    assert np.isnan(table.values('length')[3])
+    np.testing.assert_array_equal(table['parent'], [-1, 3, -1, 5])
+    np.testing.assert_array_equal(table.rows([5, 7]), [2, -1])
+    # the root of an axis has no parent
+    assert table.record(0) == {'label': 'I', 'length': 1., 'complex': 1}
+
+
+def test_property_table_vids():
+    g = Graph()
+    g.properties['order'] = {4: 1, 6: 2, 1: 0}
+    table = columns.property_table(g, ['order', 'label'], vids=[6, 1, 3])
+    assert table['order'].dtype == np.int64
+    np.testing.assert_array_equal(table['order'], [2, 0, 0])
+    np.testing.assert_array_equal(table.masks['order'], [True, True, False])
+    assert table['label'].tolist() == ['I', 'P', 'I']
+
+
+def test_tooltips_as_baseline():
+    # mixed int and float values are displayed as they are in the MTG
+    g = Graph()
+    g.properties['length'][3] = 1
+    table = columns.property_table(g)
+    titles = mtg.tooltips(table)
+    assert titles == ['length 1', 'length 2.0', 'length 4.0', '']
+    # the tooltips of the baseline mtg.plot
+    assert titles == [mtg.dict2html(g[vid]) for vid in table.vids.tolist()]
+    np.testing.assert_array_equal(table.values('length')[:3], [1., 2., 4.])
+
+
+def test_aggregate_follows_changes():
+    g = Graph()
+    table = columns.aggregate(g, 1, ['length'])
+    np.testing.assert_array_equal(table.vids, [1, 2])
+    np.testing.assert_array_equal(table['count'], [2, 2])
+    np.testing.assert_array_equal(table['length_sum'], [3., 4.])
+    np.testing.assert_array_equal(table['length_mean'], [1.5, 4.])
+
+    # a property changes, the topology does not
+    g.properties['length'][3] = 10.
+    table = columns.aggregate(g, 1, ['length'])
+    np.testing.assert_array_equal(table['length_sum'], [12., 4.])
@@ -0,0 +1,160 @@
+""" Range filter and property selector on a TessellatedScene mesh. """
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('k3d')
+pytest.importorskip('ipywidgets')
+
+from oawidgets import controls, plantgl
+from oawidgets.tessellation import TessellatedScene
+
+
+def scene():
+    """A triangle, a square (two triangles) and a triangle"""
+    triangle = (np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32),
+                np.array([[0, 1, 2]], dtype=np.uint32))
+    square = (np.array([[0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=np.float32),
+              np.array([[0, 1, 2], [0, 2, 3]], dtype=np.uint32))
+    return TessellatedScene.from_arrays([triangle, square, triangle], [1, 2, 3],
+                                        [(255, 0, 0)] * 3,
+                                        properties={'length': [1., 2., 3.],
+                                                    'width': [10., 20., 30.]})
+
+
+def changes(mesh):
+    """Return the list of the names of the traits changed on `mesh`"""
+    names = []
+    mesh.observe(lambda change: names.append(change['name']))
+    return names
+
+
+def test_range_filter_opacity():
+    tessellated = scene()
+    mesh = plantgl.tessellated2mesh(tessellated, 'length')
+    range_filter = controls.RangeFilter(mesh, tessellated, 'length')
+    assert range_filter.slider.value == (1., 3.)
+    np.testing.assert_array_equal(mesh.opacity_function, [0, 1, 1, 1])
+
+    changed = changes(mesh)
+    range_filter.slider.value = (1.5, 2.5)
+    # attribute values are normalized by the color range (1, 3)
+    np.testing.assert_allclose(mesh.opacity_function,
+                               [0, 0, 0.25, 0, 0.25, 1, 0.75, 1, 0.75, 0, 1, 0], atol=1e-5)
+    assert set(changed) == {'opacity_function'}
+    np.testing.assert_array_equal(mesh.indices, tessellated.indices)
+
+
+def test_range_filter_indices():
+    tessellated = scene()
+    mesh = plantgl.tessellated2mesh(tessellated, 'length')
+    range_filter = controls.RangeFilter(mesh, tessellated, 'length', mode='indices')
+    np.testing.assert_array_equal(mesh.indices, tessellated.indices)
+
+    changed = changes(mesh)
+    range_filter.slider.value = (1.5, 2.5)
+    # the two triangles of the square
+    np.testing.assert_array_equal(mesh.indices, tessellated.indices[1:3])
+    range_filter.slider.value = (2.5, 3.)
+    np.testing.assert_array_equal(mesh.indices, tessellated.indices[3:])
+    assert set(changed) == {'indices'}
+
+    # another property: the range is reset
+    range_filter.set_property('width')
+    assert range_filter.slider.value == (10., 30.)
+    np.testing.assert_array_equal(mesh.indices, tessellated.indices)
+
+
+def test_range_filter_mode():
+    tessellated = scene()
+    with pytest.raises(ValueError):
+        controls.RangeFilter(plantgl.tessellated2mesh(tessellated), tessellated,
+                             'length', mode='colors')
+
+
+def test_property_selector():
+    tessellated = scene()
+    mesh = plantgl.tessellated2mesh(tessellated, 'length')
+    vertices, indices = mesh.vertices, mesh.indices
+    selected = []
+    selector = controls.PropertySelector(mesh, tessellated, ['length', 'width'],
+                                         selected.append)
+
+    changed = changes(mesh)
+    selector.dropdown.value = 'width'
+    # only the attribute and the color range of the same mesh are sent
+    assert selector.mesh is mesh
+    assert set(changed) == {'attribute', 'color_range'}
+    np.testing.assert_array_equal(mesh.attribute, tessellated.vertex_property('width'))
+    assert mesh.attribute.dtype == np.float32
+    np.testing.assert_array_equal(mesh.color_range, [10., 30.])
+    assert mesh.vertices is vertices and mesh.indices is indices
+    assert selected == ['width']
+
+
+def test_property_selector_moves_range_filter():
+    tessellated = scene()
+    mesh = plantgl.tessellated2mesh(tessellated, 'length')
+    range_filter = controls.RangeFilter(mesh, tessellated, 'length', mode='indices')
+    selector = controls.PropertySelector(mesh, tessellated, ['length', 'width'],
+                                         range_filter.set_property)
+    range_filter.slider.value = (2.5, 3.)
+    selector.select('width')
+    assert range_filter.slider.description == 'width'
+    assert range_filter.slider.value == (10., 30.)
+    np.testing.assert_array_equal(mesh.indices, tessellated.indices)
+
+
+def test_picker_merged_mesh():
+    tessellated = scene()
+    mesh = plantgl.tessellated2mesh(tessellated)
+    picker = controls.Picker(mesh, tessellated)
+    # triangle -> shape row by binary search in the triangle offsets
+    np.testing.assert_array_equal(tessellated.shape_index([0, 1, 2, 3]), [0, 1, 1, 2])
+    assert picker.lookup(0) == (1, {'length': 1., 'width': 10.})
+    assert picker.lookup(2)[0] == 2
+    assert picker.lookup(3)[0] == 3
+
+    picker._click({'face_index': 1})
+    assert picker.label.value.startswith('<b>2</b>')
+    assert 'length 2.0' in picker.label.value
+
+
+def test_picker_mtg_vertices():
+    tessellated = scene()
+    mesh = plantgl.tessellated2mesh(tessellated, 'length')
+    # the shape ids are MTG vertex ids, the properties come from the MTG
+    properties = {1: {'label': 'I'}, 2: {'label': 'L'}, 3: {'label': 'I'}}
+    picked = []
+    range_filter = controls.RangeFilter(mesh, tessellated, 'length', mode='indices')
+    picker = controls.Picker(mesh, tessellated, properties.get,
+                             lambda vid, props: picked.append((vid, props)),
+                             range_filter=range_filter)
+    range_filter.slider.value = (2.5, 3.)
+    # only the triangle of the third shape is displayed
+    picker._click({'face_index': 0})
+    assert picked == [(3, {'label': 'I'})]
+
+
+def test_picking_meshes_by_color():
+    k3d = pytest.importorskip('k3d')
+    # one TessellatedScene and one mesh per color, as group_meshes_by_color
+    full = scene()
+    parts = [TessellatedScene.from_arrays(
+        [(full.vertices[full.vertex_offsets[i]:full.vertex_offsets[i + 1]],
+          full.indices[full.triangle_offsets[i]:full.triangle_offsets[i + 1]]
+          - full.vertex_offsets[i]) for i in rows],
+        full.ids[rows], full.colors[rows]) for rows in ([0, 2], [1])]
+    plot = k3d.plot()
+    meshes = [plantgl.tessellated2mesh(part) for part in parts]
+    for mesh in meshes:
+        plot += mesh
+    picked = []
+    label = plantgl._picking(plot, plot.objects, lambda sid, props: picked.append(sid))
+    assert plot.mode == 'callback'
+
+    # the face indices are local to each mesh
+    meshes[0].click_callback({'face_index': 1})
+    meshes[1].click_callback({'face_index': 1})
+    meshes[1].hover_callback({'face_index': 0})
+    assert picked == [3, 2]
+    assert label.value.startswith('<b>2</b>')
@@ -0,0 +1,40 @@
+""" Standalone HTML export of scenes. """
+import json
+import re
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import export
+
+
+def test_quantize_round_trip():
+    vertices = np.array([[0, -1, 2], [1, 3, 2], [0.5, 0, 2]])
+    q, offset, scale = export._quantize(vertices)
+    restored = np.asarray(offset) + q * np.asarray(scale)
+    np.testing.assert_allclose(restored, vertices, atol=4. / 65535)
+
+
+def test_quantize_flat_axis():
+    # a leaf in the z = 0 plane
+    vertices = np.array([[0, 0, 0], [2, 0, 0], [0, 1, 0]])
+    q, offset, scale = export._quantize(vertices)
+    assert scale[2] == 0 and (q[:, 2] == 0).all()
+    upper = np.asarray(offset) + 65535 * np.asarray(scale)
+    np.testing.assert_allclose(upper, vertices.max(axis=0))
+
+
+def test_export_tessellated_scene(tmp_path):
+    pytest.importorskip('k3d')
+    from oawidgets.tessellation import TessellatedScene
+    triangle = (np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32),
+                np.array([[0, 1, 2]], dtype=np.uint32))
+    scene = TessellatedScene.from_arrays([triangle], [1], [(255, 0, 0)])
+    filename = str(tmp_path / 'scene.html')
+    report = export.export_html(scene, filename)
+    assert report['objects'] == 1
+    with open(filename, encoding='utf-8') as f:
+        html = f.read()
+    data = json.loads(re.search(r'const objects = (\[.*?\]);\n', html).group(1))
+    assert data[0]['color'] == [255, 0, 0] and data[0]['scale'][2] == 0
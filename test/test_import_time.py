@@ -0,0 +1,62 @@
+""" Import time regression test.
+
+Heavy dependencies (PlantGL, LPy, MTG, k3d, ipywidgets, matplotlib,
+pyvis, numpy) must only be imported when oawidgets actually uses them.
+
+The import time is only checked against a budget in seconds given by the
+OAWIDGETS_IMPORT_BUDGET environment variable, as wall-clock time depends
+on the machine load.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# seconds to import all the oawidgets modules (IPython already loaded,
+# as in a kernel)
+BUDGET = float(os.environ.get('OAWIDGETS_IMPORT_BUDGET', 0))
+
+HEAVY = ['numpy', 'k3d', 'matplotlib', 'pyvis', 'ipywidgets',
+         'openalea.plantgl.all', 'openalea.lpy', 'openalea.mtg']
+
+SCRIPT = """
+import json, sys, time
+import IPython.core.magic, IPython.display
+t0 = time.perf_counter()
+import oawidgets.plantgl, oawidgets.mtg, oawidgets.lpymagic
+import oawidgets.snapshot, oawidgets.spatial, oawidgets.meshopt
+import oawidgets.appearance, oawidgets.columns, oawidgets.controls
+import oawidgets.export, oawidgets.layout, oawidgets.livegraph
+import oawidgets.memory, oawidgets.renderer
+elapsed = time.perf_counter() - t0
+print(json.dumps({'time': elapsed,
+                  'loaded': [m for m in %r if m in sys.modules]}))
+""" % HEAVY
+
+
+def _import_in_subprocess():
+    out = subprocess.check_output([sys.executable, '-c', SCRIPT])
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def test_heavy_dependencies_are_deferred():
+    result = _import_in_subprocess()
+    assert result['loaded'] == []
+
+
+@pytest.mark.skipif(not BUDGET, reason='OAWIDGETS_IMPORT_BUDGET is not set')
+def test_import_time_budget():
+    # best of 3, to be robust to a cold file system cache
+    elapsed = min(_import_in_subprocess()['time'] for _ in range(3))
+    assert elapsed < BUDGET, 'oawidgets import took %.3f s' % elapsed
+
+
+def test_star_import_keeps_lazy_modules_private():
+    namespace = {}
+    exec('from oawidgets.mtg import *', namespace)
+    for name in ('np', 'lazy_import', 'profiling', 'traversal', 'pyvis_network',
+                 'depth', 'mtg_layout'):
+        assert name not in namespace
+    assert 'plot' in namespace and 'network' in namespace
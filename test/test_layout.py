@@ -0,0 +1,57 @@
+""" Tree layouts of MTG graphs. """
+import gc
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import layout
+
+#       0
+#      / \
+#     1   2
+#    / \
+#   3   4
+PARENTS = np.array([-1, 0, 0, 1, 1])
+
+
+def test_depth():
+    np.testing.assert_array_equal(layout.depth(PARENTS), [0, 1, 1, 2, 2])
+    # a chain, deeper than one jump
+    chain = np.arange(-1, 9)
+    np.testing.assert_array_equal(layout.depth(chain), np.arange(10))
+
+
+def test_tree_layout():
+    x, y = layout.tree_layout(PARENTS)
+    np.testing.assert_array_equal(y, [0, 1, 1, 2, 2])
+    # leaves in distinct slots, parents centered above their children
+    np.testing.assert_array_equal(x[[3, 4, 2]], [0.5, 1.5, 2.5])
+    assert x[1] == 1. and x[0] == 1.5
+
+
+def test_forest_and_radial():
+    parents = np.array([-1, 0, -1, 2])
+    x, y = layout.tree_layout(parents)
+    assert x[2] - x[0] == 1.
+    x, y = layout.tree_layout(PARENTS, radial=True)
+    np.testing.assert_allclose(np.hypot(x, y), [0, 1, 1, 2, 2], atol=1e-12)
+    assert layout.tree_layout(np.zeros(0, dtype=int))[0].shape == (0,)
+
+
+class Graph(object):
+    """Stands for an MTG: the layout cache only holds it weakly"""
+
+
+def test_mtg_layout_cache():
+    g = Graph()
+    first = layout.mtg_layout(g, 1, PARENTS)
+    assert layout.mtg_layout(g, 1, PARENTS.copy()) is first
+    # the tree changed: new layout
+    grown = np.append(PARENTS, 2)
+    assert layout.mtg_layout(g, 1, grown)[0].shape == (6,)
+    with pytest.raises(ValueError):
+        layout.mtg_layout(g, 1, PARENTS, kind='circle')
+    del g
+    gc.collect()
+    assert len(layout._cache) == 0
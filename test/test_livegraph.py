@@ -0,0 +1,120 @@
+""" Incremental updates of the live MTG graph. """
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets.livegraph import LiveGraph
+
+
+class Graph(object):
+    """One axis of metamers at scale 2 (the MTG methods read by LiveGraph)"""
+
+    def __init__(self):
+        self.parents, self.labels, self.edge_types = {}, {}, {}
+
+    def grow(self, vid, parent=None, label='I'):
+        self.parents[vid] = parent
+        self.labels[vid] = label
+        if parent is not None:
+            self.edge_types[vid] = '<'
+
+    def max_scale(self):
+        return 2
+
+    def vertices(self, scale):
+        return list(self.parents)
+
+    def property_names(self):
+        return ['label', 'edge_type']
+
+    def property(self, name):
+        return {'label': self.labels, 'edge_type': self.edge_types}[name]
+
+    def parent(self, vid):
+        return self.parents[vid]
+
+    def complex(self, vid):
+        return 2
+
+
+class Recorder(LiveGraph):
+    """LiveGraph keeping the deltas instead of displaying them"""
+
+    def __init__(self, *args, **kwds):
+        super(Recorder, self).__init__(*args, **kwds)
+        self.deltas = []
+
+    def _send(self, delta):
+        self.deltas.append(delta)
+
+
+def ids(delta):
+    return sorted(node['id'] for node in delta['nodes'])
+
+
+def test_updates_send_the_changes_only():
+    g = Graph()
+    for vid in (2, 3, 4):
+        g.grow(vid, vid - 1 if vid > 2 else None)
+    graph = Recorder()
+    assert graph.update(g) == (3, 0, 0)
+    first = graph.deltas[-1]
+    assert ids(first) == [2, 3, 4]
+    assert [node['level'] for node in first['nodes']] == [0, 1, 2]
+    assert sorted((e['from'], e['to']) for e in first['edges']) == [(2, 3), (3, 4)]
+
+    # growth: only the new vertices and edges, with their levels
+    g.grow(5, 4)
+    g.grow(6, 5)
+    assert graph.update(g) == (2, 0, 0)
+    delta = graph.deltas[-1]
+    assert ids(delta) == [5, 6]
+    assert [node['level'] for node in delta['nodes']] == [3, 4]
+    assert sorted((e['from'], e['to']) for e in delta['edges']) == [(4, 5), (5, 6)]
+
+    # nothing changed
+    assert graph.update(g) == (0, 0, 0)
+    assert graph.deltas[-1]['nodes'] == [] and graph.deltas[-1]['edges'] == []
+
+    # a label change declared by the simulation
+    g.labels[3] = 'A'
+    assert graph.update(g, changed=[3]) == (0, 1, 0)
+    assert graph.deltas[-1]['nodes'][0]['label'] == 'A'
+
+    # selection: only the recolored nodes, with their color
+    graph.update(g, selection=[4])
+    nodes = graph.deltas[-1]['nodes']
+    assert ids(graph.deltas[-1]) == [2, 3, 4, 5, 6]
+    assert set(nodes[0]) == {'id', 'color'}
+    graph.update(g, selection=[4, 5])
+    assert ids(graph.deltas[-1]) == [5]
+
+    # removal
+    del g.parents[6]
+    assert graph.update(g, selection=[4, 5]) == (0, 0, 1)
+    assert graph.deltas[-1]['removed'] == [6]
+    assert graph.deltas[-1]['removed_edges'] == ['e6']
+
+
+def test_updates_detect_label_changes():
+    g = Graph()
+    for vid in (2, 3, 4):
+        g.grow(vid, vid - 1 if vid > 2 else None)
+    graph = Recorder()
+    graph.update(g)
+
+    # not declared: found by comparing with the labels sent
+    g.labels[3] = 'A'
+    assert graph.update(g) == (0, 1, 0)
+    assert ids(graph.deltas[-1]) == [3]
+    assert graph.deltas[-1]['nodes'][0]['label'] == 'A'
+    assert graph.deltas[-1]['edges'] == []
+    assert graph.update(g) == (0, 0, 0)
+
+    # declared: the other vertices are trusted
+    g.labels[2] = 'B'
+    g.labels[4] = 'B'
+    assert graph.update(g, changed=[4]) == (0, 1, 0)
+    assert ids(graph.deltas[-1]) == [4]
+    assert graph.update(g) == (0, 1, 0)
+    assert ids(graph.deltas[-1]) == [2]
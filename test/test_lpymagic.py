@@ -0,0 +1,69 @@
+""" LPy magics run in an in-process IPython shell.
+
+The display publisher of the magics is replaced by a stub. Plots are
+rendered as SVG images, or displayed as k3d widgets without ``-f``
+(see benchmark/lpymagic_harness.py).
+"""
+import pytest
+
+pytest.importorskip('openalea.lpy')
+
+from IPython.core.interactiveshell import InteractiveShell
+
+from oawidgets import profiling
+from oawidgets.lpymagic import LpyMagics
+
+CODE = """
+Axiom: A
+derivation length: 3
+production:
+A --> F(1) [+(40)B] A
+B --> F(0.5) A
+endlsystem
+"""
+
+
+def magics():
+    """Return the shell and the list of the published outputs"""
+    ip = InteractiveShell.instance()
+    lpy_magics = LpyMagics(ip)
+    published = []
+    lpy_magics._publish_display_data = lambda data, **kwds: published.append(data)
+    ip.register_magics(lpy_magics)
+    return ip, published
+
+
+def test_lpy_cell_publishes_svg():
+    ip, published = magics()
+    ip.run_cell_magic('lpy', '-f svg -g g', CODE)
+    assert len(published) == 1
+    assert '<svg' in published[0]['image/svg+xml']
+    assert ip.user_ns['g'].nb_vertices() > 1
+
+
+def test_lpy_cell_displays_widget():
+    pytest.importorskip('k3d')
+    ip, published = magics()
+    ip.run_cell_magic('lpy', '-g g', CODE)
+    # the k3d plot is displayed, not published as an image
+    assert published == []
+    assert ip.user_ns['g'].nb_vertices() > 1
+
+
+def test_lpy_iter_grows():
+    ip, published = magics()
+    ip.run_line_magic('lpy_axiom', 'A')
+    ip.run_line_magic('lpy_rule', 'A --> F(1) [+(40)B] A')
+    ip.run_line_magic('lpy_rule', 'B --> F(0.5) A')
+    first = ip.run_line_magic('lpy_iter', '-n 2 -f svg')
+    second = ip.run_line_magic('lpy_iter', '-n 2 -f svg')
+    assert len(second) > len(first)
+    assert len(published) == 2
+
+
+def test_lpy_phases_are_profiled():
+    ip, _ = magics()
+    with profiling.profile() as report:
+        ip.run_cell_magic('lpy', '-f svg -g g', CODE)
+    for phase in ('setCode', 'iterate', 'sceneInterpretation', 'lpy2mtg', 'plot3d'):
+        assert phase in report.spans
@@ -0,0 +1,46 @@
+""" Bounded buffers of the memory-budgeted conversion. """
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import memory
+
+
+def test_parse_size():
+    assert memory.parse_size(100) == 100
+    assert memory.parse_size('512MB') == 512 << 20
+    assert memory.parse_size('1.5 GiB') == 3 << 29
+    assert memory.parse_size('64k') == 64 << 10
+
+
+def fill(buffer, nb_rows):
+    rows = np.arange(3 * nb_rows, dtype=np.float32).reshape(-1, 3)
+    for chunk in np.array_split(rows, 7):
+        buffer.append(chunk)
+    return rows
+
+
+def test_growable_array_in_memory():
+    buffer = memory.GrowableArray(np.float32, 3)
+    rows = fill(buffer, 1500)
+    assert not buffer.spilled and buffer.nbytes == rows.nbytes
+    result = buffer.finish()
+    np.testing.assert_array_equal(result, rows)
+    # trimmed: the doubled capacity is released
+    assert result.base is None and result.nbytes == rows.nbytes
+
+
+def test_growable_array_spilled():
+    buffer = memory.GrowableArray(np.float32, 3, limit=1 << 12)
+    rows = fill(buffer, 1500)
+    assert buffer.spilled
+    result = buffer.finish()
+    assert isinstance(result, np.memmap) and result.shape == rows.shape
+    np.testing.assert_array_equal(result, rows)
+
+
+def test_track():
+    with memory.track() as report:
+        data = np.ones(1 << 20, dtype=np.uint8)
+        del data
+    assert report['peak'] >= 1 << 20
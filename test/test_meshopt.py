@@ -0,0 +1,105 @@
+""" Welding, cleaning and reordering of merged meshes. """
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import meshopt
+from oawidgets.tessellation import TessellatedScene
+
+
+def quad(z):
+    """A square of two triangles with unwelded corners (6 vertices), and a
+    degenerate triangle repeating a vertex"""
+    corners = np.array([[0, 0, z], [1, 0, z], [1, 1, z], [0, 1, z]], dtype=np.float32)
+    vertices = corners[[0, 1, 2, 0, 2, 3]]
+    triangles = np.array([[0, 1, 2], [3, 4, 5], [0, 0, 1]], dtype=np.uint32)
+    return vertices, triangles
+
+
+def scene():
+    return TessellatedScene.from_arrays([quad(0), quad(1)], [7, 8],
+                                        [(255, 0, 0), (0, 0, 255)])
+
+
+def triangles(tessellated):
+    """Return the set of (shape id, corner coordinates) of the triangles
+    without repeated vertices"""
+    result = set()
+    shapes = np.searchsorted(tessellated.triangle_offsets,
+                             np.arange(tessellated.nb_triangles), side='right') - 1
+    for shape, triangle in zip(shapes, tessellated.indices):
+        if len(set(triangle.tolist())) < 3:
+            continue
+        corners = tuple(tuple(v) for v in tessellated.vertices[triangle].tolist())
+        result.add((int(tessellated.ids[shape]), corners))
+    return result
+
+
+def test_optimize():
+    before = scene()
+    after, report = meshopt.optimize(before)
+
+    assert report['vertices'] == (12, 8)
+    assert report['triangles'] == (6, 4)
+    np.testing.assert_array_equal(after.ids, before.ids)
+    np.testing.assert_array_equal(after.colors, before.colors)
+
+    # offsets are consistent with the arrays
+    assert after.vertex_offsets[-1] == after.nb_vertices
+    assert after.triangle_offsets[-1] == after.nb_triangles
+    assert (after.indices < after.nb_vertices).all()
+    # each shape only uses its own vertices
+    for i in range(len(after)):
+        t0, t1 = after.triangle_offsets[i:i + 2]
+        v0, v1 = after.vertex_offsets[i:i + 2]
+        used = after.indices[t0:t1]
+        assert ((used >= v0) & (used < v1)).all()
+
+    # same triangles, apart from the degenerate ones
+    assert triangles(after) == triangles(before)
+    assert not meshopt.degenerate(after.vertices, after.indices).any()
+
+
+def test_weld_is_per_shape():
+    # two shapes at the same place
+    tessellated = TessellatedScene.from_arrays([quad(0), quad(0)], [7, 8],
+                                               [(255, 0, 0), (0, 0, 255)])
+    vertices, indices, counts, first = meshopt.weld(tessellated)
+    np.testing.assert_array_equal(vertices, tessellated.vertices[first])
+    # the shapes do not share their vertices
+    np.testing.assert_array_equal(counts, [4, 4])
+    np.testing.assert_array_equal(vertices[:4], vertices[4:])
+    assert (indices[:3] < 4).all() and (indices[3:] >= 4).all()
+
+
+@pytest.mark.parametrize('x', [0.025, 0.03])
+def test_weld_across_cells(x):
+    # vertices on both sides of a cell boundary (of a rounded or a floored grid)
+    points = np.array([[x - 1e-4, 0, 0], [x + 1e-4, 0, 0], [x + 0.02, 0, 0]],
+                      dtype=np.float32)
+    tessellated = TessellatedScene.from_arrays([(points, np.array([[0, 1, 2]]))],
+                                               [1], [(255, 0, 0)])
+    vertices, indices, counts, _ = meshopt.weld(tessellated, tolerance=0.01)
+    np.testing.assert_array_equal(counts, [2])
+    np.testing.assert_array_equal(indices, [[0, 0, 1]])
+    np.testing.assert_array_equal(vertices, points[[0, 2]])
+
+
+def test_weld_exact():
+    points = np.array([[0, 0, 0], [0, 0, 0], [1e-7, 0, 0]], dtype=np.float32)
+    tessellated = TessellatedScene.from_arrays([(points, np.array([[0, 1, 2]]))],
+                                               [1], [(255, 0, 0)])
+    _, indices, counts, _ = meshopt.weld(tessellated, tolerance=0)
+    np.testing.assert_array_equal(counts, [2])
+    np.testing.assert_array_equal(indices, [[0, 0, 1]])
+
+
+def test_weld_keeps_texture_seams():
+    points = np.zeros((3, 3), dtype=np.float32)
+    uvs = np.array([[0, 0], [0, 0], [1, 0]], dtype=np.float32)
+    tessellated = TessellatedScene.from_arrays([(points, np.array([[0, 1, 2]]), uvs)],
+                                               [1], [(255, 0, 0)], textures=['bark.png'])
+    _, indices, counts, first = meshopt.weld(tessellated)
+    np.testing.assert_array_equal(counts, [2])
+    np.testing.assert_array_equal(indices, [[0, 0, 1]])
+    np.testing.assert_array_equal(tessellated.uvs[first], uvs[[0, 2]])
@@ -0,0 +1,79 @@
+""" k3d meshes of tessellated scenes. """
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+k3d = pytest.importorskip('k3d')
+
+from oawidgets import plantgl
+from oawidgets.tessellation import TessellatedScene
+
+
+def scene(colors=((255, 0, 0), (0, 255, 0))):
+    triangle = (np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32),
+                np.array([[0, 1, 2]], dtype=np.uint32))
+    return TessellatedScene.from_arrays([triangle, triangle], [10, 20], list(colors),
+                                        properties={'length': [1., 2.]})
+
+
+def test_tessellated2mesh():
+    s = scene()
+    mesh = plantgl.tessellated2mesh(s)
+    assert mesh.vertices.shape == (6, 3)
+    np.testing.assert_array_equal(mesh.indices, s.indices)
+    # two colors: one attribute value per vertex
+    assert len(mesh.attribute) == 6
+    assert plantgl._sources[mesh] is s
+
+
+def test_tessellated2mesh_single_color():
+    mesh = plantgl.tessellated2mesh(scene([(255, 0, 0), (255, 0, 0)]))
+    assert mesh.color == 0xff0000
+    assert len(mesh.attribute) == 0
+
+
+def test_tessellated2mesh_property():
+    mesh = plantgl.tessellated2mesh(scene(), 'length')
+    np.testing.assert_array_equal(mesh.attribute, [1, 1, 1, 2, 2, 2])
+    np.testing.assert_array_equal(mesh.color_range, [1, 2])
+
+
+def test_plantgl_tessellated_scene():
+    plot = plantgl.PlantGL(scene())
+    assert len(plot.objects) == 1
+
+
+def test_gallery_layout():
+    a = scene()
+    b = scene()
+    b.vertices += [5, 5, 0]
+    plot = plantgl.gallery([a, b, a], columns=2, spacing=0.)
+    mesh, = plot.objects
+    merged = plantgl._sources[mesh]
+    assert len(merged) == 6
+    np.testing.assert_array_equal(merged.properties['plant'], [0, 0, 1, 1, 2, 2])
+    # each object is centered in a cell of the size of the largest one
+    centers = [(merged.vertices[v0:v1].min(axis=0) + merged.vertices[v0:v1].max(axis=0)) / 2
+               for v0, v1 in zip(merged.vertex_offsets[:-2:2], merged.vertex_offsets[2::2])]
+    np.testing.assert_allclose(np.array(centers)[:, :2], [[0, 0], [1, 0], [0, -1]])
+
+
+def test_gallery_converts_objects_once(monkeypatch):
+    converted = []
+
+    def from_mtg(g, property_names=(), vids=None, cache=None):
+        converted.append((g, cache))
+        return scene()
+
+    # MTGs are neither PlantGL scenes nor TessellatedScenes
+    monkeypatch.setattr(plantgl, 'pgl', types.SimpleNamespace(Scene=type('Scene', (), {})))
+    monkeypatch.setattr(TessellatedScene, 'from_mtg', staticmethod(from_mtg))
+    g1, g2 = object(), object()
+    plot = plantgl.gallery([g1, g2, g1], property_name='length')
+
+    assert [g for g, _ in converted] == [g1, g2]
+    # one geometry cache is shared by the conversions
+    cache = converted[0][1]
+    assert isinstance(cache, dict) and converted[1][1] is cache
+    assert len(plantgl._sources[plot.objects[0]]) == 6
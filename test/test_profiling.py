@@ -0,0 +1,37 @@
+""" Profiling spans, counters and tracers. """
+import pytest
+
+from IPython.core.interactiveshell import InteractiveShell
+
+from oawidgets import profiling
+
+
+def test_spans_and_tracers():
+    events = []
+    tracer = profiling.add_tracer(lambda *event: events.append(event[:2]))
+    try:
+        with profiling.profile() as report:
+            with profiling.span('outer'):
+                profiling.add('measured', 0.5)
+                profiling.count('shapes', 3)
+    finally:
+        profiling.remove_tracer(tracer)
+    assert report.spans['outer/measured'] == [1, 0.5]
+    assert report.counters == {'shapes': 3}
+    assert events == [('enter', 'outer'), ('add', 'outer/measured'),
+                      ('count', 'shapes'), ('exit', 'outer')]
+    assert not profiling.enabled()
+
+
+class FailingLsystem(object):
+    def setCode(self, code, parameters):
+        raise SyntaxError('invalid L-system')
+
+
+def test_profile_stopped_when_magic_fails():
+    lpymagic = pytest.importorskip('oawidgets.lpymagic')
+    magics = lpymagic.LpyMagics(InteractiveShell.instance())
+    magics._lsystem = FailingLsystem()
+    with pytest.raises(SyntaxError):
+        magics.lpy('-p', 'Axiom: A')
+    assert not profiling.enabled()
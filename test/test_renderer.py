@@ -0,0 +1,151 @@
+""" Coalescing of the updates of a plot by the AsyncRenderer. """
+import asyncio
+import contextlib
+import time
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import renderer
+from oawidgets.renderer import AsyncRenderer
+
+
+class Mesh(object):
+    """k3d mesh recording the traits it is given"""
+
+    def __init__(self, **traits):
+        self.updates = [traits]
+
+    @contextlib.contextmanager
+    def hold_sync(self):
+        self.updates.append({})
+        yield
+
+    def __setattr__(self, name, value):
+        if name != 'updates':
+            self.updates[-1][name] = value
+        object.__setattr__(self, name, value)
+
+
+class Plot(object):
+    def __init__(self):
+        self.objects = []
+
+    def __iadd__(self, mesh):
+        self.objects.append(mesh)
+        return self
+
+
+@pytest.fixture
+def make_renderer(monkeypatch):
+    monkeypatch.setattr(renderer, 'k3d', types.SimpleNamespace(mesh=Mesh))
+
+    def make(fps=0., times=None):
+        r = AsyncRenderer(plot=Plot(), fps=fps)
+
+        def convert(scene):
+            # the scenes are the vertices of the frames
+            if scene == 'bad':
+                raise ValueError(scene)
+            if times is not None:
+                times.append(time.monotonic())
+            return {'vertices': scene}
+        r._convert = convert
+        return r
+    return make
+
+
+def drawn(r):
+    """Return the vertices of the frames drawn by a renderer"""
+    return [traits['vertices'] for traits in r.mesh.updates] if r.mesh else []
+
+
+async def wait(r, frames):
+    for _ in range(200):
+        if r.frames >= frames or r._task.done():
+            return
+        await asyncio.sleep(0.005)
+
+
+def test_latest_wins(make_renderer):
+    async def main():
+        r = make_renderer().start()
+        for scene in (1, 2, 3):
+            r.submit(scene)
+        await r.close()
+        return r
+
+    r = asyncio.run(main())
+    assert drawn(r) == [3]
+    assert (r.frames, r.dropped) == (1, 2)
+    assert r.plot.objects == [r.mesh]
+
+
+def test_update_in_place(make_renderer):
+    async def main():
+        r = make_renderer().start()
+        r.submit(1)
+        await wait(r, 1)
+        r.submit(2)
+        await r.close()
+        return r
+
+    r = asyncio.run(main())
+    assert drawn(r) == [1, 2] and r.frames == 2
+    # the traits of the previous frame are reset
+    assert r.mesh.updates[1]['opacity'] == 1.
+    assert len(r.mesh.updates[1]['attribute']) == 0
+
+
+def test_frame_rate(make_renderer):
+    times = []
+
+    async def main():
+        r = make_renderer(fps=10., times=times).start()
+        r.submit(1)
+        await wait(r, 1)
+        # both arrive while the renderer waits for the next frame
+        r.submit(2)
+        await asyncio.sleep(0.02)
+        r.submit(3)
+        await r.close()
+        return r
+
+    r = asyncio.run(main())
+    assert drawn(r) == [1, 3]
+    assert (r.frames, r.dropped) == (2, 1)
+    assert times[1] - times[0] >= 0.1 - 0.01
+
+
+def test_error_propagation(make_renderer):
+    async def main():
+        r = make_renderer().start()
+        r.submit('bad')
+        await wait(r, 1)
+        with pytest.raises(ValueError):
+            r.submit(1)
+        with pytest.raises(ValueError):
+            await r.close()
+        return r
+
+    r = asyncio.run(main())
+    assert r.frames == 0 and r.mesh is None
+
+
+def test_close(make_renderer):
+    async def main():
+        r = make_renderer()
+        with pytest.raises(RuntimeError):
+            r.submit(1)
+        r.start()
+        r.submit(1)
+        # the pending scene is drawn before stopping
+        await r.close()
+        assert drawn(r) == [1]
+        with pytest.raises(RuntimeError):
+            r.submit(2)
+        await r.close()
+
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+""" Offscreen rendering of triangle meshes. """
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import snapshot
+
+
+def mesh():
+    """Two triangles facing the x axis, the second one nearer to x"""
+    vertices = np.array([[0, 0, 0], [0, 1, 0], [0, 0, 1],
+                         [1, 0, 0], [1, 1, 0], [1, 0, 1]], dtype=float)
+    triangles = np.array([[3, 4, 5], [0, 1, 2]])
+    colors = np.array([[0, 1, 0], [1, 0, 0]], dtype=float)
+    return vertices, triangles, colors
+
+
+def test_project_mesh_back_to_front():
+    vertices, triangles, colors = mesh()
+    # camera on the x axis, looking towards -x
+    tri2d, shaded, lines2d = snapshot.project_mesh(vertices, triangles, colors,
+                                                   width=100, height=80,
+                                                   azimuth=0, elevation=0, margin=10)
+    assert tri2d.shape == (2, 3, 2)
+    assert lines2d == []
+    # the farthest (red) triangle is painted first
+    assert shaded[0][0] > 0 and shaded[0][1] == 0
+    assert shaded[1][1] > 0 and shaded[1][0] == 0
+    # headlight shading, quantized to 1/32
+    np.testing.assert_allclose(shaded, 30 / 32. * colors[::-1])
+    # both triangles project on the same pixels, inside the margins
+    np.testing.assert_allclose(tri2d[0], tri2d[1])
+    assert tri2d[..., 0].min() >= 10 - 1e-6 and tri2d[..., 0].max() <= 90 + 1e-6
+    assert tri2d[..., 1].min() >= 10 - 1e-6 and tri2d[..., 1].max() <= 70 + 1e-6
+
+
+def test_project_mesh_lines_only():
+    line = np.array([[0, 0, 0], [0, 0, 1]], dtype=float)
+    tri2d, shaded, lines2d = snapshot.project_mesh(np.zeros((0, 3)), np.zeros((0, 3)),
+                                                   np.zeros((0, 3)), [(line, (0, 0, 1))],
+                                                   width=100, height=100)
+    assert tri2d.shape == (0, 3, 2)
+    assert len(lines2d) == 1
+    pts, color = lines2d[0]
+    assert pts.shape == (2, 2) and color == (0, 0, 1)
+    # the line is vertical in the image, z upwards
+    assert abs(pts[0, 0] - pts[1, 0]) < 1e-6 and pts[1, 1] < pts[0, 1]
+
+
+def test_svg_groups_faces_by_color():
+    tri2d = np.zeros((3, 3, 2))
+    colors = [(1, 0, 0), (1, 0, 0), (0, 0, 1)]
+    line = (np.array([[0., 0.], [5., 5.]]), (0, 1, 0))
+    svg = snapshot._svg(tri2d, colors, [line], 20, 10, 'white', False)
+    assert svg.startswith('<svg') and svg.endswith('</svg>')
+    assert '<rect width="100%" height="100%" fill="white"/>' in svg
+    # one path per run of faces of the same color, plus the polyline
+    assert svg.count('<path') == 3
+    assert svg.count('fill="#ff0000"') == 1 and svg.count('Z') == 3
+    assert 'stroke="#00ff00"' in svg
+
+    wireframe = snapshot._svg(tri2d, colors, [], 20, 10, None, True)
+    assert '<rect' not in wireframe
+    assert wireframe.count('fill="none"') == 2
+
+
+@pytest.mark.parametrize('format, magic', [('png', b'\x89PNG'), ('jpeg', b'\xff\xd8')])
+def test_raster(format, magic):
+    pytest.importorskip('matplotlib')
+    vertices, triangles, colors = mesh()
+    tri2d, shaded, lines2d = snapshot.project_mesh(vertices, triangles, colors,
+                                                   width=64, height=48)
+    image = snapshot._raster(tri2d, shaded, lines2d, 64, 48, 'white', False, format)
+    assert image.startswith(magic)
+
+
+def test_snapshot_unknown_format():
+    with pytest.raises(ValueError):
+        snapshot.snapshot(None, format='bmp')
+
+
+def test_lpy_plot3d_format(monkeypatch):
+    lpymagic = pytest.importorskip('oawidgets.lpymagic')
+    monkeypatch.setattr(snapshot, '_shapes', lambda scene: scene)
+    monkeypatch.setattr(snapshot, '_tessellate', lambda shapes: mesh() + ([],))
+    displayed = []
+    monkeypatch.setattr(lpymagic, 'display', displayed.append)
+
+    image = lpymagic.LpyMagics._plot3d(None, 'scene', format='svg')
+    assert image.startswith('<svg') and image.count('<path') == 2
+    assert displayed == []
@@ -0,0 +1,105 @@
+""" Spatial index and camera culling, on plain bounding boxes. """
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import spatial
+
+
+class Index(spatial.BoundingBoxIndex):
+    """Index whose sub-scenes are the lists of the selected shapes"""
+
+    def subscene(self, rows):
+        return [self.shapes[i] for i in rows]
+
+
+class Plot(object):
+    """Minimal k3d plot: objects, camera field of view and observers"""
+
+    def __init__(self):
+        self.objects = []
+        self.camera_fov = 60.
+        self.camera_auto_fit = True
+        self.observers = []
+
+    def __iadd__(self, obj):
+        self.objects.append(obj)
+        return self
+
+    def __isub__(self, obj):
+        self.objects.remove(obj)
+        return self
+
+    def observe(self, func, names):
+        self.observers.append(func)
+
+
+def index():
+    """Unit boxes along the x axis, at x = 0, 10, ..., 90"""
+    lower = [(10 * i, 0, 0) for i in range(10)]
+    upper = [(10 * i + 1, 1, 1) for i in range(10)]
+    return Index(list(range(10)), lower, upper)
+
+
+def test_query_region():
+    rows = index().query(((5, -1, -1), (31, 2, 2)))
+    assert sorted(rows.tolist()) == [1, 2, 3]
+
+
+def test_subindex():
+    sub = index().subindex([2, 5])
+    assert sub.shapes == [2, 5]
+    assert sorted(sub.query(((0, -1, -1), (100, 2, 2))).tolist()) == [0, 1]
+
+
+def test_query_frustum():
+    # looking along +x from x = -10: every box is in front of the camera
+    camera = [-10, 0.5, 0.5, 0, 0.5, 0.5, 0, 0, 1]
+    assert len(index().query_frustum(*spatial.frustum(camera))) == 10
+    # looking along -x: none is
+    camera = [-10, 0.5, 0.5, -20, 0.5, 0.5, 0, 0, 1]
+    assert len(index().query_frustum(*spatial.frustum(camera))) == 0
+
+
+def test_follow_camera_replaces_meshes():
+    plot = Plot()
+    initial = ['all']
+    plot += initial[0]
+    update = spatial.follow_camera(plot, index(), initial,
+                                   lambda shapes: ['mesh of %s' % shapes])
+    assert not plot.camera_auto_fit and plot.observers == [update]
+
+    # camera above the boxes 0 and 1 only, looking down
+    update({'new': [0.5, 0.5, 5, 0.5, 0.5, 0, 0, 1, 0]})
+    assert plot.objects == ['mesh of [0]']
+    # same view: nothing changes
+    update({'new': [0.5, 0.5, 5, 0.5, 0.5, 0, 0, 1, 0]})
+    assert plot.objects == ['mesh of [0]']
+    # looking away from every box
+    update({'new': [-10, 0.5, 0.5, -20, 0.5, 0.5, 0, 0, 1]})
+    assert plot.objects == []
+
+
+def test_follow_camera_in_region():
+    # the camera only brings back the shapes of the region
+    sub = index().subindex(index().query(((5, -1, -1), (31, 2, 2))))
+    plot = Plot()
+    update = spatial.follow_camera(plot, sub, [], lambda shapes: ['mesh of %s' % shapes])
+    update({'new': [-10, 0.5, 0.5, 0, 0.5, 0.5, 0, 0, 1]})
+    assert plot.objects == ['mesh of [1, 2, 3]']
+
+
+def test_plantgl_region_and_follow_camera():
+    pgl = pytest.importorskip('openalea.plantgl.all')
+    pytest.importorskip('k3d')
+    from oawidgets import plantgl
+
+    scene = pgl.Scene([pgl.Shape(pgl.Translated(10 * i, 0, 0, pgl.Box(0.5, 0.5, 0.5)),
+                                 pgl.Material((255, 0, 0)), id=i + 1)
+                       for i in range(10)])
+    plot = plantgl.PlantGL(scene, group_by_color=False, region=((5, -1, -1), (31, 2, 2)),
+                           follow_camera=True)
+    assert len(plot.objects) == 3
+    # every box is in front of this camera, only those of the region are shown
+    plot.camera = [-10, 0, 0, 0, 0, 0, 0, 0, 1]
+    assert len(plot.objects) == 3
@@ -0,0 +1,121 @@
+""" Packing of TessellatedScene in buffers and shared memory. """
+import os
+import subprocess
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from oawidgets import profiling, tessellation
+from oawidgets.tessellation import TessellatedScene
+
+
+def scene():
+    """Two shapes (a triangle and a square) with a property"""
+    triangle = (np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32),
+                np.array([[0, 1, 2]], dtype=np.uint32))
+    square = (np.array([[0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=np.float32),
+              np.array([[0, 1, 2], [0, 2, 3]], dtype=np.uint32))
+    return TessellatedScene.from_arrays([triangle, square], [10, 20],
+                                        [(255, 0, 0), (0, 255, 0)],
+                                        properties={'length': [1.5, 2.5]},
+                                        opacity=[1., 0.5])
+
+
+def assert_same(a, b):
+    for name in ('vertices', 'indices', 'ids', 'vertex_offsets',
+                 'triangle_offsets', 'colors', 'opacity'):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+    assert sorted(a.properties) == sorted(b.properties)
+    for name in a.properties:
+        np.testing.assert_array_equal(a.properties[name], b.properties[name])
+
+
+def test_from_arrays():
+    s = scene()
+    assert (len(s), s.nb_vertices, s.nb_triangles) == (2, 7, 3)
+    # indices are global
+    np.testing.assert_array_equal(s.indices[1:], [[3, 4, 5], [3, 5, 6]])
+    np.testing.assert_array_equal(s.shape_index([0, 1, 2]), [0, 1, 1])
+    assert s.record(1) == {'length': 2.5}
+
+
+def test_concatenate():
+    s = scene()
+    merged = TessellatedScene.concatenate([s, s], [(0, 0, 0), (10, 0, 0)])
+    assert (len(merged), merged.nb_vertices, merged.nb_triangles) == (4, 14, 6)
+    np.testing.assert_array_equal(merged.vertices[7:], s.vertices + [10, 0, 0])
+    np.testing.assert_array_equal(merged.indices[3:], s.indices + 7)
+    np.testing.assert_array_equal(merged.triangle_offsets, [0, 1, 3, 4, 6])
+    np.testing.assert_array_equal(merged.properties['length'], [1.5, 2.5, 1.5, 2.5])
+
+
+class Geometry(object):
+    def __init__(self, oid):
+        self.oid = oid
+
+    def getObjectId(self):
+        return self.oid
+
+
+def test_cached_discretization(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tessellation, 'discretize',
+                        lambda geometry, d, texcoords=False: calls.append(geometry.oid) or geometry.oid)
+    cache = {}
+    with profiling.profile() as report:
+        meshes = [tessellation._cached(Geometry(oid), None, cache) for oid in (1, 2, 1)]
+    assert meshes == [1, 2, 1] and calls == [1, 2]
+    assert report.counters == {'cached shapes': 1}
+    # without a cache, each geometry is discretized
+    tessellation._cached(Geometry(1), None, None)
+    assert calls == [1, 2, 1]
+    # textured shapes are discretized apart, with texture coordinates
+    tessellation._cached(Geometry(1), None, cache, texcoords=True)
+    assert calls == [1, 2, 1, 1]
+
+
+def test_buffer_round_trip():
+    s = scene()
+    buf = bytearray(s.nbytes)
+    s.tobuffer(buf)
+    assert_same(s, TessellatedScene.frombuffer(buf))
+
+
+def test_shared_memory_survives_consumer():
+    s = scene()
+    shm = s.to_shared_memory()
+    try:
+        code = ('import sys; from oawidgets.tessellation import TessellatedScene; '
+                's = TessellatedScene.from_shared_memory(sys.argv[1]); '
+                'print(int(s.ids.sum()), float(s.vertices.sum())); s.close()')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        # the block is still there once the first consumer has exited
+        for _ in range(2):
+            out = subprocess.run([sys.executable, '-c', code, shm.name], env=env,
+                                 capture_output=True, text=True, check=True)
+            assert out.stdout.split() == ['30', str(float(s.vertices.sum()))]
+            assert 'leaked' not in out.stderr
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_load(tmp_path, mmap):
+    s = scene()
+    filename = str(tmp_path / 'scene.oats')
+    s.save(filename)
+    assert os.path.getsize(filename) == s.nbytes
+    loaded = TessellatedScene.load(filename, mmap=mmap)
+    assert_same(s, loaded)
+    loaded.close()
+
+
+def test_load_rejects_other_files(tmp_path):
+    filename = str(tmp_path / 'other.bin')
+    with open(filename, 'wb') as f:
+        f.write(b'\0' * 64)
+    with pytest.raises(ValueError):
+        TessellatedScene.load(filename)